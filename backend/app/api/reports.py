@@ -1,9 +1,13 @@
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Any, List
 from app.models.financials import FinancialStatement
 from app.services.cfp_agent import CFPAgent
 from app.services.model_clients import create_gemini_client_from_env
+from app.services.singleflight import SingleFlight
+from app.services.job_store import call_job_store, get_job_store
+from app.services.scheduler import QueueFullError, SchedulerClosedError, get_scheduler
 
 
 class AnalysisModel(BaseModel):
@@ -21,72 +25,202 @@ class ReportResponse(BaseModel):
 
 router = APIRouter(prefix="/api/v1")
 
-# Simple in-memory job store for asynchronous processing (suitable for dev; replace with Redis/RQ in prod)
+# 后台任务状态存储见 app.services.job_store（JOB_STORE_BACKEND=sqlite 时可跨 worker 共享）
 from uuid import uuid4
 from typing import Dict
 import asyncio
+import copy
+import json
 
-JOB_STORE: Dict[str, Dict[str, Any]] = {}
+# 合并并发的相同分析请求（例如小程序端重试风暴），共享一次 analyze_async 调用
+_INFLIGHT = SingleFlight()
 
 
-@router.post('/reports', response_model=ReportResponse)
-async def create_report(payload: FinancialStatement):
-    try:
+async def _analyze(payload: FinancialStatement, use_cache: bool = True) -> Dict[str, Any]:
+    """运行一次分析；相同 payload 的并发请求共享同一个底层调用，每个调用方拿到独立副本。"""
+    key = f"{use_cache}:{payload.json(sort_keys=True)}"
+
+    async def _run_once():
         # create a model client from environment (Gemini gated by GEMINI_ENABLED and GEMINI_API_KEY)
         model_client = create_gemini_client_from_env()
         agent = CFPAgent(model_client=model_client)
-        result = await agent.analyze_async(payload)
-        # 确保返回字段完整，若缺失则抛错或补全
-        analysis = {
-            "overview": result.get("overview", ""),
-            "recommendations": result.get("recommendations", []),
-            "risks": result.get("risks", []),
-            "confidence": float(result.get("confidence", 0.0)),
-        }
-        # Validate analysis strictly with Pydantic model
-        analysis_model = AnalysisModel.parse_obj(analysis)
-        return {"summary": "已接收", "debt_ratio": float(payload.debt_ratio()), "analysis": analysis_model}
+        return await agent.analyze_async(payload, use_cache=use_cache)
+
+    result = await _INFLIGHT.do(key, _run_once)
+    return copy.deepcopy(result)
+
+
+# 合规元数据与作答来源（_tier：local / model / rules）
+_RESULT_META_KEYS = ("_disclaimer", "_needs_legal_review", "_compliance_matches", "_tier")
+
+
+def _report_body(payload: FinancialStatement, result: Dict[str, Any]) -> Dict[str, Any]:
+    """把 agent 结果整理为 ReportResponse 结构；analysis 严格按 AnalysisModel 校验，并保留合规元数据。"""
+    # 确保返回字段完整，若缺失则抛错或补全
+    analysis = AnalysisModel.parse_obj({
+        "overview": result.get("overview", ""),
+        "recommendations": result.get("recommendations", []),
+        "risks": result.get("risks", []),
+        "confidence": float(result.get("confidence", 0.0)),
+    })
+    return {
+        "summary": "已接收",
+        "debt_ratio": float(payload.debt_ratio()),
+        # 合规元数据（免责声明 / 是否需人工法律复核 / 命中明细）与作答来源；/reports 的 response_model 会将其过滤
+        "analysis": {**analysis.dict(), **{k: result[k] for k in _RESULT_META_KEYS if k in result}},
+    }
+
+
+@router.post('/reports', response_model=ReportResponse)
+async def create_report(payload: FinancialStatement, no_cache: bool = False):
+    try:
+        result = await _analyze(payload, use_cache=not no_cache)
+        return _report_body(payload, result)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _format_event(event: Dict[str, Any], fmt: str) -> str:
+    body = {k: v for k, v in event.items() if k != "event"}
+    if fmt == "ndjson":
+        return json.dumps(event, ensure_ascii=False) + "\n"
+    return f"event: {event['event']}\ndata: {json.dumps(body, ensure_ascii=False)}\n\n"
+
+
+@router.post('/reports/stream')
+async def stream_report(payload: FinancialStatement, format: str = "sse", no_cache: bool = False):
+    """渐进式报告：模型流中 overview、每条 recommendations、每条 risks 一旦可解析即推送，
+    最后推送与 /reports 响应结构相同的 result 事件（已校验、已合规检查）。
+
+    format=sse（默认，text/event-stream，事件名即 event 字段）或 ndjson（每行一个 JSON 事件）。
+    部分字段未经合规检查，客户端应在收到 result 后以其为准。
+    """
+    if format not in ("sse", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be 'sse' or 'ndjson'")
+
+    model_client = create_gemini_client_from_env()
+    agent = CFPAgent(model_client=model_client)
+
+    async def _events():
+        try:
+            async for event in agent.analyze_events_async(payload, use_cache=not no_cache):
+                if event["event"] == "result":
+                    event = {"event": "result", "data": _report_body(payload, event["data"])}
+                yield _format_event(event, format)
+        except Exception as e:
+            yield _format_event({"event": "error", "data": {"detail": str(e)}}, format)
+
+    media_type = "application/x-ndjson" if format == "ndjson" else "text/event-stream"
+    # 禁止代理缓冲（如 nginx），否则部分字段会被攒到最后才下发
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(_events(), media_type=media_type, headers=headers)
+
+
+def _batch_settings() -> tuple:
+    import os
+    return (int(os.getenv('REPORT_BATCH_CONCURRENCY', '8')), int(os.getenv('REPORT_BATCH_MAX_ITEMS', '200')))
+
+
+@router.post('/reports/batch')
+async def batch_reports(payload: List[FinancialStatement], stream: bool = False, no_cache: bool = False):
+    """批量报告：请求体为 FinancialStatement 数组。
+
+    所有条目共享一个 CFPAgent / 模型客户端，检索一次批量完成，模型调用并发数不超过 REPORT_BATCH_CONCURRENCY。
+    默认按输入顺序返回 {"results": [...]}；stream=true 时以 NDJSON 在每条完成时立即输出（顺序为完成顺序）。
+    每条结果带 index；单条失败不影响其他条目，结果为 {"index": i, "error": "..."}。
+    """
+    concurrency, max_items = _batch_settings()
+    if not payload:
+        raise HTTPException(status_code=400, detail="empty batch")
+    if len(payload) > max_items:
+        raise HTTPException(status_code=413, detail=f"batch too large (max {max_items} items)")
+
+    agent = CFPAgent(model_client=create_gemini_client_from_env())
+    docs_list = await agent.retrieve_batch_async(payload)
+    sem = asyncio.Semaphore(max(1, concurrency))
+
+    async def _one(i: int) -> Dict[str, Any]:
+        async with sem:
+            try:
+                res = await agent.analyze_async(payload[i], use_cache=not no_cache, docs=docs_list[i])
+                return {"index": i, **_report_body(payload[i], res)}
+            except Exception as e:
+                return {"index": i, "error": str(e)}
+
+    if not stream:
+        return {"results": list(await asyncio.gather(*(_one(i) for i in range(len(payload)))))}
+
+    async def _lines():
+        tasks = [asyncio.ensure_future(_one(i)) for i in range(len(payload))]
+        try:
+            for fut in asyncio.as_completed(tasks):
+                yield json.dumps(await fut, ensure_ascii=False) + "\n"
+        finally:
+            # 客户端断开时取消尚未完成的条目，避免继续占用上游配额
+            for t in tasks:
+                t.cancel()
+
+    return StreamingResponse(_lines(), media_type="application/x-ndjson",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 
 class StartReportResponse(BaseModel):
     job_id: str
+    # 排队位置：0 表示已开始运行
+    position: int = 0
 
 
 @router.post('/reports/start', response_model=StartReportResponse)
-async def start_report(payload: FinancialStatement):
+async def start_report(payload: FinancialStatement, no_cache: bool = False, priority: int = 0):
     """Start an analysis job and return a job_id for polling.
-    The actual analysis runs in the event loop's executor to avoid blocking.
+    Jobs run through the bounded scheduler (app.services.scheduler); higher priority runs first.
+    Returns 429 with Retry-After when the queue is full, 503 while shutting down.
     """
     job_id = str(uuid4())
-    JOB_STORE[job_id] = {"status": "queued", "result": None}
+    jobs = get_job_store()
+    await call_job_store(jobs, 'create', job_id, {"status": "queued", "result": None, "priority": priority})
 
     async def _run():
-        JOB_STORE[job_id]["status"] = "running"
+        await call_job_store(jobs, 'update', job_id, status="running")
         try:
-            model_client = create_gemini_client_from_env()
-            agent = CFPAgent(model_client=model_client)
-            res = await agent.analyze_async(payload)
-            JOB_STORE[job_id]["status"] = "done"
-            JOB_STORE[job_id]["result"] = {
+            res = await _analyze(payload, use_cache=not no_cache)
+            await call_job_store(jobs, 'update', job_id, status="done", result={
                 "summary": "已接收",
                 "debt_ratio": float(payload.debt_ratio()),
                 "analysis": res,
-            }
+            })
+        except asyncio.CancelledError:
+            await call_job_store(jobs, 'update', job_id, status="error", result={"error": "cancelled during shutdown"})
+            raise
         except Exception as e:
-            JOB_STORE[job_id]["status"] = "error"
-            JOB_STORE[job_id]["result"] = {"error": str(e)}
+            await call_job_store(jobs, 'update', job_id, status="error", result={"error": str(e)})
 
-    # schedule the job
-    asyncio.create_task(_run())
-    return {"job_id": job_id}
+    try:
+        position = get_scheduler().submit(job_id, _run, priority=priority)
+    except QueueFullError as e:
+        await call_job_store(jobs, 'delete', job_id)
+        raise HTTPException(status_code=429, detail="too many pending reports",
+                            headers={"Retry-After": str(e.retry_after)})
+    except SchedulerClosedError:
+        await call_job_store(jobs, 'delete', job_id)
+        raise HTTPException(status_code=503, detail="server is shutting down")
+    return {"job_id": job_id, "position": position}
 
 
 @router.get('/reports/{job_id}')
 async def get_report_status(job_id: str):
-    job = JOB_STORE.get(job_id)
+    job = await call_job_store(get_job_store(), 'get', job_id)
     if not job:
         raise HTTPException(status_code=404, detail="job not found")
+    if job.get("status") == "queued":
+        # 仅在受理该任务的 worker 上可知；其他 worker 上为 None
+        job["position"] = get_scheduler().position(job_id)
     return job
+
+
+async def drain_jobs(timeout: float = 30.0):
+    """停机时调用：等待后台任务完成，未能开始运行的任务标记为 error。"""
+    dropped = await get_scheduler().drain(timeout)
+    jobs = get_job_store()
+    for job_id in dropped:
+        await call_job_store(jobs, 'update', job_id, status="error", result={"error": "not started before shutdown"})
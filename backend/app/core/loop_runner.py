@@ -0,0 +1,98 @@
+"""后台事件循环线程：供同步调用方（脚本、批处理）运行异步流水线。
+
+- 进程内一个长期存在的事件循环（守护线程），首次使用时启动，不必每次调用创建 / 销毁事件循环
+- 启动时在该循环上创建共享 HTTP 连接池（见 model_clients.init_shared_async_client），同步调用也能复用 keep-alive 连接
+- run(coro) 阻塞等待结果；超时会取消协程。不能在后台循环线程内部调用 run（会死锁）
+- 进程退出时（atexit）关闭连接池并停止循环
+"""
+from concurrent.futures import Future
+from typing import Any, Awaitable, Optional
+import asyncio
+import atexit
+import threading
+
+
+class LoopRunner:
+    def __init__(self, name: str = 'cfp-loop-runner', init_shared_client: bool = True):
+        self.name = name
+        self.init_shared_client = init_shared_client
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> Optional[asyncio.AbstractEventLoop]:
+        return self._loop
+
+    def _ensure_started(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is not None and self._thread is not None and self._thread.is_alive():
+                return self._loop
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def _run():
+                asyncio.set_event_loop(loop)
+                loop.call_soon(ready.set)
+                loop.run_forever()
+
+            self._thread = threading.Thread(target=_run, name=self.name, daemon=True)
+            self._thread.start()
+            ready.wait()
+            if self.init_shared_client:
+                from app.services.model_clients import init_shared_async_client
+                asyncio.run_coroutine_threadsafe(init_shared_async_client(), loop).result()
+            self._loop = loop
+            return loop
+
+    def submit(self, coro: Awaitable[Any]) -> Future:
+        """提交协程到后台循环，返回 concurrent.futures.Future。"""
+        loop = self._ensure_started()
+        return asyncio.run_coroutine_threadsafe(coro, loop)
+
+    def run(self, coro: Awaitable[Any], timeout: Optional[float] = None) -> Any:
+        """在后台循环中运行协程并阻塞等待结果。"""
+        if self._thread is not None and threading.current_thread() is self._thread:
+            if asyncio.iscoroutine(coro):
+                coro.close()
+            raise RuntimeError('LoopRunner.run() called from its own event loop thread; await the coroutine instead')
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except BaseException:
+            # 超时或调用线程被中断：取消后台协程
+            future.cancel()
+            raise
+
+    def close(self, timeout: float = 5.0):
+        """关闭共享连接池并停止循环（幂等）。"""
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+        if loop is None or thread is None or not thread.is_alive():
+            return
+        if self.init_shared_client:
+            from app.services.model_clients import close_shared_async_client
+            try:
+                asyncio.run_coroutine_threadsafe(close_shared_async_client(), loop).result(timeout)
+            except Exception:
+                pass
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout)
+        if not thread.is_alive():
+            loop.close()
+
+
+_RUNNER: Optional[LoopRunner] = None
+_RUNNER_LOCK = threading.Lock()
+
+
+def get_loop_runner() -> LoopRunner:
+    """进程级后台循环（懒创建）。"""
+    global _RUNNER
+    if _RUNNER is None:
+        with _RUNNER_LOCK:
+            if _RUNNER is None:
+                _RUNNER = LoopRunner()
+                atexit.register(_RUNNER.close)
+    return _RUNNER
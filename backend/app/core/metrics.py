@@ -0,0 +1,227 @@
+"""轻量指标：计数器 + 固定桶直方图，输出 Prometheus 文本格式（/metrics）。
+
+- 不依赖 prometheus_client；每次记录只做一次 bisect 与几次整数加法（持锁），热路径开销在微秒以下
+- timed(hist, stage=...) 以 time.perf_counter 计时，异常路径同样记录
+- 标签值组合在首次使用时创建，请只使用取值有限的标签（阶段名、结果类型等），不要用用户输入
+"""
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Sequence, Tuple
+import bisect
+import threading
+import time
+
+# 默认秒级桶：覆盖本地阶段（亚毫秒）到模型调用（数十秒）
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _label_str(names: Sequence[str], values: Tuple[str, ...], extra: str = '') -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name} expects labels {self.labelnames}, got {tuple(labels)}')
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, v in items:
+            lines.append(f'{self.name}{_label_str(self.labelnames, key)} {v:g}')
+        return lines
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [各桶计数（非累计，最后一格为 +Inf）, sum]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][idx] += 1
+            entry[1] += value
+
+    def count(self, **labels) -> int:
+        entry = self._values.get(self._key(labels))
+        return sum(entry[0]) if entry else 0
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1])) for k, v in self._values.items())
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, c in zip(self.buckets + (float('inf'),), counts):
+                cumulative += c
+                le = '+Inf' if bound == float('inf') else f'{bound:g}'
+                labels = _label_str(self.labelnames, key, 'le="%s"' % le)
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            lines.append(f'{self.name}_sum{_label_str(self.labelnames, key)} {total:.6g}')
+            lines.append(f'{self.name}_count{_label_str(self.labelnames, key)} {cumulative}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for m in metrics:
+            lines.extend(m.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+# ---- 报告流水线指标 ----
+STAGE_SECONDS = REGISTRY.histogram(
+    'cfp_stage_seconds', 'Latency of CFPAgent pipeline stages', ('stage',))
+CACHE_LOOKUPS = REGISTRY.counter(
+    'cfp_cache_lookups_total', 'Result cache lookups by outcome', ('result',))
+FALLBACKS = REGISTRY.counter(
+    'cfp_fallbacks_total', 'Pipeline fallbacks by kind', ('kind',))
+PARSE_FAILURES = REGISTRY.counter(
+    'cfp_parse_failures_total', 'Model outputs that failed JSON parsing or schema validation', ('source',))
+LOCAL_ANSWERS = REGISTRY.counter(
+    'cfp_local_answers_total', 'Reports answered by the local rules tier without a model call')
+RETRIEVAL_SHED = REGISTRY.counter(
+    'cfp_retrieval_shed_total', 'Hybrid retrieval searches skipped because the retriever pool was busy', ('path',))
+MODEL_RETRIES = REGISTRY.counter(
+    'gemini_retries_total', 'Retried Gemini HTTP requests', ('client',))
+CIRCUIT_TRANSITIONS = REGISTRY.counter(
+    'circuit_breaker_transitions_total', 'Circuit breaker state changes', ('breaker', 'state'))
+MODEL_ROUTER_REQUESTS = REGISTRY.counter(
+    'model_router_requests_total', 'Routed model calls by provider and outcome', ('provider', 'result'))
+MODEL_HEDGES = REGISTRY.counter(
+    'model_hedges_total', 'Hedged model requests by outcome', ('result',))
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    'http_request_seconds', 'API handler latency (time to response start)', ('method', 'route', 'status'))
+HTTP_RESPONSE_SECONDS = REGISTRY.histogram(
+    'http_response_seconds', 'API latency until the last response body chunk is sent', ('method', 'route', 'status'))
+
+
+@contextmanager
+def timed(hist: Histogram, **labels) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        hist.observe(time.perf_counter() - start, **labels)
+
+
+class HTTPMetricsMiddleware:
+    """纯 ASGI 中间件：按路由模板（而非实际路径，避免 job_id 造成标签爆炸）记录
+    http_request_seconds（到 http.response.start）与 http_response_seconds（到最后一个响应体片段，流式接口即整个流）。
+
+    只包装 send，不创建额外任务、不缓冲响应体，流式响应照常逐片段发出。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope.get("type") != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = 500
+        started = finished = False
+
+        def _observe(hist: Histogram):
+            route = scope.get("route")
+            hist.observe(time.perf_counter() - start, method=scope.get("method", ""),
+                         route=getattr(route, "path", "unmatched"), status=str(status))
+
+        async def _send(message):
+            nonlocal status, started, finished
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                started = True
+                _observe(HTTP_REQUEST_SECONDS)
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                await send(message)
+                finished = True
+                _observe(HTTP_RESPONSE_SECONDS)
+                return
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            # 处理出错或客户端断开：仍记录已耗时
+            if not started:
+                _observe(HTTP_REQUEST_SECONDS)
+            if not finished:
+                _observe(HTTP_RESPONSE_SECONDS)
+
+
+def render_latest() -> str:
+    return REGISTRY.render()
+
+
+CONTENT_TYPE_LATEST = 'text/plain; version=0.0.4; charset=utf-8'
@@ -1,7 +1,35 @@
+import contextlib
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-app = FastAPI(title="AI 财务顾问 API")
+from app.core.metrics import HTTPMetricsMiddleware
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 创建进程级共享 HTTP 连接池，供模型客户端复用 keep-alive 连接
+    from app.services.model_clients import close_shared_async_client, init_shared_async_client
+    await init_shared_async_client()
+    try:
+        yield
+    finally:
+        # 先等待后台报告任务结束（它们仍需使用共享连接池），再关闭连接池
+        import os
+        try:
+            from app.api.reports import drain_jobs
+            await drain_jobs(float(os.getenv('REPORT_DRAIN_TIMEOUT', '30')))
+        except Exception:
+            # 停机流程不能因为 drain 失败而跳过连接池释放
+            pass
+        await close_shared_async_client()
+        # 写出缓冲中的审计记录（阻塞操作放到线程中执行）
+        import asyncio
+        from app.services.audit import close_audit_writer
+        await asyncio.get_running_loop().run_in_executor(None, close_audit_writer)
+
+
+app = FastAPI(title="AI 财务顾问 API", lifespan=lifespan)
 
 # Allow CORS for frontend (development-friendly). In production narrow this list to your miniprogram proxy/origin.
 app.add_middleware(
@@ -12,6 +40,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 按路由记录接口耗时（纯 ASGI 中间件，不影响流式响应）
+app.add_middleware(HTTPMetricsMiddleware)
+
+
 @app.get("/")
 def read_root():
     """
@@ -19,6 +51,13 @@ def read_root():
     """
     return {"message": "欢迎使用 AI 财务顾问 API"}
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus 文本格式的进程内指标（各 worker 独立计数）。"""
+    from fastapi import Response
+    from app.core.metrics import CONTENT_TYPE_LATEST, render_latest
+    return Response(render_latest(), media_type=CONTENT_TYPE_LATEST)
+
 # include api routers
 try:
     from app.api import reports
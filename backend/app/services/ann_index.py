@@ -0,0 +1,243 @@
+"""近似最近邻（ANN）向量库：IVF（倒排文件）+ k-means 粗量化器。
+
+原理：用 k-means 把向量空间划分为 nlist 个簇（倒排表）；查询时只在距离查询最近的 nprobe 个簇内做精确打分。
+nprobe 越大召回越高、延迟越高；nprobe == nlist 时等价于精确检索。
+
+- 与 InMemoryVectorStore 共用存储与距离计算（继承），接口与 BaseVectorStore 一致
+- 训练前（向量数不足 train_size）自动退化为精确检索；达到阈值后自动训练
+- 训练后的 upsert 增量分配到最近的簇，已存在 id 会从旧簇移动到新簇
+- 每行的簇号与其在倒排表中的位置存于按行索引的数组，移动/删除为 O(1) 的交换删除
+- 粗量化使用 L2 距离（cosine 度量时先归一化）；ip 度量下粗量化为近似
+"""
+from typing import Any, Dict, List, Optional, Sequence
+import os
+
+import numpy as np
+
+from app.services.vectorstore import InMemoryVectorStore, QueryResult, StaleIndexError, _atomic_write
+
+
+def _sq_l2(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """(n, d) 与 (k, d) 之间的平方 L2 距离矩阵。"""
+    d2 = np.einsum('ij,ij->i', a, a)[:, None] - 2.0 * (a @ b.T) + np.einsum('ij,ij->i', b, b)[None, :]
+    np.maximum(d2, 0.0, out=d2)
+    return d2
+
+
+def kmeans(data: np.ndarray, k: int, iters: int = 20, seed: int = 0, chunk: int = 65536) -> np.ndarray:
+    """Lloyd k-means（随机样本初始化，空簇用离中心最远的点重新播种），返回 (k, d) float32 质心。"""
+    rng = np.random.default_rng(seed)
+    n = data.shape[0]
+    k = min(k, n)
+    centroids = data[rng.choice(n, size=k, replace=False)].astype(np.float32, copy=True)
+    assign = np.zeros(n, dtype=np.int64)
+    for _ in range(iters):
+        best = np.empty(n, dtype=np.float32)
+        for s in range(0, n, chunk):
+            d2 = _sq_l2(data[s:s + chunk], centroids)
+            assign[s:s + chunk] = d2.argmin(axis=1)
+            best[s:s + chunk] = d2[np.arange(d2.shape[0]), assign[s:s + chunk]]
+        counts = np.bincount(assign, minlength=k)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, data)
+        nonempty = counts > 0
+        centroids[nonempty] = sums[nonempty] / counts[nonempty, None]
+        empty = np.flatnonzero(~nonempty)
+        if empty.size:
+            far = np.argsort(best)[::-1][:empty.size]
+            centroids[empty] = data[far]
+    return centroids
+
+
+class IVFVectorStore(InMemoryVectorStore):
+    """IVF 近似检索向量库。
+
+    参数：
+      nlist: 簇（倒排表）数量，经验值约 sqrt(N) ~ 4*sqrt(N)
+      nprobe: 每次查询扫描的簇数，召回/速度旋钮，可在查询时覆盖
+      train_size: 自动训练阈值（默认 39 * nlist）；也可显式调用 train()
+    """
+
+    def __init__(self, metric: str = 'l2', dim: Optional[int] = None, nlist: int = 256, nprobe: int = 8,
+                 train_size: Optional[int] = None, kmeans_iters: int = 20, seed: int = 0,
+                 initial_capacity: int = 1024):
+        super().__init__(metric=metric, dim=dim, initial_capacity=initial_capacity)
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_size = train_size if train_size is not None else 39 * nlist
+        self.kmeans_iters = kmeans_iters
+        self.seed = seed
+        self.centroids: Optional[np.ndarray] = None
+        self._assign = np.empty(0, dtype=np.int32)  # 行 -> 簇号，-1 表示未分配
+        self._pos = np.empty(0, dtype=np.int64)  # 行 -> 在所属倒排表中的位置
+        self._lists: List[List[int]] = []
+        self._list_arrays: List[Optional[np.ndarray]] = []
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def _coarse_space(self, vecs: np.ndarray) -> np.ndarray:
+        if self.metric != 'cosine':
+            return vecs
+        norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+        return vecs / np.where(norms > 0, norms, 1.0)
+
+    def train(self, max_points: Optional[int] = None):
+        """在已存储的向量（或其随机样本）上训练粗量化器，并为全部向量分配簇。"""
+        if self._size == 0:
+            raise ValueError('cannot train an empty index')
+        data = self.vectors
+        limit = max_points or 256 * self.nlist
+        if data.shape[0] > limit:
+            rng = np.random.default_rng(self.seed)
+            data = data[rng.choice(data.shape[0], size=limit, replace=False)]
+        self.centroids = kmeans(self._coarse_space(data), self.nlist, iters=self.kmeans_iters, seed=self.seed)
+        assign = np.empty(self._size, dtype=np.int32)
+        for s in range(0, self._size, 65536):
+            part = self._vectors[s:min(s + 65536, self._size)]
+            assign[s:s + part.shape[0]] = _sq_l2(self._coarse_space(part), self.centroids).argmin(axis=1)
+        self._build_lists(assign)
+
+    def _build_lists(self, assign: np.ndarray):
+        """由每行簇号批量构建倒排表与位置数组。"""
+        n_lists = self.centroids.shape[0]
+        self._assign = np.full(max(self._size, 1), -1, dtype=np.int32)
+        self._pos = np.zeros(self._assign.shape[0], dtype=np.int64)
+        self._assign[:self._size] = assign
+        order = np.argsort(assign, kind='stable')
+        bounds = np.searchsorted(assign[order], np.arange(n_lists + 1))
+        self._list_arrays = [order[bounds[c]:bounds[c + 1]].astype(np.int64) for c in range(n_lists)]
+        self._lists = [arr.tolist() for arr in self._list_arrays]
+        valid = order[bounds[0]:]
+        self._pos[valid] = np.arange(valid.shape[0]) - bounds[assign[valid]]
+
+    def _reserve_assign(self, needed: int):
+        cap = self._assign.shape[0]
+        if needed <= cap:
+            return
+        cap = max(cap, 1)
+        while cap < needed:
+            cap *= 2
+        assign = np.full(cap, -1, dtype=np.int32)
+        assign[:self._assign.shape[0]] = self._assign
+        pos = np.zeros(cap, dtype=np.int64)
+        pos[:self._pos.shape[0]] = self._pos
+        self._assign, self._pos = assign, pos
+
+    def _unlink(self, row: int, label: int):
+        # 交换删除：表尾元素填到 row 的位置
+        rows = self._lists[label]
+        last = rows.pop()
+        if last != row:
+            p = int(self._pos[row])
+            rows[p] = last
+            self._pos[last] = p
+        self._list_arrays[label] = None
+
+    def _assign_rows(self, rows: np.ndarray, chunk: int = 65536):
+        self._reserve_assign(self._size)
+        for s in range(0, rows.shape[0], chunk):
+            part = rows[s:s + chunk]
+            labels = _sq_l2(self._coarse_space(self._vectors[part]), self.centroids).argmin(axis=1)
+            changed = self._assign[part] != labels
+            for row, label in zip(part[changed].tolist(), labels[changed].tolist()):
+                old = int(self._assign[row])
+                if old >= 0:
+                    self._unlink(row, old)
+                self._assign[row] = label
+                self._pos[row] = len(self._lists[label])
+                self._lists[label].append(row)
+                self._list_arrays[label] = None
+
+    def upsert(self, embeddings: List[List[float]], metadatas: List[Dict[str, Any]], ids: List[str]):
+        rows = super().upsert(embeddings, metadatas, ids)
+        if len(ids) == 0:
+            return rows
+        if self.is_trained:
+            self._assign_rows(np.asarray(rows, dtype=np.int64))
+        elif self._size >= self.train_size:
+            self.train()
+        return rows
+
+    def _forget_row(self, row: int):
+        if row >= self._assign.shape[0]:
+            return
+        label = int(self._assign[row])
+        if label >= 0:
+            self._unlink(row, label)
+            self._assign[row] = -1
+
+    def _move_row(self, src: int, dst: int):
+        if src >= self._assign.shape[0]:
+            return
+        label = int(self._assign[src])
+        if label >= 0:
+            p = int(self._pos[src])
+            self._lists[label][p] = dst
+            self._list_arrays[label] = None
+            self._assign[dst], self._pos[dst] = label, p
+            self._assign[src] = -1
+
+    def _list_rows(self, label: int) -> np.ndarray:
+        arr = self._list_arrays[label]
+        if arr is None:
+            arr = np.asarray(self._lists[label], dtype=np.int64)
+            self._list_arrays[label] = arr
+        return arr
+
+    def query(self, vector: List[float], top_k: int = 5, nprobe: Optional[int] = None) -> List[QueryResult]:
+        return self.query_batch([vector], top_k, nprobe=nprobe)[0]
+
+    def query_batch(self, vectors: Sequence[Sequence[float]], top_k: int = 5,
+                    nprobe: Optional[int] = None) -> List[List[QueryResult]]:
+        if not self.is_trained:
+            return super().query_batch(vectors, top_k)
+        if self._size == 0 or top_k <= 0:
+            return [[] for _ in range(len(vectors))]
+        queries = self._as_matrix(vectors)
+        n_lists = self.centroids.shape[0]
+        probe = max(1, min(nprobe or self.nprobe, n_lists))
+        coarse = _sq_l2(self._coarse_space(queries), self.centroids)
+        if probe < n_lists:
+            nearest = np.argpartition(coarse, probe - 1, axis=1)[:, :probe]
+        else:
+            nearest = np.broadcast_to(np.arange(n_lists), coarse.shape)
+        out = []
+        for i in range(queries.shape[0]):
+            cand = [self._list_rows(int(c)) for c in nearest[i]]
+            cand = np.concatenate(cand) if cand else np.empty(0, dtype=np.int64)
+            if cand.size == 0:
+                out.append([])
+                continue
+            dist = self._distances(queries[i:i + 1], rows=cand)[0]
+            out.append(self._collect(dist, top_k, rows=cand))
+        return out
+
+    # ---- 持久化：额外保存质心与每行的簇分配 ----
+
+    def _header(self) -> Dict[str, Any]:
+        return {**super()._header(), "nlist": self.nlist, "nprobe": self.nprobe, "train_size": self.train_size,
+                "kmeans_iters": self.kmeans_iters, "seed": self.seed, "trained": self.is_trained}
+
+    def _save_arrays(self, path: str):
+        super()._save_arrays(path)
+        if self.is_trained:
+            assign = self._assign[:self._size]
+            _atomic_write(os.path.join(path, 'centroids.npy'), lambda f: np.save(f, self.centroids))
+            _atomic_write(os.path.join(path, 'assign.npy'), lambda f: np.save(f, assign))
+
+    def _restore(self, path: str, header: Dict[str, Any], mmap: bool):
+        super()._restore(path, header, mmap)
+        if not header.get('trained'):
+            return
+        self.centroids = np.load(os.path.join(path, 'centroids.npy'))
+        assign = np.load(os.path.join(path, 'assign.npy'))
+        if assign.shape[0] != self._size:
+            raise StaleIndexError(f'IVF assignments at {path} do not match header count')
+        self._build_lists(assign.astype(np.int32, copy=False))
+
+    @classmethod
+    def _init_kwargs(cls, header: Dict[str, Any]) -> Dict[str, Any]:
+        return {**super()._init_kwargs(header), "nlist": header['nlist'], "nprobe": header['nprobe'],
+                "train_size": header['train_size'], "kmeans_iters": header['kmeans_iters'], "seed": header['seed']}
@@ -1,17 +1,211 @@
-"""简单审计记录器：按 JSON 行写入本地审计日志（供合规和追溯）。"""
+"""审计记录器：按 JSON 行写入本地审计日志（供合规和追溯）。
+
+audit_record 只在调用线程序列化记录并放入有界队列，不做磁盘 I/O；后台线程 AuditWriter 负责：
+- 批量写入：攒够 flush_bytes 字节或距上次写入超过 flush_interval 秒时写盘
+- 轮转：当前文件超过 max_bytes 时重命名为 audit.log.<UTC 时间戳>，gzip 压缩，仅保留最近 backup_count 个
+- 计数：queued（当前队列深度）/ enqueued / written / dropped（队列满被丢弃）/ rotations
+
+应用停机（app.main lifespan 结束）与进程退出（atexit）时 flush 并关闭；关闭后再次调用 audit_record 会重新启动写线程。
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import atexit
+import glob
+import gzip
 import json
 import os
-from datetime import datetime
+import queue
+import shutil
+import threading
+import time
 
 LOG_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'logs')
 os.makedirs(LOG_DIR, exist_ok=True)
 LOG_PATH = os.path.join(LOG_DIR, 'audit.log')
 
+_STOP = object()
+
+
+class _FlushRequest:
+    __slots__ = ('done',)
+
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class AuditWriter:
+    """后台审计写线程。write 线程安全且不阻塞；队列满时丢弃记录并计数。"""
+
+    def __init__(self, path: str = LOG_PATH, max_queue: int = 10000, flush_interval: float = 1.0,
+                 flush_bytes: int = 64 * 1024, max_bytes: int = 50 * 1024 * 1024, backup_count: int = 10):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._closed = False
+        # 关闭检查与入队在同一把锁内：close 置位后不会再有记录排到 _STOP 之后而丢失
+        self._lock = threading.Lock()
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.rotations = 0
+        self.errors = 0
+        self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+        self._thread.start()
+
+    # ---- 调用方接口 ----
+
+    def write(self, line: str) -> bool:
+        """放入一行（已序列化、以换行结尾）；队列满或已关闭时计入 dropped 并返回 False。"""
+        with self._lock:
+            if self._closed:
+                self.dropped += 1
+                return False
+            try:
+                self._queue.put_nowait(line)
+            except queue.Full:
+                self.dropped += 1
+                return False
+            self.enqueued += 1
+            return True
+
+    def flush(self, timeout: Optional[float] = 5.0) -> bool:
+        """等待此前放入的记录全部写盘。"""
+        if self._closed or not self._thread.is_alive():
+            return False
+        req = _FlushRequest()
+        try:
+            self._queue.put(req, timeout=timeout)
+        except queue.Full:
+            return False
+        return req.done.wait(timeout)
+
+    def close(self, timeout: Optional[float] = 5.0):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def stats(self) -> Dict[str, Any]:
+        return {"queued": self._queue.qsize(), "enqueued": self.enqueued, "written": self.written,
+                "dropped": self.dropped, "rotations": self.rotations, "errors": self.errors}
+
+    # ---- 写线程 ----
+
+    def _run(self):
+        batch: List[str] = []
+        size = 0
+        last_flush = time.monotonic()
+        while True:
+            timeout = max(0.0, self.flush_interval - (time.monotonic() - last_flush)) if batch else None
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if isinstance(item, str):
+                batch.append(item)
+                size += len(item)
+                if size < self.flush_bytes:
+                    continue
+            if batch:
+                self._write_batch(batch)
+                batch, size = [], 0
+            last_flush = time.monotonic()
+            if isinstance(item, _FlushRequest):
+                item.done.set()
+            elif item is _STOP:
+                return
+
+    def _write_batch(self, batch: List[str]):
+        try:
+            data = ''.join(batch).encode('utf-8')
+            if self.max_bytes and os.path.exists(self.path) and os.path.getsize(self.path) + len(data) > self.max_bytes:
+                self._rotate()
+            with open(self.path, 'ab') as f:
+                f.write(data)
+            self.written += len(batch)
+        except Exception:
+            # 审计失败不能影响主流程；计数供监控告警
+            self.errors += len(batch)
+
+    def _rotate(self):
+        if os.path.getsize(self.path) == 0:
+            return
+        stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')
+        rotated = f"{self.path}.{stamp}"
+        os.replace(self.path, rotated)
+        with open(rotated, 'rb') as src, gzip.open(rotated + '.gz', 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(rotated)
+        self.rotations += 1
+        # 时间戳定长，按文件名排序即按时间排序
+        old = sorted(glob.glob(glob.escape(self.path) + '.*.gz'))
+        for path in old[:max(0, len(old) - self.backup_count)]:
+            os.remove(path)
+
+
+_WRITER: Optional[AuditWriter] = None
+_WRITER_LOCK = threading.Lock()
+
+
+def create_audit_writer_from_env() -> AuditWriter:
+    """环境变量：AUDIT_QUEUE_SIZE / AUDIT_FLUSH_INTERVAL（秒）/ AUDIT_FLUSH_BYTES / AUDIT_MAX_BYTES / AUDIT_BACKUP_COUNT。"""
+    return AuditWriter(
+        LOG_PATH,
+        max_queue=int(os.getenv('AUDIT_QUEUE_SIZE', '10000')),
+        flush_interval=float(os.getenv('AUDIT_FLUSH_INTERVAL', '1.0')),
+        flush_bytes=int(os.getenv('AUDIT_FLUSH_BYTES', str(64 * 1024))),
+        max_bytes=int(os.getenv('AUDIT_MAX_BYTES', str(50 * 1024 * 1024))),
+        backup_count=int(os.getenv('AUDIT_BACKUP_COUNT', '10')),
+    )
+
+
+def get_audit_writer() -> AuditWriter:
+    """进程级写线程（懒加载；关闭后再次调用会重新创建）。"""
+    global _WRITER
+    writer = _WRITER
+    if writer is None or writer.closed:
+        with _WRITER_LOCK:
+            if _WRITER is None or _WRITER.closed:
+                _WRITER = create_audit_writer_from_env()
+            writer = _WRITER
+    return writer
+
 
 def audit_record(record: dict):
     entry = {
         'timestamp': datetime.utcnow().isoformat() + 'Z',
         **record
     }
-    with open(LOG_PATH, 'a', encoding='utf-8') as f:
-        f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+    # 在调用线程序列化：记录内容以调用时刻为准，之后调用方修改 record 不影响审计
+    get_audit_writer().write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+
+def flush_audit(timeout: Optional[float] = 5.0) -> bool:
+    writer = _WRITER
+    return writer.flush(timeout) if writer is not None else True
+
+
+def close_audit_writer(timeout: Optional[float] = 5.0):
+    writer = _WRITER
+    if writer is not None:
+        writer.close(timeout)
+
+
+def audit_stats() -> Dict[str, Any]:
+    writer = _WRITER
+    return writer.stats() if writer is not None else {}
+
+
+atexit.register(close_audit_writer)
@@ -1,7 +1,13 @@
 from typing import Dict, Any, List, Optional
+import asyncio
+import inspect
+import json
+import time
+
 from app.models.financials import FinancialStatement
 from app.services.retriever import InMemoryRetriever
 from app.services.model_clients import DummyModelClientLocal
+from app.core.metrics import CACHE_LOOKUPS, FALLBACKS, LOCAL_ANSWERS, PARSE_FAILURES, STAGE_SECONDS, timed
 
 
 class BaseModelClient:
@@ -30,12 +36,34 @@ class CFPAgent:
     注意：当前实现包含占位的 retriever 与 model client hook，实际部署需要实现向量数据库检索和模型 SDK。
     """
 
-    def __init__(self, model_client: Optional[object] = None, retriever: Optional[object] = None):
+    # 结果缓存（见 app.services.result_cache）；为 None 时不缓存
+    cache = None
+    # 规则引擎（见 app.services.rules_engine）：为 None 时使用进程级默认引擎
+    rules = None
+    # 第一层本地作答：常规画像由规则引擎直接返回，不调用模型；为 None 时读取 CFP_LOCAL_TIER_ENABLED
+    local_tier = None
+    # 上下文打包器（见 app.services.context_packer）：为 None 时使用进程级默认打包器
+    context_packer = None
+    # 模型输出 token 上限：为 None 时读取 CFP_MAX_OUTPUT_TOKENS（默认 512）
+    max_output_tokens = None
+
+    def __init__(self, model_client: Optional[object] = None, retriever: Optional[object] = None,
+                 cache: Optional[object] = None, rules: Optional[object] = None,
+                 local_tier: Optional[bool] = None, context_packer: Optional[object] = None,
+                 max_output_tokens: Optional[int] = None):
         self.model_client = model_client or DummyModelClientLocal()
         self.retriever = retriever or InMemoryRetriever(docs=[
             "示例法规片段：消费者债务相关法律条款摘要",
             "示例金融建议：债务重组与利率优化最佳实践"
         ])
+        if cache is None:
+            from app.services.result_cache import get_default_cache
+            cache = get_default_cache()
+        self.cache = cache
+        self.rules = rules
+        self.local_tier = local_tier
+        self.context_packer = context_packer
+        self.max_output_tokens = max_output_tokens
 
     # Gemini 指南：生成 prompt 时，请遵守以下模板并让模型输出严格的 JSON（no extra commentary）
     PROMPT_TEMPLATE = (
@@ -46,279 +74,332 @@ class CFPAgent:
         "OUTPUT: 严格返回 JSON，仅包含 keys: overview, recommendations, risks, confidence。"
     )
 
+    @staticmethod
+    def _fmt_amount(value) -> str:
+        # 规范化金额写法（100000 / 100000.0 / 1E+5 → 100000），使等价输入得到相同 prompt 与缓存键
+        try:
+            from decimal import Decimal
+            d = value if isinstance(value, Decimal) else Decimal(str(value))
+            return format(d.normalize(), 'f')
+        except Exception:
+            return str(value)
+
     def _build_prompt(self, fs: FinancialStatement, docs: List[str]) -> str:
+        fmt = self._fmt_amount
         input_summary = (
-            f"assets={fs.assets}, liabilities={fs.liabilities}, income={fs.income}, expenses={fs.expenses}"
+            f"assets={fmt(fs.assets)}, liabilities={fmt(fs.liabilities)}, "
+            f"income={fmt(fs.income)}, expenses={fmt(fs.expenses)}"
         )
-        context_chunks = "\n---\n".join(docs) if docs else ""
+        packer = self._context_packer()
+        docs = packer.pack(docs) if docs else []
+        context_chunks = packer.separator.join(docs)
         return self.PROMPT_TEMPLATE.format(input_summary=input_summary, context_chunks=context_chunks)
 
+    def _cache_key(self, prompt: str) -> str:
+        from app.services.result_cache import make_cache_key
+        client = self.model_client
+        namespace = f"{type(client).__name__}:{getattr(client, 'base_url', '')}"
+        return make_cache_key(prompt, namespace)
+
+    def _finalize(self, fs: FinancialStatement, result: Dict[str, Any], tier: str = "model",
+                  **audit_extra) -> Dict[str, Any]:
+        """合规检查 + 审计记录，返回最终结果。
+
+        tier 写入结果的 _tier 字段，标明作答来源：local（本地第一层）/ model（模型，含缓存命中）/ rules（规则回退）。
+        """
+        from app.services.compliance import check_compliance
+        from app.services.audit import audit_record
+        result = {**result, "_tier": tier}
+        with timed(STAGE_SECONDS, stage="compliance"):
+            result = check_compliance(result)
+        with timed(STAGE_SECONDS, stage="audit"):
+            audit_record({"agent": "CFPAgent", "input": str(fs.dict()), "result": result, **audit_extra})
+        return result
+
+    async def _cache_lookup(self, cache, cache_key: str) -> Optional[Dict[str, Any]]:
+        """查询结果缓存；带磁盘层的缓存在线程池中执行（见 result_cache.call_result_cache）。"""
+        from app.services.result_cache import call_result_cache
+        with timed(STAGE_SECONDS, stage="cache"):
+            cached = await call_result_cache(cache, 'get', cache_key)
+        CACHE_LOOKUPS.inc(result="hit" if cached is not None else "miss")
+        return cached
+
+    def _context_packer(self):
+        if self.context_packer is None:
+            from app.services.context_packer import get_default_context_packer
+            return get_default_context_packer()
+        return self.context_packer
+
+    def _max_tokens(self) -> int:
+        if self.max_output_tokens is None:
+            from app.services.context_packer import max_output_tokens
+            return max_output_tokens()
+        return self.max_output_tokens
+
+    def _rule_engine(self):
+        if self.rules is None:
+            from app.services.rules_engine import get_default_rule_engine
+            return get_default_rule_engine()
+        return self.rules
+
+    def _rule_fallback(self, fs: FinancialStatement) -> Dict[str, Any]:
+        # 回退到规则引擎（保守返回），避免抛出错误
+        FALLBACKS.inc(kind="rules")
+        return self._rule_engine().evaluate(fs)
+
+    def _local_answer(self, fs: FinancialStatement) -> Optional[Dict[str, Any]]:
+        """第一层：常规画像返回规则引擎结果（置信度来自分类器），否则返回 None 交给模型。"""
+        enabled = self.local_tier
+        if enabled is None:
+            from app.services.rules_engine import local_tier_enabled
+            enabled = local_tier_enabled()
+        if not enabled:
+            return None
+        engine = self._rule_engine()
+        with timed(STAGE_SECONDS, stage="local_tier"):
+            routine, confidence = engine.classify(fs)
+        if not routine:
+            return None
+        LOCAL_ANSWERS.inc()
+        return engine.evaluate(fs, confidence=round(confidence, 4))
+
+    @staticmethod
+    def _retrieval_query(fs: FinancialStatement) -> str:
+        return f"用户负债率分析 assets:{fs.assets} liabilities:{fs.liabilities}"
+
     def _retrieve(self, query: str, top_k: int = 5) -> List[str]:
         # 占位：实际实现应调用 self.retriever.get(query, top_k)
         if self.retriever:
             return self.retriever.get(query, top_k)
         return []
 
-    def analyze(self, fs: FinancialStatement) -> Dict[str, Any]:
-        # 1. 检索
-        query = f"用户负债率分析 assets:{fs.assets} liabilities:{fs.liabilities}"
-        docs = self._retrieve(query)
+    def analyze(self, fs: FinancialStatement, use_cache: bool = True) -> Dict[str, Any]:
+        """同步入口（脚本 / 批处理）：把 analyze_async 提交到进程级后台事件循环并等待结果。
 
-        # 2. 构建 prompt
-        # ensure docs is List[str]
-        if not isinstance(docs, list):
-            docs = [str(docs)] if docs else []
-        else:
-            docs = [str(d) for d in docs]
-        prompt = self._build_prompt(fs, docs)
+        后台循环长期存在（见 app.core.loop_runner），不必每次调用创建事件循环，模型客户端在其上复用共享连接池。
+        已在事件循环中的代码请直接 await analyze_async。
+        """
+        from app.core.loop_runner import get_loop_runner
+        return get_loop_runner().run(self.analyze_async(fs, use_cache=use_cache))
 
-        # 3. 调用模型
-        if self.model_client is None:
-            # 回退到简单规则引擎（保守返回），避免抛出错误
-            debt_ratio = fs.debt_ratio()
-            overview = f"用户当前负债率为 {debt_ratio:.2f}"
-            recs = ["建议优先偿还高息负债，或调整预算以减少支出。"] if debt_ratio > 0.6 else ["保持良好预算习惯并建立应急基金。"]
-            return {"overview": overview, "recommendations": recs, "risks": [], "confidence": 0.6}
-
-        # 支持 model_client 的异步实现：优先调用 async_generate 或 await 可等待对象
-        raw = None
-        try:
-            # prefer async_generate if available via getattr
-            import asyncio, inspect
-            async_gen = getattr(self.model_client, 'async_generate', None)
-            gen = getattr(self.model_client, 'generate', None)
-
-            loop_running = False
+    async def _retrieve_docs(self, fs: FinancialStatement) -> List[str]:
+        """检索（retriever 提供 aget 时使用异步接口）；失败视为无结果。"""
+        retrieve = getattr(self.retriever, 'aget', None) or getattr(self.retriever, 'get', None)
+        if not callable(retrieve):
+            return []
+        with timed(STAGE_SECONDS, stage="retrieval"):
             try:
-                loop = asyncio.get_event_loop()
-                loop_running = loop.is_running()
+                docs = retrieve(self._retrieval_query(fs), 5)
+                if inspect.isawaitable(docs):
+                    docs = await docs
             except Exception:
-                loop_running = False
-
-            if async_gen is not None and callable(async_gen):
-                # If event loop is running (e.g. TestClient/uvicorn), avoid creating coroutines here
-                if loop_running:
-                    # fallback to sync generate if available
-                    if gen is None:
-                        raise RuntimeError('model_client has no generate method')
-                    raw = gen(prompt)
-                else:
-                    # safe to run coroutine; ensure we pass a coroutine object
-                    coro = async_gen(prompt)
-                    if inspect.iscoroutine(coro):
-                        raw = asyncio.run(coro)
-                    elif inspect.isawaitable(coro):
-                        async def _wrap():
-                            return await coro
-                        raw = asyncio.run(_wrap())
-                    else:
-                        raw = coro
-            else:
-                if gen is None:
-                    raise RuntimeError('model_client has no generate method')
-                maybe = gen(prompt)
-                if inspect.isawaitable(maybe):
-                    if loop_running:
-                        # cannot await here; fallback to sync generate
-                        raw = gen(prompt)
-                    else:
-                        if inspect.iscoroutine(maybe):
-                            raw = asyncio.run(maybe)
-                        elif inspect.isawaitable(maybe):
-                            async def _wrap2():
-                                return await maybe
-                            raw = asyncio.run(_wrap2())
-                        else:
-                            raw = maybe
-                else:
-                    raw = maybe
-        except Exception:
-            # 如果在异步执行中出错，回退为同步调用（若可用）或规则引擎
+                return []
+        if not isinstance(docs, list):
+            return [str(docs)] if docs else []
+        return [str(d) for d in docs]
+
+    async def _generate(self, prompt: str, max_tokens: int) -> Optional[str]:
+        """非流式模型调用，失败返回 None（由调用方回退到规则引擎）。
+
+        优先 async_generate；仅当客户端没有异步实现（或抛出 NotImplementedError）时才在线程池中运行同步 generate。
+        异步调用的失败（provider 错误、5xx、超时、重试用尽、熔断打开）已经过客户端自身的重试，
+        不再用同步接口重跑一遍重试循环。
+        """
+        from app.services.model_clients import native_async_generate
+        async_gen = native_async_generate(self.model_client)
+        if async_gen is not None:
             try:
-                gen = getattr(self.model_client, 'generate', None)
-                if gen is None:
-                    raise RuntimeError('model_client has no generate method')
-                raw = gen(prompt)
+                raw = async_gen(prompt, max_tokens=max_tokens)
+                return await raw if inspect.isawaitable(raw) else raw
+            except NotImplementedError:
+                FALLBACKS.inc(kind="sync_generate")
             except Exception:
-                debt_ratio = fs.debt_ratio()
-                overview = f"用户当前负债率为 {debt_ratio:.2f}"
-                recs = ["建议优先偿还高息负债，或调整预算以减少支出。"] if debt_ratio > 0.6 else ["保持良好预算习惯并建立应急基金。"]
-                return {"overview": overview, "recommendations": recs, "risks": [], "confidence": 0.6}
-
-        # 4. 解析模型输出（期望严格 JSON）
+                return None
+        gen = getattr(self.model_client, 'generate', None)
+        if not callable(gen):
+            return None
+        loop = asyncio.get_running_loop()
         try:
-            import json
-            from app.schemas.agent_output import AgentOutputModel
-
-            parsed = json.loads(str(raw))
-            # 使用 Pydantic 验证严格的 JSON schema（符合 Gemini 指定要求）
-            model = AgentOutputModel.parse_obj(parsed)
-            return model.dict()
-        except Exception as e:
-            # 若解析失败，返回模型原始文本封装在 overview 中，同时信心为 0
-            return {"overview": str(raw), "recommendations": [], "risks": [], "confidence": 0.0, "_error": str(e)}
-
-    async def analyze_async(self, fs: FinancialStatement) -> Dict[str, Any]:
-        """异步版本：优先使用 model_client.async_generate，如果不可用则在后台线程运行同步 generate。"""
-        # 1. 检索（假设 retriever 也可能有 async 接口）
-        query = f"用户负债率分析 assets:{fs.assets} liabilities:{fs.liabilities}"
-        docs = []
-        retrieve = getattr(self.retriever, 'aget', None) or getattr(self.retriever, 'get', None)
-        if callable(retrieve):
+            raw = await loop.run_in_executor(None, lambda: gen(prompt, max_tokens=max_tokens))
+            return await raw if inspect.isawaitable(raw) else raw
+        except Exception:
+            return None
+
+    @staticmethod
+    def _parse_output(raw: Any) -> Dict[str, Any]:
+        """解析并按 AgentOutputModel 校验模型输出（严格 JSON），失败抛出异常。"""
+        from app.schemas.agent_output import AgentOutputModel
+        parsed = raw if isinstance(raw, dict) else json.loads(str(raw))
+        return AgentOutputModel.parse_obj(parsed).dict()
+
+    async def _complete(self, fs: FinancialStatement, result: Dict[str, Any], cache,
+                        cache_key: Optional[str]) -> Dict[str, Any]:
+        if cache is not None:
+            from app.services.result_cache import call_result_cache
+            await call_result_cache(cache, 'set', cache_key, result)
+        return self._finalize(fs, result)
+
+    async def retrieve_batch_async(self, statements: List[FinancialStatement], top_k: int = 5) -> List[List[str]]:
+        """批量检索：retriever 提供 get_batch 时一次调用完成（在线程池中运行），否则逐条检索。单条失败视为无结果。"""
+        queries = [self._retrieval_query(fs) for fs in statements]
+        get_batch = getattr(self.retriever, 'get_batch', None)
+        if callable(get_batch):
+            loop = asyncio.get_running_loop()
             try:
-                res = retrieve(query, 5)
-                # 如果返回 awaitable，则 await，否则直接使用
-                import inspect
-                if inspect.isawaitable(res):
-                    docs = await res
-                else:
-                    docs = res
+                results = await loop.run_in_executor(None, lambda: get_batch(queries, top_k))
+                return [[str(d) for d in docs] for docs in results]
             except Exception:
-                docs = []
-
-        # 2. 构建 prompt
-        prompt = self._build_prompt(fs, docs)
-
-        # 3. 调用 model_client 的异步接口或在线程池中运行同步方法
-        raw = None
-        async_gen = getattr(self.model_client, 'async_generate', None)
-        if async_gen and callable(async_gen):
+                pass
+        out = []
+        for query in queries:
             try:
-                res = async_gen(prompt)
-                import inspect
-                if inspect.isawaitable(res):
-                    raw = await res
-                else:
-                    raw = res
+                out.append([str(d) for d in self._retrieve(query, top_k)])
             except Exception:
-                # 回退到 sync generate
-                gen = getattr(self.model_client, 'generate', None)
-                if gen:
-                    raw = gen(prompt)
-        else:
-            gen = getattr(self.model_client, 'generate', None)
-            if gen:
-                # run sync in threadpool
-                import asyncio
-                loop = asyncio.get_running_loop()
-                raw = await loop.run_in_executor(None, lambda: gen(prompt))
-
-        # 4. 解析与验证
+                out.append([])
+        return out
+
+    async def analyze_async(self, fs: FinancialStatement, use_cache: bool = True,
+                            docs: Optional[List[str]] = None) -> Dict[str, Any]:
+        """异步分析：运行 analyze_events_async 的非流式模式并返回最终结果。
+
+        use_cache=False 时跳过结果缓存（既不读取也不写入）；docs 不为 None 时跳过检索（批量接口预先检索）。
+        常规画像由规则引擎直接作答（见 _local_answer），不检索也不调用模型。
+        """
+        result = None
+        async for event in self.analyze_events_async(fs, use_cache=use_cache, docs=docs, stream=False):
+            result = event["data"]
+        return result
+
+    # 流式部分字段路径 -> 事件名
+    _PARTIAL_EVENTS = {"overview": "overview", "recommendations": "recommendation", "risks": "risk"}
+
+    @classmethod
+    def _partial_event(cls, path: tuple, value: Any) -> Optional[Dict[str, Any]]:
+        name = cls._PARTIAL_EVENTS.get(path[0])
+        if name is None or not isinstance(value, str):
+            return None
+        if name == "overview":
+            return {"event": name, "data": value} if len(path) == 1 else None
+        return {"event": name, "index": path[1], "data": value} if len(path) == 2 else None
+
+    async def analyze_stream_async(self, fs: FinancialStatement, use_cache: bool = True) -> Dict[str, Any]:
+        """尝试用模型的流式接口增量组装 JSON，并在可用时立即返回验证通过的结果。"""
+        result = None
+        async for event in self.analyze_events_async(fs, use_cache=use_cache):
+            if event["event"] == "result":
+                result = event["data"]
+        return result
+
+    async def analyze_events_async(self, fs: FinancialStatement, use_cache: bool = True,
+                                   docs: Optional[List[str]] = None, stream: bool = True):
+        """分析流水线（同步 / 异步 / 流式入口共用）：async generator，依次产出事件 dict。
+
+        - {"event": "overview", "data": str}
+        - {"event": "recommendation" / "risk", "index": i, "data": str}
+        - {"event": "result", "data": 最终结果}（已通过 schema 校验与合规检查，总是最后一个事件）
+
+        阶段：本地第一层 → 检索 → 构建 prompt → 缓存 → 模型（stream=True 且客户端支持时流式，
+        流式未得到合法结果时回退到非流式）→ 解析 → 合规与审计。模型不可用时回退到规则引擎，
+        输出无法解析时返回原文并将 confidence 置 0（附 _error）。
+
+        部分字段在模型流中一旦可解析就立即产出，未经校验与合规检查，仅用于提前展示；
+        最终结果以 result 事件为准（回退路径下其内容可能与已推送的部分字段不同）。
+        """
+        local = self._local_answer(fs)
+        if local is not None:
+            yield {"event": "result", "data": self._finalize(fs, local, tier="local")}
+            return
+
+        if docs is None:
+            docs = await self._retrieve_docs(fs)
+
+        with timed(STAGE_SECONDS, stage="prompt"):
+            prompt = self._build_prompt(fs, docs)
+
+        # 命中缓存则直接返回（仍执行合规检查与审计）
+        cache = self.cache if use_cache else None
+        cache_key = self._cache_key(prompt) if cache is not None else None
+        if cache is not None:
+            cached = await self._cache_lookup(cache, cache_key)
+            if cached is not None:
+                yield {"event": "result", "data": self._finalize(fs, cached, cached=True)}
+                return
+
+        if self.model_client is None:
+            yield {"event": "result", "data": self._finalize(fs, self._rule_fallback(fs), tier="rules", fallback="rules")}
+            return
+
+        max_tokens = self._max_tokens()
+        stream_gen = getattr(self.model_client, 'async_stream_generate', None) if stream else None
+        if callable(stream_gen):
+            async for event in self._stream_model(stream_gen, prompt, max_tokens):
+                if event["event"] == "result":
+                    yield {"event": "result", "data": await self._complete(fs, event["data"], cache, cache_key)}
+                    return
+                yield event
+            # 流式结束但未能得到合法 JSON，回退到非流式生成
+            FALLBACKS.inc(kind="stream_to_nonstream")
+
+        with timed(STAGE_SECONDS, stage="model"):
+            raw = await self._generate(prompt, max_tokens)
+        if raw is None:
+            yield {"event": "result", "data": self._finalize(fs, self._rule_fallback(fs), tier="rules", fallback="rules")}
+            return
+
         try:
-            import json
-            from app.schemas.agent_output import AgentOutputModel
-            parsed = json.loads(str(raw))
-            model = AgentOutputModel.parse_obj(parsed)
-            result = model.dict()
-            from app.services.compliance import check_compliance
-            from app.services.audit import audit_record
-            result = check_compliance(result)
-            audit_record({"agent": "CFPAgent", "input": str(fs.dict()), "result": result})
-            return result
+            with timed(STAGE_SECONDS, stage="parse"):
+                result = self._parse_output(raw)
         except Exception as e:
+            PARSE_FAILURES.inc(source="model")
+            FALLBACKS.inc(kind="raw_text")
             fallback = {"overview": str(raw), "recommendations": [], "risks": [], "confidence": 0.0, "_error": str(e)}
-            from app.services.compliance import check_compliance
-            from app.services.audit import audit_record
-            fallback = check_compliance(fallback)
-            audit_record({"agent": "CFPAgent", "input": str(fs.dict()), "result": fallback})
-            return fallback
+            yield {"event": "result", "data": self._finalize(fs, fallback)}
+            return
+        yield {"event": "result", "data": await self._complete(fs, result, cache, cache_key)}
 
-    async def analyze_stream_async(self, fs: FinancialStatement) -> Dict[str, Any]:
-        """尝试用模型的流式接口增量组装 JSON，并在可用时立即返回验证通过的结果。"""
+    async def _stream_model(self, stream_gen, prompt: str, max_tokens: int):
+        """消费模型流：产出部分字段事件，得到通过 schema 校验的对象时产出 {"event": "result"}（未做合规检查）。
+        流出错或结束仍无合法对象时直接结束。"""
         from app.services.stream_parser import StreamJSONBuilder
-
-        query = f"用户负债率分析 assets:{fs.assets} liabilities:{fs.liabilities}"
-        docs = []
-        retrieve = getattr(self.retriever, 'aget', None) or getattr(self.retriever, 'get', None)
-        if callable(retrieve):
-            try:
-                res = retrieve(query, 5)
-                import inspect
-                if inspect.isawaitable(res):
-                    docs = await res
-                else:
-                    docs = res
-            except Exception:
-                docs = []
-
-        if not isinstance(docs, list):
-            docs = [str(docs)] if docs else []
-        else:
-            docs = [str(d) for d in docs]
-
-        prompt = self._build_prompt(fs, docs)
-
-        stream_gen = getattr(self.model_client, 'async_stream_generate', None)
-        if not stream_gen or not callable(stream_gen):
-            # 不支持流式，回退到普通 async 分析
-            return await self.analyze_async(fs)
-
-        builder = StreamJSONBuilder()
+        builder = StreamJSONBuilder(track_fields=True)
+        # 流式阶段不能用 timed 包住 yield（会把消费方耗时算进去），这里手动记录首片段与完整结果耗时
+        started = time.perf_counter()
+        first_chunk = True
         try:
-            import inspect
-            stream_obj = stream_gen(prompt, max_tokens=512)
+            stream_obj = stream_gen(prompt, max_tokens=max_tokens)
             # 如果返回的是 awaitable，需要先 await 得到 async iterable
             if inspect.isawaitable(stream_obj):
                 stream_obj = await stream_obj
-
-            # 期望 stream_obj 是异步可迭代对象
             if not hasattr(stream_obj, '__aiter__'):
-                # 不支持异步迭代，回退
-                raise RuntimeError('stream does not provide async iterator')
+                return
 
             async for chunk in stream_obj:
+                if first_chunk:
+                    first_chunk = False
+                    STAGE_SECONDS.observe(time.perf_counter() - started, stage="model_first_chunk")
                 try:
                     obj = builder.feed(chunk)
-                    if obj is not None:
-                        # 尝试用 schema 校验
-                        from app.schemas.agent_output import AgentOutputModel
-                        model = AgentOutputModel.parse_obj(obj)
-                        result = model.dict()
-                        from app.services.compliance import check_compliance
-                        from app.services.audit import audit_record
-                        result = check_compliance(result)
-                        audit_record({"agent": "CFPAgent", "input": str(fs.dict()), "result": result})
-                        return result
                 except Exception:
-                    # 当前片段不能组成合法 JSON，继续等待更多片段
+                    # 当前值超长等异常：丢弃并继续等待更多片段
                     continue
+                for path, value in builder.drain_fields():
+                    event = self._partial_event(path, value)
+                    if event is not None:
+                        yield event
+                if obj is None:
+                    continue
+                try:
+                    result = self._parse_output(obj)
+                except Exception:
+                    # 解析出的 JSON 不符合 schema，继续等待后续对象
+                    PARSE_FAILURES.inc(source="stream")
+                    continue
+                STAGE_SECONDS.observe(time.perf_counter() - started, stage="model")
+                yield {"event": "result", "data": result}
+                return
         except Exception:
-            # 流式过程出错，回退
-            pass
-
-        # 流式结束但未能得到合法 JSON，回退到非流式生成
-        try:
-            gen = getattr(self.model_client, 'async_generate', None)
-            if gen and callable(gen):
-                res = gen(prompt)
-                import inspect
-                if inspect.isawaitable(res):
-                    raw = await res
-                else:
-                    raw = res
-                import json
-                from app.schemas.agent_output import AgentOutputModel
-                parsed = json.loads(str(raw))
-                model = AgentOutputModel.parse_obj(parsed)
-                result = model.dict()
-                from app.services.compliance import check_compliance
-                from app.services.audit import audit_record
-                result = check_compliance(result)
-                audit_record({"agent": "CFPAgent", "input": str(fs.dict()), "result": result})
-                return result
-        except Exception:
-            pass
-
-        # 最后退化到规则引擎
-        debt_ratio = fs.debt_ratio()
-        overview = f"用户当前负债率为 {debt_ratio:.2f}"
-        recs = ["建议优先偿还高息负债，或调整预算以减少支出。"] if debt_ratio > 0.6 else ["保持良好预算习惯并建立应急基金。"]
-        fallback = {"overview": overview, "recommendations": recs, "risks": [], "confidence": 0.6}
-        from app.services.compliance import check_compliance
-        from app.services.audit import audit_record
-        fallback = check_compliance(fallback)
-        audit_record({"agent": "CFPAgent", "input": str(fs.dict()), "result": fallback})
-        return fallback
+            # 流式过程出错，由调用方回退
+            return
 
 
 class DummyModelClient(BaseModelClient):
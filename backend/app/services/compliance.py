@@ -1,30 +1,162 @@
 """合规模块：检查模型输出，注入免责声明，并决定是否需要人工复核。
 
 规则（示例）：
-- 如果 recommendations 中包含法律行动（例如 '起诉', '诉讼'）或明确法律条款，标记为需要人工法律复核。
+- 如果输出（overview / recommendations / risks）中包含法律行动（例如 '起诉', '诉讼'）或明确法律条款，标记为需要人工法律复核。
 - 始终附加简短免责声明，提示用户咨询本地执业律师以获得法律意见。
+
+词典按类别组织（{category: [term, ...]}），预编译为 Aho–Corasick 自动机，所有文本字段一次扫描完成，
+耗时与文本长度成正比、与词条数量基本无关。COMPLIANCE_TERMS_PATH 指向 JSON 文件时使用该词典，
+COMPLIANCE_REVIEW_CATEGORIES（逗号分隔，默认 legal）中的类别命中即需要人工复核。
+命中明细（字段、位置、词条、类别）写入 _compliance_matches 供复核人员定位。
 """
-from typing import Dict, Any
-import re
+from collections import deque
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import bisect
+import json
+import os
+import threading
 
 
 LEGAL_KEYWORDS = ['起诉', '诉讼', '仲裁', '法律程序', '诉讼方案']
 
+DEFAULT_TERMS: Dict[str, List[str]] = {'legal': LEGAL_KEYWORDS}
+
+DISCLAIMER = '本报告为信息性建议，不构成法律意见；如需法律意见，请咨询持牌律师。'
+
+# 字段之间的分隔符：不会出现在词条中，保证匹配不跨字段
+_FIELD_SEP = '\x00'
+
+
+def _norm(text: str) -> str:
+    # 仅做不改变长度的小写化，保证命中位置与原文一致
+    lowered = text.lower()
+    return lowered if len(lowered) == len(text) else text
+
+
+class ComplianceScanner:
+    """多模式匹配器（Aho–Corasick）。scan 返回 [(start, end, term, category)]，按位置排序，允许重叠。"""
+
+    def __init__(self, terms: Dict[str, Iterable[str]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[str, str]]] = [[]]
+        self.size = 0
+        for category, words in terms.items():
+            for word in words:
+                if word and _FIELD_SEP not in word:
+                    self._add(_norm(word), word, category)
+        self._build()
+
+    def _add(self, key: str, term: str, category: str):
+        node = 0
+        for ch in key:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        if (term, category) not in self._out[node]:
+            self._out[node].append((term, category))
+            self.size += 1
+
+    def _build(self):
+        # BFS 计算失败指针，并把失败链上的输出合并到当前节点
+        todo = deque(self._goto[0].values())
+        while todo:
+            node = todo.popleft()
+            for ch, child in self._goto[node].items():
+                todo.append(child)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def scan(self, text: str) -> List[Tuple[int, int, str, str]]:
+        goto, fail, out = self._goto, self._fail, self._out
+        matches = []
+        node = 0
+        for i, ch in enumerate(_norm(text)):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for term, category in out[node]:
+                matches.append((i + 1 - len(term), i + 1, term, category))
+        matches.sort()
+        return matches
+
+    def scan_fields(self, fields: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        """一次扫描多个 (字段名, 文本)，命中位置相对于各字段文本。"""
+        starts = []
+        pos = 0
+        for _, text in fields:
+            starts.append(pos)
+            pos += len(text) + 1
+        joined = _FIELD_SEP.join(text for _, text in fields)
+        hits = []
+        for start, end, term, category in self.scan(joined):
+            idx = bisect.bisect_right(starts, start) - 1
+            offset = starts[idx]
+            hits.append({"field": fields[idx][0], "start": start - offset, "end": end - offset,
+                         "term": term, "category": category})
+        return hits
+
+
+def _result_fields(result: Dict[str, Any]) -> List[Tuple[str, str]]:
+    fields = []
+    overview = result.get('overview')
+    if isinstance(overview, str):
+        fields.append(('overview', overview))
+    for key in ('recommendations', 'risks'):
+        for i, item in enumerate(result.get(key, []) or []):
+            if isinstance(item, str):
+                fields.append((f'{key}[{i}]', item))
+    return fields
+
+
+def load_terms(path: str) -> Dict[str, List[str]]:
+    """读取词典 JSON：{"category": ["term", ...]}。"""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if not isinstance(data, dict):
+        raise ValueError('compliance terms file must be a JSON object of {category: [terms]}')
+    return {str(cat): [str(t) for t in terms] for cat, terms in data.items()}
+
+
+_DEFAULT_SCANNER: Optional[ComplianceScanner] = None
+_REVIEW_CATEGORIES = ('legal',)
+_SCANNER_LOCK = threading.Lock()
+
+
+def get_default_scanner() -> ComplianceScanner:
+    """进程级扫描器（懒加载）：COMPLIANCE_TERMS_PATH 未设置时使用 DEFAULT_TERMS。"""
+    global _DEFAULT_SCANNER, _REVIEW_CATEGORIES
+    if _DEFAULT_SCANNER is None:
+        with _SCANNER_LOCK:
+            if _DEFAULT_SCANNER is None:
+                path = os.getenv('COMPLIANCE_TERMS_PATH')
+                terms = load_terms(path) if path else DEFAULT_TERMS
+                cats = os.getenv('COMPLIANCE_REVIEW_CATEGORIES', 'legal')
+                _REVIEW_CATEGORIES = tuple(c.strip() for c in cats.split(',') if c.strip())
+                _DEFAULT_SCANNER = ComplianceScanner(terms)
+    return _DEFAULT_SCANNER
+
 
-def check_compliance(result: Dict[str, Any]) -> Dict[str, Any]:
+def check_compliance(result: Dict[str, Any], scanner: Optional[ComplianceScanner] = None,
+                     review_categories: Optional[Iterable[str]] = None) -> Dict[str, Any]:
     """返回增强后的结果和合规元数据"""
-    needs_legal = False
-    recs = result.get('recommendations', []) or []
-    for r in recs:
-        for kw in LEGAL_KEYWORDS:
-            if re.search(kw, r):
-                needs_legal = True
-                break
-        if needs_legal:
-            break
+    if scanner is None:
+        scanner = get_default_scanner()
+    review = set(_REVIEW_CATEGORIES if review_categories is None else review_categories)
+    matches = scanner.scan_fields(_result_fields(result))
+    needs_legal = any(m['category'] in review for m in matches)
 
     # 注入免责声明（简短）
-    disclaimer = '本报告为信息性建议，不构成法律意见；如需法律意见，请咨询持牌律师。'
-    result['_disclaimer'] = disclaimer
+    result['_disclaimer'] = DISCLAIMER
     result['_needs_legal_review'] = needs_legal
+    result['_compliance_matches'] = matches
     return result
@@ -0,0 +1,239 @@
+"""本地确定性 embedding：字符 n-gram 哈希 + TF-IDF 加权 + 稀疏随机投影，只依赖 NumPy。
+
+- 字符 n-gram 对中文无需分词；哈希在 NumPy 中向量化计算，跨进程、跨机器结果一致
+- fit(texts) 可选地统计文档频率得到 idf；未 fit 时 idf 全为 1（仅次线性 tf 加权）
+- 每个哈希特征映射到 density 个输出维度（符号 ±1），相当于稀疏随机投影到 dim 维，输出 L2 归一化
+- signature() 描述全部影响输出的参数（含 idf），用于向量库 header 与 embedding 缓存键
+
+EmbeddingCache / CachedEmbedder 以内容哈希为键把向量存入 SQLite，未变化的 chunk 在多次摄取之间不会重复计算。
+"""
+from typing import Dict, List, Optional, Sequence, Tuple
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+
+import numpy as np
+
+_WS = re.compile(r'\s+')
+_MULT = np.uint64(0x100000001B3)
+_MIX1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX2 = np.uint64(0x94D049BB133111EB)
+
+
+def _mix64(h: np.ndarray) -> np.ndarray:
+    # splitmix64 finalizer：打散低位相关性
+    h = h ^ (h >> np.uint64(30))
+    h = h * _MIX1
+    h = h ^ (h >> np.uint64(27))
+    h = h * _MIX2
+    return h ^ (h >> np.uint64(31))
+
+
+class HashingEmbedder:
+    """确定性的本地 embedding 后端。实例可调用：embedder(texts) -> (len(texts), dim) float32 矩阵。"""
+
+    VERSION = 'hash-v1'
+
+    def __init__(self, dim: int = 256, ngram_range: Tuple[int, int] = (1, 3), n_features: int = 2 ** 18,
+                 density: int = 4, seed: int = 0, sublinear_tf: bool = True):
+        self.dim = dim
+        self.ngram_range = tuple(ngram_range)
+        self.n_features = n_features
+        self.density = density
+        self.seed = seed
+        self.sublinear_tf = sublinear_tf
+        self.idf: Optional[np.ndarray] = None
+        self._proj: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+    # 投影表可由 seed 重建，序列化（进程池传参）时不携带
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['_proj'] = None
+        return state
+
+    def _projection(self) -> Tuple[np.ndarray, np.ndarray]:
+        if self._proj is None:
+            rng = np.random.default_rng(self.seed)
+            idx = rng.integers(0, self.dim, size=(self.n_features, self.density), dtype=np.int32)
+            sign = rng.choice(np.array([-1.0, 1.0], dtype=np.float32), size=(self.n_features, self.density))
+            self._proj = (idx, sign / np.float32(np.sqrt(self.density)))
+        return self._proj
+
+    def features(self, text: str) -> np.ndarray:
+        """文本 -> 哈希特征 id 数组（每个字符 n-gram 一个，可重复）。"""
+        text = _WS.sub(' ', text.lower()).strip()
+        if not text:
+            return np.empty(0, dtype=np.int64)
+        cps = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+        length = cps.shape[0]
+        parts = []
+        lo, hi = self.ngram_range
+        with np.errstate(over='ignore'):
+            for n in range(lo, hi + 1):
+                if length < n:
+                    break
+                h = np.full(length - n + 1, np.uint64(n), dtype=np.uint64)
+                for j in range(n):
+                    h = h * _MULT + cps[j:length - n + 1 + j]
+                parts.append(_mix64(h) % np.uint64(self.n_features))
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(parts).astype(np.int64)
+
+    def fit(self, texts: Sequence[str]) -> 'HashingEmbedder':
+        """统计文档频率，得到平滑 idf：log((1 + N) / (1 + df)) + 1。"""
+        df = np.zeros(self.n_features, dtype=np.int64)
+        for t in texts:
+            df[np.unique(self.features(t))] += 1
+        self.idf = (np.log((1.0 + len(texts)) / (1.0 + df)) + 1.0).astype(np.float32)
+        return self
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """批量 embedding：所有文本的稀疏特征一次 bincount 投影到 (n, dim)。"""
+        n = len(texts)
+        out_rows, out_cols, out_vals = [], [], []
+        idx_table, sign_table = self._projection()
+        for row, text in enumerate(texts):
+            feats, counts = np.unique(self.features(text), return_counts=True)
+            if feats.size == 0:
+                continue
+            w = (1.0 + np.log(counts)) if self.sublinear_tf else counts.astype(np.float64)
+            if self.idf is not None:
+                w = w * self.idf[feats]
+            out_cols.append(idx_table[feats].ravel())
+            out_vals.append((sign_table[feats] * w[:, None].astype(np.float32)).ravel())
+            out_rows.append(np.full(feats.size * self.density, row, dtype=np.int64))
+        if not out_cols:
+            return np.zeros((n, self.dim), dtype=np.float32)
+        flat = np.concatenate(out_rows) * self.dim + np.concatenate(out_cols)
+        mat = np.bincount(flat, weights=np.concatenate(out_vals), minlength=n * self.dim)
+        mat = mat.reshape(n, self.dim).astype(np.float32)
+        norms = np.linalg.norm(mat, axis=1, keepdims=True)
+        return mat / np.where(norms > 0, norms, 1.0)
+
+    def __call__(self, texts: Sequence[str]) -> np.ndarray:
+        return self.embed(texts)
+
+    def signature(self) -> str:
+        idf_tag = 'none' if self.idf is None else hashlib.sha1(self.idf.tobytes()).hexdigest()[:12]
+        lo, hi = self.ngram_range
+        return (f"{self.VERSION}:dim={self.dim}:ng={lo}-{hi}:nf={self.n_features}:k={self.density}"
+                f":seed={self.seed}:tf={'log' if self.sublinear_tf else 'raw'}:idf={idf_tag}")
+
+    def save(self, path: str):
+        lo, hi = self.ngram_range
+        params = np.array([self.dim, lo, hi, self.n_features, self.density, self.seed, int(self.sublinear_tf)])
+        idf = self.idf if self.idf is not None else np.empty(0, dtype=np.float32)
+        with open(path, 'wb') as f:
+            np.savez(f, params=params, idf=idf)
+
+    @classmethod
+    def load(cls, path: str) -> 'HashingEmbedder':
+        data = np.load(path)
+        dim, lo, hi, n_features, density, seed, sublinear = (int(x) for x in data['params'])
+        emb = cls(dim=dim, ngram_range=(lo, hi), n_features=n_features, density=density, seed=seed,
+                  sublinear_tf=bool(sublinear))
+        emb.idf = data['idf'] if data['idf'].size else None
+        return emb
+
+
+class EmbeddingCache:
+    """SQLite embedding 缓存：key = sha1(signature + 文本)，value 为 float32 原始字节。
+
+    连接按进程懒创建，可安全地随 CachedEmbedder 传入进程池。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None or self._pid != os.getpid():
+            d = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(d, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30.0)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vec BLOB NOT NULL)')
+            conn.commit()
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    @staticmethod
+    def make_key(signature: str, text: str) -> str:
+        return hashlib.sha1(f"{signature}\x00{text}".encode('utf-8')).hexdigest()
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, np.ndarray]:
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            conn = self._connection()
+            for s in range(0, len(keys), 500):
+                part = list(keys[s:s + 500])
+                marks = ','.join('?' * len(part))
+                for key, blob in conn.execute(f'SELECT key, vec FROM embeddings WHERE key IN ({marks})', part):
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_many(self, items: Sequence[Tuple[str, np.ndarray]]):
+        if not items:
+            return
+        with self._lock:
+            conn = self._connection()
+            conn.executemany(
+                'INSERT OR REPLACE INTO embeddings (key, vec) VALUES (?, ?)',
+                [(k, np.asarray(v, dtype=np.float32).tobytes()) for k, v in items],
+            )
+            conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._connection().execute('SELECT COUNT(*) FROM embeddings').fetchone()[0]
+
+
+class CachedEmbedder:
+    """带内容哈希缓存的 embedder：只为缓存未命中的文本调用底层 embedder。"""
+
+    def __init__(self, embedder: HashingEmbedder, cache: EmbeddingCache):
+        self.embedder = embedder
+        self.cache = cache
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def dim(self) -> int:
+        return self.embedder.dim
+
+    def signature(self) -> str:
+        return self.embedder.signature()
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        sig = self.embedder.signature()
+        keys = [EmbeddingCache.make_key(sig, t) for t in texts]
+        found = self.cache.get_many(keys)
+        out = np.empty((len(texts), self.embedder.dim), dtype=np.float32)
+        miss_idx: List[int] = []
+        for i, key in enumerate(keys):
+            vec = found.get(key)
+            if vec is None:
+                miss_idx.append(i)
+            else:
+                out[i] = vec
+        self.hits += len(texts) - len(miss_idx)
+        self.misses += len(miss_idx)
+        if miss_idx:
+            computed = self.embedder.embed([texts[i] for i in miss_idx])
+            out[miss_idx] = computed
+            self.cache.put_many([(keys[i], computed[j]) for j, i in enumerate(miss_idx)])
+        return out
+
+    def __call__(self, texts: Sequence[str]) -> np.ndarray:
+        return self.embed(texts)
@@ -0,0 +1,170 @@
+"""混合检索器：BM25 关键词检索 + 向量检索，融合排序并去重。
+
+- get：同步调用，两路顺序执行
+- get_batch：多条查询一次 embed_fn 调用 + 一次 vector_store.query_batch，供批量报告接口使用
+- aget：两路在检索器自有的有界线程池（max_workers）中并发执行，受单次调用截止时间（deadline）约束；
+  超时的一路被丢弃，只用已完成的结果融合，检索阶段耗时因此有固定上限（CFPAgent.analyze_async 会优先使用 aget）。
+  注意：线程无法被取消，超时的检索仍会在该线程池中运行到结束并占用一个线程；线程池占满时新的检索直接跳过
+  （按无结果处理并计入 cfp_retrieval_shed_total），不会排队，也不会占用事件循环的默认线程池
+- 融合方式：rrf（Reciprocal Rank Fusion，默认，对分数尺度不敏感）或 weighted（各路分数 min-max 归一化后加权）
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import asyncio
+import threading
+
+from app.core.metrics import RETRIEVAL_SHED
+from app.services.retriever import BaseRetriever, BM25Retriever
+from app.services.vectorstore import BaseVectorStore
+
+ScoredDocs = List[Tuple[float, str]]
+EmbedFn = Callable[[List[str]], Sequence[Sequence[float]]]
+
+
+def _dedupe_key(text: str) -> str:
+    return ' '.join(text.split())
+
+
+class HybridRetriever(BaseRetriever):
+    """组合 lexical（BM25Retriever）与 vector_store + embed_fn 的检索器。
+
+    向量库 metadata 中 text_key 字段（默认 'text'，与 tools/ingest_example.py 一致）为 chunk 原文。
+    """
+
+    def __init__(self, lexical: Optional[BM25Retriever] = None, vector_store: Optional[BaseVectorStore] = None,
+                 embed_fn: Optional[EmbedFn] = None, fusion: str = 'rrf', rrf_k: int = 60,
+                 weights: Tuple[float, float] = (1.0, 1.0), candidate_multiplier: int = 4,
+                 deadline: Optional[float] = 0.3, text_key: str = 'text', max_workers: int = 4):
+        if fusion not in ('rrf', 'weighted'):
+            raise ValueError("fusion must be 'rrf' or 'weighted'")
+        if vector_store is not None and embed_fn is None:
+            raise ValueError('embed_fn is required when vector_store is given')
+        self.lexical = lexical
+        self.vector_store = vector_store
+        self.embed_fn = embed_fn
+        self.fusion = fusion
+        self.rrf_k = rrf_k
+        self.weights = weights
+        self.candidate_multiplier = candidate_multiplier
+        self.deadline = deadline
+        self.text_key = text_key
+        self.max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._inflight = 0  # 已提交且线程尚未结束的检索数（含已超时被丢弃的）
+        self._lock = threading.Lock()
+
+    # ---- 单路检索 ----
+
+    def _lexical_hits(self, query: str, k: int) -> ScoredDocs:
+        if self.lexical is None:
+            return []
+        return self.lexical.get_scored(query, k)
+
+    def _vector_hits(self, query: str, k: int) -> ScoredDocs:
+        if self.vector_store is None:
+            return []
+        vector = self.embed_fn([query])[0]
+        hits = []
+        for dist, _id, meta in self.vector_store.query(vector, k):
+            text = (meta or {}).get(self.text_key)
+            if text:
+                # 距离越小越相似，取负数使“分数越大越好”
+                hits.append((-float(dist), text))
+        return hits
+
+    # ---- 融合 ----
+
+    @staticmethod
+    def _normalize(hits: ScoredDocs) -> ScoredDocs:
+        if not hits:
+            return []
+        scores = [s for s, _ in hits]
+        lo, hi = min(scores), max(scores)
+        span = hi - lo
+        return [((s - lo) / span if span > 0 else 1.0, t) for s, t in hits]
+
+    def fuse(self, lexical_hits: ScoredDocs, vector_hits: ScoredDocs, top_k: int) -> ScoredDocs:
+        """融合两路结果并按规范化文本去重，返回 [(fused_score, text)] 降序。"""
+        fused: Dict[str, float] = {}
+        texts: Dict[str, str] = {}
+        for weight, hits in zip(self.weights, (lexical_hits, vector_hits)):
+            if self.fusion == 'weighted':
+                hits = self._normalize(hits)
+            seen = set()
+            for rank, (score, text) in enumerate(hits):
+                key = _dedupe_key(text)
+                if key in seen:
+                    continue
+                seen.add(key)
+                texts.setdefault(key, text)
+                contrib = weight / (self.rrf_k + rank + 1) if self.fusion == 'rrf' else weight * score
+                fused[key] = fused.get(key, 0.0) + contrib
+        ranked = sorted(fused.items(), key=lambda kv: kv[1], reverse=True)[:top_k]
+        return [(score, texts[key]) for key, score in ranked]
+
+    # ---- 对外接口 ----
+
+    def get_scored(self, query: str, top_k: int = 5) -> ScoredDocs:
+        k = top_k * self.candidate_multiplier
+        return self.fuse(self._lexical_hits(query, k), self._vector_hits(query, k), top_k)
+
+    def get(self, query: str, top_k: int = 5) -> List[str]:
+        return [t for _, t in self.get_scored(query, top_k)]
+
+    def get_batch(self, queries: List[str], top_k: int = 5) -> List[List[str]]:
+        unique = list(dict.fromkeys(queries))
+        k = top_k * self.candidate_multiplier
+        vector_hits: Dict[str, ScoredDocs] = {q: [] for q in unique}
+        if self.vector_store is not None and unique:
+            vectors = self.embed_fn(unique)
+            for q, results in zip(unique, self.vector_store.query_batch(vectors, k)):
+                vector_hits[q] = [(-float(dist), (meta or {})[self.text_key])
+                                  for dist, _id, meta in results if (meta or {}).get(self.text_key)]
+        fused = {q: [t for _, t in self.fuse(self._lexical_hits(q, k), vector_hits[q], top_k)] for q in unique}
+        return [list(fused[q]) for q in queries]
+
+    def _submit(self, path: str, fn, *args) -> Optional[asyncio.Future]:
+        """提交到自有线程池；已有 max_workers 个检索在跑时返回 None（跳过该路）。"""
+        with self._lock:
+            if self._inflight >= self.max_workers:
+                RETRIEVAL_SHED.inc(path=path)
+                return None
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix='hybrid-retriever')
+            self._inflight += 1
+        future = self._executor.submit(fn, *args)
+        future.add_done_callback(self._release)
+        return asyncio.wrap_future(future)
+
+    def _release(self, _future) -> None:
+        with self._lock:
+            self._inflight -= 1
+
+    def close(self) -> None:
+        """关闭自有线程池；不等待仍在运行的检索。"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    async def aget_scored(self, query: str, top_k: int = 5, deadline: Optional[float] = None) -> ScoredDocs:
+        """两路并发检索；超过 deadline（秒）仍未完成或被跳过的一路被忽略，单路异常同样视为无结果。"""
+        k = top_k * self.candidate_multiplier
+        lexical = self._submit('lexical', self._lexical_hits, query, k)
+        vector = self._submit('vector', self._vector_hits, query, k)
+        futures = {f for f in (lexical, vector) if f is not None}
+        timeout = self.deadline if deadline is None else deadline
+        done, pending = await asyncio.wait(futures, timeout=timeout) if futures else (set(), set())
+        for fut in pending:
+            fut.cancel()
+
+        def _result(fut) -> ScoredDocs:
+            if fut not in done or fut.cancelled() or fut.exception() is not None:
+                return []
+            return fut.result()
+
+        return self.fuse(_result(lexical), _result(vector), top_k)
+
+    async def aget(self, query: str, top_k: int = 5) -> List[str]:
+        return [t for _, t in await self.aget_scored(query, top_k)]
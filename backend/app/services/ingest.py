@@ -0,0 +1,249 @@
+"""流式摄取管道：read → clean → chunk → embed（批量）→ upsert（批量）。
+
+- 文档以生成器方式从磁盘流式读取，内存中只保留有限个在途批次
+- CPU 密集的读取/清洗/分块/向量化按文档批次分发到进程池（workers > 1），结果按提交顺序消费
+- 检查点文件记录已完成文档的指纹（大小 + mtime）与分块数，中断后重跑会跳过未变化的文档；
+  变化的文档重新分块后块数变少时，删除多出的旧块（doc_id#chunkN），避免检索到过期文本
+- 返回吞吐统计（docs/s、chunks/s）
+- sample_chunks 按与管道相同的清洗/分块规则取前 N 个 chunk，用于在摄取前拟合 HashingEmbedder 的 idf
+
+embed_fn 接收文本列表并返回同样长度的向量列表；使用进程池时必须是模块级（可 pickle）的函数或对象。
+"""
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import json
+import os
+import re
+import time
+
+TEXT_EXTENSIONS = ('.txt', '.md')
+
+EmbedFn = Callable[[List[str]], Sequence[Sequence[float]]]
+
+
+def simple_chunk(text, max_len=500):
+    # 极简分块：按句号切分并合并到接近 max_len
+    sents = [s.strip() for s in text.split('。') if s.strip()]
+    chunks = []
+    cur = ''
+    for s in sents:
+        if len(cur) + len(s) > max_len:
+            if cur:
+                chunks.append(cur)
+            cur = s
+        else:
+            cur = (cur + '。' + s) if cur else s
+    if cur:
+        chunks.append(cur)
+    return chunks
+
+
+_CONTROL_CHARS = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]')
+_SPACES = re.compile(r'[ \t\u3000\xa0]+')
+_BLANK_LINES = re.compile(r'\n{3,}')
+
+
+def clean_text(text: str) -> str:
+    """清洗：去除控制字符，统一换行，压缩连续空白（含全角空格）。"""
+    text = text.replace('\r\n', '\n').replace('\r', '\n')
+    text = _CONTROL_CHARS.sub('', text)
+    text = _SPACES.sub(' ', text)
+    return _BLANK_LINES.sub('\n\n', text).strip()
+
+
+def file_fingerprint(path: str) -> str:
+    st = os.stat(path)
+    return f"{st.st_size}:{st.st_mtime_ns}"
+
+
+def iter_documents(paths: Iterable[str], extensions: Tuple[str, ...] = TEXT_EXTENSIONS) -> Iterator[Tuple[str, str]]:
+    """惰性遍历文件/目录，产出 (doc_id, path)；doc_id 为相对所在根目录的路径（统一使用 /）。"""
+    for root in paths:
+        if os.path.isfile(root):
+            yield os.path.basename(root), root
+            continue
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            for name in sorted(filenames):
+                if not name.lower().endswith(extensions):
+                    continue
+                full = os.path.join(dirpath, name)
+                yield os.path.relpath(full, root).replace(os.sep, '/'), full
+
+
+class Checkpoint:
+    """摄取检查点：{doc_id: fingerprint} 与 {doc_id: 分块数}，原子写入 JSON 文件。"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.done: Dict[str, str] = {}
+        self.chunks: Dict[str, int] = {}
+        if path and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.done = data.get('done', {})
+            self.chunks = data.get('chunks', {})
+
+    def is_done(self, doc_id: str, fingerprint: str) -> bool:
+        return self.done.get(doc_id) == fingerprint
+
+    def chunk_count(self, doc_id: str) -> int:
+        """上次摄取该文档写入的分块数（未知时为 0）。"""
+        return self.chunks.get(doc_id, 0)
+
+    def mark(self, doc_id: str, fingerprint: str, chunks: Optional[int] = None):
+        self.done[doc_id] = fingerprint
+        if chunks is not None:
+            self.chunks[doc_id] = chunks
+
+    def save(self):
+        if not self.path:
+            return
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({"done": self.done, "chunks": self.chunks}, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+
+def process_documents(batch: List[Tuple[str, str, str]], embed_fn: EmbedFn, max_len: int = 500):
+    """工作进程入口：读取、清洗、分块并批量向量化一批文档。
+
+    batch 元素为 (doc_id, path, fingerprint)；返回 [(doc_id, fingerprint, chunks, embeddings)]。
+    """
+    docs = []
+    all_chunks: List[str] = []
+    for doc_id, path, fingerprint in batch:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            chunks = simple_chunk(clean_text(f.read()), max_len=max_len)
+        docs.append((doc_id, fingerprint, len(chunks)))
+        all_chunks.extend(chunks)
+    vectors = list(embed_fn(all_chunks)) if all_chunks else []
+    out = []
+    pos = 0
+    for doc_id, fingerprint, n in docs:
+        out.append((doc_id, fingerprint, all_chunks[pos:pos + n], vectors[pos:pos + n]))
+        pos += n
+    return out
+
+
+def sample_chunks(paths: Iterable[str], limit: int, max_len: int = 500,
+                  extensions: Tuple[str, ...] = TEXT_EXTENSIONS) -> List[str]:
+    """按遍历顺序取语料的前 limit 个 chunk（确定性），只读取所需的文档。"""
+    out: List[str] = []
+    for _doc_id, path in iter_documents(paths, extensions):
+        if len(out) >= limit:
+            break
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            out.extend(simple_chunk(clean_text(f.read()), max_len=max_len))
+    return out[:limit]
+
+
+def _batched(items: Iterator, size: int) -> Iterator[List]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def run_pipeline(paths: Iterable[str], store, embed_fn: Optional[EmbedFn] = None, workers: int = 0,
+                 batch_docs: int = 16, upsert_batch: int = 512, max_len: int = 500,
+                 checkpoint_path: Optional[str] = None, checkpoint_every: int = 256,
+                 on_checkpoint: Optional[Callable[[Any], None]] = None,
+                 progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """运行摄取管道并返回统计信息。
+
+    store 需提供 upsert 与 delete（见 vectorstore.BaseVectorStore）；embed_fn 缺省为 HashingEmbedder()（app.services.embeddings）。
+    workers <= 1 时在当前进程内执行；否则使用 ProcessPoolExecutor，在途批次数上限为 2 * workers。
+    每完成约 checkpoint_every 个文档：先 flush 待 upsert 的向量，再调用 on_checkpoint(store)
+    （例如 store.save(...)），最后写检查点，保证检查点记录的文档一定已落库。
+    """
+    if embed_fn is None:
+        from app.services.embeddings import HashingEmbedder
+        embed_fn = HashingEmbedder()
+    checkpoint = Checkpoint(checkpoint_path)
+    stats = {"docs": 0, "chunks": 0, "skipped": 0}
+    started = time.perf_counter()
+
+    pending_vecs: List[Sequence[float]] = []
+    pending_metas: List[Dict[str, Any]] = []
+    pending_ids: List[str] = []
+    stale_ids: List[str] = []
+    unflushed_docs: List[Tuple[str, str, int]] = []
+    since_checkpoint = 0
+
+    def _todo() -> Iterator[Tuple[str, str, str]]:
+        for doc_id, path in iter_documents(paths):
+            fingerprint = file_fingerprint(path)
+            if checkpoint.is_done(doc_id, fingerprint):
+                stats["skipped"] += 1
+                continue
+            yield doc_id, path, fingerprint
+
+    def _flush():
+        if stale_ids:
+            store.delete(list(stale_ids))
+            stale_ids.clear()
+        if pending_ids:
+            store.upsert(list(pending_vecs), list(pending_metas), list(pending_ids))
+            pending_vecs.clear()
+            pending_metas.clear()
+            pending_ids.clear()
+        for doc_id, fingerprint, n_chunks in unflushed_docs:
+            checkpoint.mark(doc_id, fingerprint, n_chunks)
+        unflushed_docs.clear()
+
+    def _checkpoint():
+        _flush()
+        if on_checkpoint is not None:
+            on_checkpoint(store)
+        checkpoint.save()
+
+    def _consume(results):
+        nonlocal since_checkpoint
+        for doc_id, fingerprint, chunks, vectors in results:
+            for j, (chunk, vec) in enumerate(zip(chunks, vectors)):
+                pending_vecs.append(vec)
+                pending_metas.append({"source": doc_id, "text": chunk})
+                pending_ids.append(f"{doc_id}#chunk{j}")
+            # 文档变化后块数变少：旧的尾部分块随本批一起删除
+            stale_ids.extend(f"{doc_id}#chunk{j}" for j in range(len(chunks), checkpoint.chunk_count(doc_id)))
+            unflushed_docs.append((doc_id, fingerprint, len(chunks)))
+            stats["docs"] += 1
+            stats["chunks"] += len(chunks)
+            since_checkpoint += 1
+        if len(pending_ids) + len(stale_ids) >= upsert_batch:
+            _flush()
+        if since_checkpoint >= checkpoint_every:
+            _checkpoint()
+            since_checkpoint = 0
+        if progress is not None:
+            progress(_throughput(stats, started))
+
+    batches = _batched(_todo(), batch_docs)
+    if workers and workers > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            inflight = deque()
+            for batch in batches:
+                inflight.append(pool.submit(process_documents, batch, embed_fn, max_len))
+                if len(inflight) >= 2 * workers:
+                    _consume(inflight.popleft().result())
+            while inflight:
+                _consume(inflight.popleft().result())
+    else:
+        for batch in batches:
+            _consume(process_documents(batch, embed_fn, max_len))
+
+    _checkpoint()
+    return _throughput(stats, started)
+
+
+def _throughput(stats: Dict[str, Any], started: float) -> Dict[str, Any]:
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    return {**stats, "elapsed_s": elapsed, "docs_per_s": stats["docs"] / elapsed,
+            "chunks_per_s": stats["chunks"] / elapsed}
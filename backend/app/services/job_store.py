@@ -0,0 +1,254 @@
+"""后台报告任务存储：/reports/start 写入，/reports/{job_id} 轮询读取。
+
+- InMemoryJobStore：单进程，带 TTL 与容量上限（超出时淘汰最久未更新的任务）
+- SQLiteJobStore：WAL 模式，job_id 为主键，同机多个 uvicorn worker 共享；定期清理过期任务并做 WAL checkpoint
+
+任务记录为 dict（至少包含 status / result）；TTL 从最后一次更新开始计算，运行中的任务持续更新因而不会过期。
+异步代码通过 call_job_store 调用：blocking 的存储（SQLite）在线程池中执行，不阻塞事件循环。
+"""
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+import asyncio
+import copy
+import functools
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class BaseJobStore:
+    """任务存储抽象：get 未找到（或已过期）返回 None。实现需线程安全。
+
+    blocking=True 表示调用可能阻塞（磁盘 IO、等待其他进程的锁），异步调用方应放到线程池中执行。
+    """
+
+    blocking = False
+
+    def create(self, job_id: str, record: Dict[str, Any]):
+        raise NotImplementedError()
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError()
+
+    def update(self, job_id: str, **fields) -> bool:
+        """合并字段到已有任务；任务不存在时返回 False。"""
+        raise NotImplementedError()
+
+    def delete(self, job_id: str):
+        raise NotImplementedError()
+
+    def compact(self):
+        """清理过期任务。"""
+
+    def __len__(self):
+        raise NotImplementedError()
+
+
+class InMemoryJobStore(BaseJobStore):
+    """进程内任务存储：任务在最后一次更新 ttl 秒后过期，超过 max_size 时淘汰最久未更新的任务。"""
+
+    _SWEEP_EVERY = 256
+
+    def __init__(self, max_size: int = 10000, ttl: float = 3600.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def _put_locked(self, job_id: str, record: Dict[str, Any]):
+        self._data[job_id] = (time.monotonic() + self.ttl, record)
+        self._data.move_to_end(job_id)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+        self._writes += 1
+        if self._writes % self._SWEEP_EVERY == 0:
+            self._compact_locked()
+
+    def create(self, job_id: str, record: Dict[str, Any]):
+        with self._lock:
+            self._put_locked(job_id, copy.deepcopy(record))
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            item = self._data.get(job_id)
+            if item is None:
+                return None
+            if item[0] <= time.monotonic():
+                del self._data[job_id]
+                return None
+            return copy.deepcopy(item[1])
+
+    def update(self, job_id: str, **fields) -> bool:
+        with self._lock:
+            item = self._data.get(job_id)
+            if item is None or item[0] <= time.monotonic():
+                return False
+            self._put_locked(job_id, {**item[1], **copy.deepcopy(fields)})
+            return True
+
+    def delete(self, job_id: str):
+        with self._lock:
+            self._data.pop(job_id, None)
+
+    def _compact_locked(self):
+        # 按更新顺序排列，过期的任务都在前面
+        now = time.monotonic()
+        while self._data:
+            job_id, (expires_at, _) = next(iter(self._data.items()))
+            if expires_at > now:
+                break
+            del self._data[job_id]
+
+    def compact(self):
+        with self._lock:
+            self._compact_locked()
+
+
+class SQLiteJobStore(BaseJobStore):
+    """SQLite 任务存储：记录以 JSON 存储，过期时间使用墙钟时间以便跨进程共享。
+
+    每个进程持有自己的连接；写入时若距上次清理超过 compact_interval 秒则删除过期任务、
+    裁剪到 max_rows 行并 checkpoint WAL，避免数据库与 WAL 文件无限增长。
+
+    调用是同步的：其他 worker 持有写锁时最多等待 busy_timeout 秒，因此在事件循环中必须经 call_job_store 调用。
+    """
+
+    blocking = True
+
+    def __init__(self, path: str, ttl: float = 3600.0, max_rows: int = 100000, compact_interval: float = 60.0,
+                 busy_timeout: float = 5.0):
+        self.path = path
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self.compact_interval = compact_interval
+        self._lock = threading.Lock()
+        self._last_compact = time.monotonic()
+        d = os.path.dirname(os.path.abspath(path))
+        os.makedirs(d, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=busy_timeout)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            ' job_id TEXT PRIMARY KEY, record TEXT NOT NULL, updated_at REAL NOT NULL, expires_at REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_expires ON jobs(expires_at)')
+        self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM jobs WHERE expires_at > ?', (time.time(),)).fetchone()[0]
+
+    def _write_locked(self, job_id: str, record: Dict[str, Any]):
+        now = time.time()
+        self._conn.execute(
+            'INSERT OR REPLACE INTO jobs (job_id, record, updated_at, expires_at) VALUES (?, ?, ?, ?)',
+            (job_id, json.dumps(record, ensure_ascii=False), now, now + self.ttl),
+        )
+
+    def _maybe_compact_locked(self):
+        if time.monotonic() - self._last_compact >= self.compact_interval:
+            self._compact_locked()
+
+    def create(self, job_id: str, record: Dict[str, Any]):
+        with self._lock:
+            self._write_locked(job_id, record)
+            self._conn.commit()
+            self._maybe_compact_locked()
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT record FROM jobs WHERE job_id = ? AND expires_at > ?', (job_id, time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def update(self, job_id: str, **fields) -> bool:
+        with self._lock:
+            # BEGIN IMMEDIATE 先取得写锁，读-改-写对其他 worker 进程也是原子的
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._conn.execute(
+                    'SELECT record FROM jobs WHERE job_id = ? AND expires_at > ?', (job_id, time.time())
+                ).fetchone()
+                if row is None:
+                    self._conn.rollback()
+                    return False
+                self._write_locked(job_id, {**json.loads(row[0]), **fields})
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+            self._maybe_compact_locked()
+            return True
+
+    def delete(self, job_id: str):
+        with self._lock:
+            self._conn.execute('DELETE FROM jobs WHERE job_id = ?', (job_id,))
+            self._conn.commit()
+
+    def _compact_locked(self):
+        self._last_compact = time.monotonic()
+        self._conn.execute('DELETE FROM jobs WHERE expires_at <= ?', (time.time(),))
+        # 超出行数上限时删除最久未更新的任务
+        self._conn.execute(
+            'DELETE FROM jobs WHERE job_id IN ('
+            ' SELECT job_id FROM jobs ORDER BY updated_at DESC LIMIT -1 OFFSET ?)',
+            (self.max_rows,),
+        )
+        self._conn.commit()
+        self._conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+    def compact(self):
+        with self._lock:
+            self._compact_locked()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+async def call_job_store(store: BaseJobStore, method: str, *args, **kwargs) -> Any:
+    """在事件循环中调用任务存储的方法：blocking 的存储在线程池中执行，内存存储直接调用。"""
+    fn = getattr(store, method)
+    if not store.blocking:
+        return fn(*args, **kwargs)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, functools.partial(fn, *args, **kwargs))
+
+
+_DEFAULT_JOB_STORE: Optional[BaseJobStore] = None
+_DEFAULT_JOB_STORE_LOCK = threading.Lock()
+
+
+def create_job_store_from_env() -> BaseJobStore:
+    """环境变量：JOB_STORE_BACKEND（memory 默认 / sqlite）/ JOB_STORE_PATH（sqlite 文件，默认 ./logs/jobs.db）/
+    JOB_STORE_TTL（秒，默认 3600）/ JOB_STORE_MAX_SIZE（默认 10000）。
+
+    多 worker 部署必须使用 sqlite，否则轮询请求落到其他 worker 时会返回 404。
+    """
+    backend = os.getenv('JOB_STORE_BACKEND', 'memory').lower()
+    ttl = float(os.getenv('JOB_STORE_TTL', '3600'))
+    max_size = int(os.getenv('JOB_STORE_MAX_SIZE', '10000'))
+    if backend == 'sqlite':
+        path = os.getenv('JOB_STORE_PATH', os.path.join('.', 'logs', 'jobs.db'))
+        return SQLiteJobStore(path, ttl=ttl, max_rows=max_size)
+    if backend != 'memory':
+        raise ValueError(f"unknown JOB_STORE_BACKEND: {backend}")
+    return InMemoryJobStore(max_size=max_size, ttl=ttl)
+
+
+def get_job_store() -> BaseJobStore:
+    """进程级任务存储（懒加载）。"""
+    global _DEFAULT_JOB_STORE
+    if _DEFAULT_JOB_STORE is None:
+        with _DEFAULT_JOB_STORE_LOCK:
+            if _DEFAULT_JOB_STORE is None:
+                _DEFAULT_JOB_STORE = create_job_store_from_env()
+    return _DEFAULT_JOB_STORE
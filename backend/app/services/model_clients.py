@@ -1,8 +1,96 @@
 from typing import Any, Dict, Optional
+import asyncio
+import contextlib
 import os
+import threading
 import time
 
 
+# 进程级共享的 httpx.AsyncClient（连接池），按事件循环分别维护：httpx 的连接不能跨事件循环复用。
+# FastAPI 应用在 lifespan（app.main）中为服务循环创建和关闭；同步调用方使用的后台循环（app.core.loop_runner）
+# 启动时同样创建一份。GeminiClientAsync 在调用时取当前循环上的连接池，使所有请求复用 keep-alive 连接。
+_SHARED_ASYNC_CLIENTS: Dict[asyncio.AbstractEventLoop, Any] = {}
+_SHARED_LOCK = threading.Lock()
+
+
+def _env_flag(name: str, default: str = 'false') -> bool:
+    return os.getenv(name, default).lower() in ('1', 'true', 'yes')
+
+
+def _pool_settings_from_env() -> Dict[str, Any]:
+    """连接池配置：GEMINI_HTTP_MAX_CONNECTIONS / GEMINI_HTTP_MAX_KEEPALIVE /
+    GEMINI_HTTP_KEEPALIVE_EXPIRY（秒）/ GEMINI_HTTP2 / GEMINI_TIMEOUT。"""
+    return {
+        'max_connections': int(os.getenv('GEMINI_HTTP_MAX_CONNECTIONS', '100')),
+        'max_keepalive_connections': int(os.getenv('GEMINI_HTTP_MAX_KEEPALIVE', '20')),
+        'keepalive_expiry': float(os.getenv('GEMINI_HTTP_KEEPALIVE_EXPIRY', '30')),
+        'http2': _env_flag('GEMINI_HTTP2'),
+        'timeout': float(os.getenv('GEMINI_TIMEOUT', '30')),
+    }
+
+
+def build_async_http_client(max_connections: int = 100, max_keepalive_connections: int = 20,
+                            keepalive_expiry: float = 30.0, http2: bool = False, timeout: float = 30.0):
+    """创建带连接池限制的 httpx.AsyncClient。请求 HTTP/2 但未安装 h2 时退回 HTTP/1.1。"""
+    import httpx
+
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except Exception:
+            http2 = False
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_keepalive_connections,
+        keepalive_expiry=keepalive_expiry,
+    )
+    return httpx.AsyncClient(limits=limits, http2=http2, timeout=timeout)
+
+
+async def init_shared_async_client(**overrides):
+    """在当前事件循环中创建共享连接池（每个循环幂等）。httpx 不可用时返回 None。"""
+    loop = asyncio.get_running_loop()
+    with _SHARED_LOCK:
+        # 顺带清理已关闭循环遗留的条目
+        for stale in [lp for lp in _SHARED_ASYNC_CLIENTS if lp.is_closed()]:
+            del _SHARED_ASYNC_CLIENTS[stale]
+        client = _SHARED_ASYNC_CLIENTS.get(loop)
+        if client is not None and not client.is_closed:
+            return client
+        try:
+            settings = _pool_settings_from_env()
+            settings.update(overrides)
+            client = build_async_http_client(**settings)
+        except ImportError:
+            return None
+        _SHARED_ASYNC_CLIENTS[loop] = client
+    return client
+
+
+async def close_shared_async_client():
+    """关闭当前事件循环上的共享连接池（应用 lifespan 结束时调用）。"""
+    loop = asyncio.get_running_loop()
+    with _SHARED_LOCK:
+        client = _SHARED_ASYNC_CLIENTS.pop(loop, None)
+    if client is not None and not client.is_closed:
+        await client.aclose()
+
+
+def get_shared_async_client():
+    """返回绑定到当前运行事件循环的共享连接池；不在事件循环中（或该循环未初始化）时返回 None。
+
+    脚本中 asyncio.run 创建的新循环会拿到 None，由调用方退回到按调用创建临时客户端的行为。
+    """
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+    client = _SHARED_ASYNC_CLIENTS.get(loop)
+    if client is None or client.is_closed:
+        return None
+    return client
+
+
 class ModelClientBase:
     def generate(self, prompt: str, max_tokens: int = 512) -> str:
         raise NotImplementedError()
@@ -12,6 +100,17 @@ class ModelClientBase:
         return self.generate(prompt, max_tokens=max_tokens)
 
 
+def native_async_generate(client: Any):
+    """返回客户端自己实现的 async_generate；没有，或只是 ModelClientBase 的同步兼容实现（会在事件循环上阻塞）时返回 None。
+
+    异步调用方拿到 None 时应在线程池中运行同步 generate。
+    """
+    async_gen = getattr(client, 'async_generate', None)
+    if not callable(async_gen) or getattr(async_gen, '__func__', None) is ModelClientBase.async_generate:
+        return None
+    return async_gen
+
+
 class DummyModelClientLocal(ModelClientBase):
     """本地模拟客户端（与 CFPAgent 的 DummyModelClient 类似），用于测试。"""
 
@@ -41,7 +140,7 @@ class GeminiClientHTTP(ModelClientBase):
 
     特性：
       - 支持 sync 调用（使用 httpx/requests 中任意可用者）
-      - 基本重试与指数退避
+      - 按 base_url 共享的熔断器、带截止时间的抖动退避重试（遵循 Retry-After）与自适应单次超时（见 app.services.resilience）
       - 可选流式接口占位（需要根据实际 API 调整）
       - 从环境变量读取配置：GEMINI_API_KEY / GEMINI_BASE_URL / GEMINI_TIMEOUT
     注意：在 CI/生产中请通过 repository secrets 注入 GEMINI_API_KEY，并启用 GEMINI_ENABLED=true
@@ -52,6 +151,12 @@ class GeminiClientHTTP(ModelClientBase):
         self.base_url = base_url or os.getenv('GEMINI_BASE_URL', base_url)
         self.timeout = int(os.getenv('GEMINI_TIMEOUT', str(timeout)))
 
+    def _resilience(self):
+        """返回 (熔断器, 自适应超时, 重试策略)；熔断器与超时统计按 base_url 在进程内共享。"""
+        from app.services.resilience import RetryPolicy, get_adaptive_timeout, get_circuit_breaker
+        return (get_circuit_breaker(self.base_url), get_adaptive_timeout(self.base_url, float(self.timeout)),
+                RetryPolicy.from_env())
+
     def _select_http_client(self):
         # prefer httpx if available for nicer API and optional async
         try:
@@ -89,7 +194,11 @@ class GeminiClientHTTP(ModelClientBase):
         return str(data)
 
     def generate(self, prompt: str, max_tokens: int = 512, stream: bool = False) -> str:
-        """同步生成接口。stream=True 为占位支持（目前返回完整文本）。"""
+        """同步生成接口。stream=True 为占位支持（目前返回完整文本）。
+
+        仅供同步调用方使用：重试退避用 time.sleep 阻塞当前线程。事件循环中的代码请使用
+        GeminiClientAsync.async_generate（CFPAgent / ModelRouter 只在客户端没有异步实现时才在线程池中调用本方法）。
+        """
         if not self.api_key:
             raise RuntimeError('GEMINI API key not configured')
 
@@ -99,37 +208,45 @@ class GeminiClientHTTP(ModelClientBase):
         headers = {"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"}
         payload = {"prompt": prompt, "max_tokens": max_tokens}
 
-        max_attempts = 3
-        backoff_base = 0.5
-        last_exc = None
-        for attempt in range(1, max_attempts + 1):
+        def _send(timeout):
+            # Execute POST and parse JSON safely
+            resp = client.post(url, json=payload, headers=headers, timeout=timeout)
+            resp.raise_for_status()
             try:
-                # Execute POST and parse JSON safely
-                resp = client.post(url, json=payload, headers=headers, timeout=self.timeout)
-                resp.raise_for_status()
-                try:
-                    data = resp.json()
-                except Exception:
-                    data = resp.text
-
-                # If stream requested: placeholder behavior (real streaming requires SSE/HTTP/WS support)
-                if stream:
-                    # For now return full parsed string; keep API shape stable for callers
-                    return self._parse_response(data)
+                data = resp.json()
+            except Exception:
+                data = resp.text
+            # stream=True 仍返回完整文本（真实流式见 GeminiClientAsync.async_stream_generate）
+            return self._parse_response(data)
 
-                return self._parse_response(data)
-            except Exception as e:
-                last_exc = e
-                sleep_for = backoff_base * (2 ** (attempt - 1))
-                time.sleep(sleep_for)
-        # If no exception captured, raise a generic error
-        if last_exc is None:
-            raise RuntimeError('GeminiClientHTTP failed without exception')
-        raise last_exc
+        from app.services.resilience import call_with_retry
+        breaker, timeouts, policy = self._resilience()
+        return call_with_retry(_send, breaker, timeouts, policy, label="sync")
 
 
 class GeminiClientAsync(GeminiClientHTTP):
-    """使用 httpx.AsyncClient 的异步实现（如果 httpx 可用）。"""
+    """使用 httpx.AsyncClient 的异步实现（如果 httpx 可用）。
+
+    可注入共享的 http_client（连接池）；未注入时每次调用创建临时客户端（兼容旧行为）。
+    """
+
+    def __init__(self, api_key: Optional[str] = None, base_url: str = 'https://api.gemini.example/v1', timeout: int = 30,
+                 http_client: Optional[Any] = None):
+        super().__init__(api_key=api_key, base_url=base_url, timeout=timeout)
+        self.http_client = http_client
+
+    @contextlib.asynccontextmanager
+    async def _acquire_client(self):
+        """优先复用注入的连接池或当前事件循环上的共享连接池（不关闭它们）；否则创建临时 AsyncClient 并在调用结束后关闭。"""
+        client = self.http_client
+        if client is None or client.is_closed:
+            client = get_shared_async_client()
+        if client is not None and not client.is_closed:
+            yield client
+            return
+        import httpx
+        async with httpx.AsyncClient(timeout=self.timeout) as tmp:
+            yield tmp
 
     async def async_generate(self, prompt: str, max_tokens: int = 512, stream: bool = False) -> str:
         if not self.api_key:
@@ -144,28 +261,19 @@ class GeminiClientAsync(GeminiClientHTTP):
         headers = {"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"}
         payload = {"prompt": prompt, "max_tokens": max_tokens}
 
-        max_attempts = 3
-        backoff_base = 0.5
-        last_exc = None
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            for attempt in range(1, max_attempts + 1):
+        from app.services.resilience import acall_with_retry
+        breaker, timeouts, policy = self._resilience()
+        async with self._acquire_client() as client:
+            async def _send(timeout):
+                resp = await client.post(url, json=payload, headers=headers, timeout=timeout)
+                resp.raise_for_status()
                 try:
-                    resp = await client.post(url, json=payload, headers=headers)
-                    resp.raise_for_status()
-                    try:
-                        data = resp.json()
-                    except Exception:
-                        data = resp.text
-
-                    return self._parse_response(data)
-                except Exception as e:
-                    last_exc = e
-                    sleep_for = backoff_base * (2 ** (attempt - 1))
-                    await __import__('asyncio').sleep(sleep_for)
+                    data = resp.json()
+                except Exception:
+                    data = resp.text
+                return self._parse_response(data)
 
-        if last_exc is None:
-            raise RuntimeError('GeminiClientAsync failed without exception')
-        raise last_exc
+            return await acall_with_retry(_send, breaker, timeouts, policy, label="async")
 
     async def async_stream_generate(self, prompt: str, max_tokens: int = 512):
         """异步流式生成：返回一个 async generator，逐段 yield text chunk。
@@ -185,42 +293,81 @@ class GeminiClientAsync(GeminiClientHTTP):
         headers = {"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"}
         payload = {"prompt": prompt, "max_tokens": max_tokens, "stream": True}
 
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
+        from app.services.resilience import _is_timeout, get_adaptive_timeout, is_retryable
+        breaker = self._resilience()[0]
+        # 首个 chunk 的到达时间单独统计：与非流式调用的完整响应延迟分布不同
+        first_chunk = get_adaptive_timeout(f"{self.base_url}#first_chunk", float(self.timeout))
+        # 熔断打开时立即失败，由调用方回退
+        breaker.before_call()
+        async with self._acquire_client() as client, contextlib.AsyncExitStack() as stack:
+            started = time.monotonic()
             try:
-                async with client.stream('POST', url, json=payload, headers=headers) as resp:
+                # 建立连接到收到首个 chunk 受自适应超时约束；之后的逐行读取仍按 self.timeout
+                async with asyncio.timeout(first_chunk.current()):
+                    resp = await stack.enter_async_context(
+                        client.stream('POST', url, json=payload, headers=headers, timeout=self.timeout))
                     resp.raise_for_status()
-                    # iterate lines to better handle SSE / line-delimited formats
-                    async for raw_line in resp.aiter_lines():
-                        if not raw_line:
-                            continue
-                        line = raw_line.strip()
-                        # SSE style: lines like 'data: {...}'
-                        if line.startswith('data:'):
-                            line = line[len('data:'):].strip()
-                            if line == '[DONE]':
-                                break
-                            yield line
-                        else:
-                            # sometimes providers emit plain JSON fragments or text
-                            if line == '[DONE]':
-                                break
-                            yield line
+                    lines = self._stream_lines(resp)
+                    first = await anext(lines, None)
             except Exception as e:
-                # propagate so caller can decide fallback
+                # 首个 chunk 之前的失败计入熔断器；propagate so caller can decide fallback
+                elapsed = time.monotonic() - started
+                if is_retryable(e):
+                    breaker.record_failure()
+                    if _is_timeout(e):
+                        first_chunk.observe(elapsed)
+                else:
+                    breaker.record_success(elapsed)
                 raise
-
-
-def create_gemini_client_from_env() -> Optional[GeminiClientHTTP]:
-    enabled = os.getenv('GEMINI_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+            except BaseException:
+                breaker.release()
+                raise
+            elapsed = time.monotonic() - started
+            breaker.record_success(elapsed)
+            first_chunk.observe(elapsed)
+            if first is None:
+                return
+            yield first
+            async for line in lines:
+                yield line
+
+    @staticmethod
+    async def _stream_lines(resp):
+        # iterate lines to better handle SSE / line-delimited formats
+        async for raw_line in resp.aiter_lines():
+            if not raw_line:
+                continue
+            line = raw_line.strip()
+            # SSE style: lines like 'data: {...}'
+            if line.startswith('data:'):
+                line = line[len('data:'):].strip()
+            # sometimes providers emit plain JSON fragments or text
+            if line == '[DONE]':
+                break
+            yield line
+
+
+def create_gemini_client_from_env(http_client: Optional[Any] = None) -> Optional[ModelClientBase]:
+    """根据环境变量创建 Gemini 客户端。http_client 缺省时注入当前事件循环上的共享连接池（若已初始化）。
+
+    GEMINI_BASE_URL 可为逗号分隔的多个地址：此时返回包装各地址客户端的 ModelRouter（见 app.services.model_router），
+    按观测延迟路由并对尾延迟发送对冲请求。
+    """
+    enabled = _env_flag('GEMINI_ENABLED')
     if not enabled:
         return None
     key = os.getenv('GEMINI_API_KEY')
-    base = os.getenv('GEMINI_BASE_URL', 'https://api.gemini.example/v1')
-    if key:
+    bases = [b.strip() for b in os.getenv('GEMINI_BASE_URL', 'https://api.gemini.example/v1').split(',') if b.strip()]
+    if key and bases:
         # prefer async client if httpx available
         try:
             import httpx
-            return GeminiClientAsync(api_key=key, base_url=base)
+            shared = http_client or get_shared_async_client()
+            clients = [GeminiClientAsync(api_key=key, base_url=base, http_client=shared) for base in bases]
         except Exception:
-            return GeminiClientHTTP(api_key=key, base_url=base)
+            clients = [GeminiClientHTTP(api_key=key, base_url=base) for base in bases]
+        if len(clients) == 1:
+            return clients[0]
+        from app.services.model_router import ModelRouter, router_settings_from_env
+        return ModelRouter(clients, **router_settings_from_env())
     return None
@@ -0,0 +1,291 @@
+"""多 provider 路由：按观测延迟选择最快的健康 provider，并在尾延迟时发送对冲请求。
+
+- 每个 provider 的统计（EWMA 延迟、最近 window 次的 p95、错误率）在进程内按名称共享，
+  因此按请求创建的 ModelRouter 也能利用历史观测
+- 未被观测过的 provider 优先尝试（探索），近期错误率超过 max_error_rate 的 provider 在 cooldown 内被跳过
+- async_generate：主请求超过其 p95（样本不足时用 hedge_delay）仍未返回时，向排名第二的 provider 发送副本，
+  先成功者胜出，另一个被取消；请求失败时顺延到下一个 provider
+- 被取消的请求以已耗时记作延迟样本（真实延迟的下界），使持续慢的 provider 的统计随之变差；
+  失败的请求只计入错误率，不计入延迟
+- 同步 generate 只做选择与失败顺延，不对冲
+- 整个路由调用共用一个总截止时间 deadline：超过后不再顺延到下一个 provider（异步路径同时取消仍在进行的请求），
+  避免 N 个 provider 各自跑满重试截止时间
+"""
+from collections import deque
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import asyncio
+import inspect
+import os
+import threading
+import time
+
+from app.core.metrics import MODEL_HEDGES, MODEL_ROUTER_REQUESTS
+from app.services.model_clients import ModelClientBase, native_async_generate
+
+
+class ProviderStats:
+    """单个 provider 的在线统计（线程安全）。"""
+
+    def __init__(self, alpha: float = 0.2, window: int = 200):
+        self.alpha = alpha
+        self.ewma: Optional[float] = None
+        self._latencies = deque(maxlen=window)
+        self._outcomes = deque(maxlen=window)
+        self.last_failure = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, latency: float, ok: Optional[bool] = True):
+        """ok=None 表示请求被取消：只记录延迟下界，不计入错误率。
+        失败只计入错误率，不计入延迟统计（快速失败的 provider 不应因此显得更快）。"""
+        with self._lock:
+            if ok is not False:
+                self.ewma = latency if self.ewma is None else self.alpha * latency + (1 - self.alpha) * self.ewma
+                self._latencies.append(latency)
+            if ok is not None:
+                self._outcomes.append(ok)
+                if not ok:
+                    self.last_failure = time.monotonic()
+
+    @property
+    def samples(self) -> int:
+        return len(self._latencies)
+
+    @property
+    def outcomes(self) -> int:
+        return len(self._outcomes)
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            values = sorted(self._latencies)
+        if not values:
+            return None
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+    def error_rate(self) -> float:
+        with self._lock:
+            outcomes = list(self._outcomes)
+        return outcomes.count(False) / len(outcomes) if outcomes else 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"samples": self.samples, "ewma": self.ewma, "p95": self.percentile(0.95),
+                "error_rate": self.error_rate()}
+
+
+_PROVIDER_STATS: Dict[str, ProviderStats] = {}
+_PROVIDER_STATS_LOCK = threading.Lock()
+
+
+def get_provider_stats(name: str) -> ProviderStats:
+    """进程级 provider 统计（按名称懒创建）。"""
+    stats = _PROVIDER_STATS.get(name)
+    if stats is None:
+        with _PROVIDER_STATS_LOCK:
+            stats = _PROVIDER_STATS.setdefault(name, ProviderStats())
+    return stats
+
+
+def reset_provider_stats():
+    with _PROVIDER_STATS_LOCK:
+        _PROVIDER_STATS.clear()
+
+
+def _provider_name(client: Any, index: int) -> str:
+    return getattr(client, 'base_url', None) or f"{type(client).__name__}#{index}"
+
+
+class ModelRouter(ModelClientBase):
+    """包装多个模型客户端的路由客户端（本身也是 ModelClientBase）。
+
+    hedge_delay：样本不足 min_samples 时的对冲等待时间（秒），样本充足后改用该 provider 的 p95；
+    hedge_min_delay：对冲等待时间下限，避免极快的 provider 被频繁对冲；
+    deadline：一次路由调用（含对冲与失败顺延）的总截止时间（秒），<= 0 表示不限制。
+    """
+
+    def __init__(self, clients: Sequence[Any], names: Optional[Sequence[str]] = None, hedge: bool = True,
+                 hedge_delay: float = 2.0, hedge_min_delay: float = 0.05, min_samples: int = 20,
+                 max_error_rate: float = 0.5, cooldown: float = 30.0, deadline: float = 30.0,
+                 stats: Optional[Dict[str, ProviderStats]] = None):
+        if not clients:
+            raise ValueError('ModelRouter requires at least one client')
+        names = list(names) if names is not None else [_provider_name(c, i) for i, c in enumerate(clients)]
+        if len(names) != len(clients):
+            raise ValueError('names must match clients')
+        self.providers: List[Tuple[str, Any]] = list(zip(names, clients))
+        self.hedge = hedge
+        self.hedge_delay = hedge_delay
+        self.hedge_min_delay = hedge_min_delay
+        self.min_samples = min_samples
+        self.max_error_rate = max_error_rate
+        self.cooldown = cooldown
+        self.deadline = deadline
+        self._stats = stats
+
+    @property
+    def base_url(self) -> str:
+        # 结果缓存命名空间（见 CFPAgent._cache_key）
+        return ','.join(name for name, _ in self.providers)
+
+    def stats_for(self, name: str) -> ProviderStats:
+        if self._stats is not None:
+            return self._stats.setdefault(name, ProviderStats())
+        return get_provider_stats(name)
+
+    def stats_snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {name: self.stats_for(name).snapshot() for name, _ in self.providers}
+
+    def _healthy(self, stats: ProviderStats) -> bool:
+        if stats.outcomes < 5 or stats.error_rate() <= self.max_error_rate:
+            return True
+        return time.monotonic() - stats.last_failure >= self.cooldown
+
+    def ranked(self) -> List[Tuple[str, Any]]:
+        """按 EWMA 升序排列（未观测过的排最前，只有失败记录的排在有延迟样本的之后）；
+        不健康的排在最后，全部不健康时仍可使用。"""
+        def key(item):
+            stats = self.stats_for(item[0])
+            if stats.ewma is not None:
+                latency = stats.ewma
+            else:
+                latency = -1.0 if stats.outcomes == 0 else float('inf')
+            return (not self._healthy(stats), latency)
+        return sorted(self.providers, key=key)
+
+    def _deadline_at(self) -> Optional[float]:
+        return time.monotonic() + self.deadline if self.deadline > 0 else None
+
+    def hedge_after(self, name: str) -> float:
+        stats = self.stats_for(name)
+        if stats.samples < self.min_samples:
+            return self.hedge_delay
+        return max(self.hedge_min_delay, stats.percentile(0.95))
+
+    def _record(self, name: str, elapsed: float, ok: Optional[bool]):
+        self.stats_for(name).record(elapsed, ok)
+        result = 'cancelled' if ok is None else ('ok' if ok else 'error')
+        MODEL_ROUTER_REQUESTS.inc(provider=name, result=result)
+
+    @staticmethod
+    async def _call(client: Any, prompt: str, max_tokens: int) -> str:
+        async_gen = native_async_generate(client)
+        if async_gen is not None:
+            res = async_gen(prompt, max_tokens=max_tokens)
+            return await res if inspect.isawaitable(res) else res
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, lambda: client.generate(prompt, max_tokens=max_tokens))
+
+    async def async_generate(self, prompt: str, max_tokens: int = 512) -> str:
+        candidates = self.ranked()
+        running: Dict[asyncio.Future, Tuple[str, float]] = {}
+        hedged = False
+        last_exc: Optional[BaseException] = None
+        deadline_at = self._deadline_at()
+
+        def launch():
+            name, client = candidates.pop(0)
+            task = asyncio.ensure_future(self._call(client, prompt, max_tokens))
+            running[task] = (name, time.perf_counter())
+            return task
+
+        primary = launch()
+        try:
+            while running:
+                hedge_wait = None
+                if self.hedge and not hedged and candidates and len(running) == 1:
+                    name, started = next(iter(running.values()))
+                    hedge_wait = max(0.0, self.hedge_after(name) - (time.perf_counter() - started))
+                timeout = hedge_wait
+                if deadline_at is not None:
+                    remaining = max(0.0, deadline_at - time.monotonic())
+                    timeout = remaining if hedge_wait is None else min(hedge_wait, remaining)
+                done, _ = await asyncio.wait(list(running), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    if hedge_wait is None or (deadline_at is not None and remaining < hedge_wait):
+                        raise TimeoutError(f'model router deadline of {self.deadline:.1f}s exceeded')
+                    hedged = True
+                    MODEL_HEDGES.inc(result="fired")
+                    launch()
+                    continue
+                winner = None
+                for task in done:
+                    name, started = running.pop(task)
+                    exc = task.exception()
+                    self._record(name, time.perf_counter() - started, exc is None)
+                    if exc is None and winner is None:
+                        winner = task
+                    elif exc is not None:
+                        last_exc = exc
+                if winner is not None:
+                    if hedged:
+                        MODEL_HEDGES.inc(result="primary_won" if winner is primary else "hedge_won")
+                    return winner.result()
+                if not running and candidates and (deadline_at is None or time.monotonic() < deadline_at):
+                    # 失败顺延到下一个 provider（总截止时间已过则不再顺延）
+                    launch()
+        finally:
+            for task, (name, started) in running.items():
+                task.cancel()
+                self._record(name, time.perf_counter() - started, None)
+        raise last_exc if last_exc is not None else RuntimeError('all model providers failed')
+
+    def generate(self, prompt: str, max_tokens: int = 512) -> str:
+        last_exc: Optional[BaseException] = None
+        deadline_at = self._deadline_at()
+        for name, client in self.ranked():
+            if last_exc is not None and deadline_at is not None and time.monotonic() >= deadline_at:
+                # 总截止时间已过：不再顺延（进行中的同步调用无法中断，只能在两次调用之间检查）
+                break
+            started = time.perf_counter()
+            try:
+                out = client.generate(prompt, max_tokens=max_tokens)
+            except Exception as e:
+                self._record(name, time.perf_counter() - started, False)
+                last_exc = e
+                continue
+            self._record(name, time.perf_counter() - started, True)
+            return out
+        raise last_exc if last_exc is not None else RuntimeError('all model providers failed')
+
+    async def async_stream_generate(self, prompt: str, max_tokens: int = 512):
+        """流式：使用排名最前且支持流式的 provider，首个片段之前出错时顺延；
+        没有 provider 支持流式时退化为（带对冲的）async_generate，整段作为一个片段产出。"""
+        streaming = [(n, c) for n, c in self.ranked() if callable(getattr(c, 'async_stream_generate', None))]
+        if not streaming:
+            yield await self.async_generate(prompt, max_tokens=max_tokens)
+            return
+        last_exc: Optional[BaseException] = None
+        for name, client in streaming:
+            started = time.perf_counter()
+            first = True
+            try:
+                stream = client.async_stream_generate(prompt, max_tokens=max_tokens)
+                if inspect.isawaitable(stream):
+                    stream = await stream
+                async for chunk in stream:
+                    if first:
+                        first = False
+                        # 流式只以首片段耗时作为延迟样本
+                        self._record(name, time.perf_counter() - started, True)
+                    yield chunk
+            except Exception as e:
+                if not first:
+                    raise
+                self._record(name, time.perf_counter() - started, False)
+                last_exc = e
+                continue
+            if first:
+                self._record(name, time.perf_counter() - started, True)
+            return
+        raise last_exc if last_exc is not None else RuntimeError('all model providers failed')
+
+
+def router_settings_from_env() -> Dict[str, Any]:
+    """环境变量：MODEL_ROUTER_HEDGE / MODEL_ROUTER_HEDGE_DELAY_MS / MODEL_ROUTER_MIN_SAMPLES /
+    MODEL_ROUTER_MAX_ERROR_RATE / MODEL_ROUTER_COOLDOWN（秒）/ MODEL_ROUTER_DEADLINE（秒，默认同 GEMINI_DEADLINE）。"""
+    return {
+        'hedge': os.getenv('MODEL_ROUTER_HEDGE', 'true').lower() in ('1', 'true', 'yes'),
+        'hedge_delay': float(os.getenv('MODEL_ROUTER_HEDGE_DELAY_MS', '2000')) / 1000.0,
+        'min_samples': int(os.getenv('MODEL_ROUTER_MIN_SAMPLES', '20')),
+        'max_error_rate': float(os.getenv('MODEL_ROUTER_MAX_ERROR_RATE', '0.5')),
+        'cooldown': float(os.getenv('MODEL_ROUTER_COOLDOWN', '30')),
+        'deadline': float(os.getenv('MODEL_ROUTER_DEADLINE', os.getenv('GEMINI_DEADLINE', '30'))),
+    }
@@ -0,0 +1,342 @@
+"""模型调用的容错：熔断器、带截止时间的重试与自适应超时。
+
+- CircuitBreaker：closed / open / half_open 三态，按 base_url 在进程内共享（同步与异步客户端共用）。
+  连续失败次数或滑动窗口内的坏调用比例（失败，或耗时超过 slow_call_seconds）达到阈值时打开；
+  打开期间直接抛出 CircuitOpenError（毫秒级失败，调用方随即回退到规则引擎），
+  open_seconds 后进入半开状态放行少量探测请求，成功则关闭，失败则重新打开
+- RetryPolicy：总截止时间内的重试，退避为 full jitter 指数退避；响应带 Retry-After 时至少等待该时长，
+  剩余时间不足以再试一次时立即放弃。4xx（408 / 429 除外）不重试
+- AdaptiveTimeout：单次尝试的超时取最近延迟 p99 的若干倍，限制在 [floor, initial] 之间；样本不足时使用 initial
+
+环境变量见 README_DEPLOY.md（GEMINI_CB_* / GEMINI_MAX_ATTEMPTS / GEMINI_BACKOFF_* / GEMINI_DEADLINE / GEMINI_TIMEOUT_*）。
+"""
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Optional
+import asyncio
+import os
+import random
+import threading
+import time
+
+from app.core.metrics import CIRCUIT_TRANSITIONS, MODEL_RETRIES
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+
+class CircuitOpenError(RuntimeError):
+    """熔断器处于打开状态，调用被拒绝。retry_after 为距离半开探测的秒数。"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f'circuit open for {name}; retry after {retry_after:.1f}s')
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(self, name: str = '', failure_rate: float = 0.5, min_calls: int = 10, window: int = 20,
+                 consecutive_failures: int = 5, open_seconds: float = 15.0, half_open_calls: int = 1,
+                 slow_call_seconds: float = 0.0):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.consecutive_failures = consecutive_failures
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self.slow_call_seconds = slow_call_seconds
+        self.state = CLOSED
+        self._window = deque(maxlen=window)
+        self._consecutive = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self._lock = threading.Lock()
+
+    def _transition(self, state: str):
+        self.state = state
+        CIRCUIT_TRANSITIONS.inc(breaker=self.name, state=state)
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+        else:
+            self._window.clear()
+            self._consecutive = 0
+        self._probes = 0
+
+    def before_call(self):
+        """放行则返回，否则抛出 CircuitOpenError。"""
+        with self._lock:
+            if self.state == OPEN:
+                waited = time.monotonic() - self._opened_at
+                if waited < self.open_seconds:
+                    raise CircuitOpenError(self.name, self.open_seconds - waited)
+                self._transition(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self._probes >= self.half_open_calls:
+                    raise CircuitOpenError(self.name, 0.0)
+                self._probes += 1
+
+    def record_success(self, latency: float = 0.0):
+        slow = self.slow_call_seconds > 0 and latency > self.slow_call_seconds
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._transition(OPEN if slow else CLOSED)
+                return
+            if self.state == OPEN:
+                # 打开前已发出、打开后才完成的调用：不影响打开状态与计时
+                return
+            self._consecutive = 0
+            self._window.append(slow)
+            self._maybe_trip()
+
+    def release(self):
+        """调用被取消、没有结果：归还半开探测名额。"""
+        with self._lock:
+            if self.state == HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+    def record_failure(self):
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._transition(OPEN)
+                return
+            if self.state == OPEN:
+                return
+            self._consecutive += 1
+            self._window.append(True)
+            self._maybe_trip()
+
+    def _maybe_trip(self):
+        if self._consecutive >= self.consecutive_failures:
+            self._transition(OPEN)
+            return
+        if len(self._window) >= self.min_calls and sum(self._window) / len(self._window) >= self.failure_rate:
+            self._transition(OPEN)
+
+    @classmethod
+    def from_env(cls, name: str = '') -> 'CircuitBreaker':
+        return cls(
+            name=name,
+            failure_rate=float(os.getenv('GEMINI_CB_FAILURE_RATE', '0.5')),
+            min_calls=int(os.getenv('GEMINI_CB_MIN_CALLS', '10')),
+            window=int(os.getenv('GEMINI_CB_WINDOW', '20')),
+            consecutive_failures=int(os.getenv('GEMINI_CB_CONSECUTIVE_FAILURES', '5')),
+            open_seconds=float(os.getenv('GEMINI_CB_OPEN_SECONDS', '15')),
+            half_open_calls=int(os.getenv('GEMINI_CB_HALF_OPEN_CALLS', '1')),
+            slow_call_seconds=float(os.getenv('GEMINI_CB_SLOW_CALL_SECONDS', '0')),
+        )
+
+
+class AdaptiveTimeout:
+    def __init__(self, initial: float = 30.0, floor: float = 2.0, multiplier: float = 3.0,
+                 min_samples: int = 20, window: int = 200, enabled: bool = True):
+        self.initial = initial
+        self.floor = floor
+        self.multiplier = multiplier
+        self.min_samples = min_samples
+        self.enabled = enabled
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, latency: float):
+        with self._lock:
+            self._latencies.append(latency)
+
+    def current(self) -> float:
+        if not self.enabled:
+            return self.initial
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return self.initial
+            values = sorted(self._latencies)
+        p99 = values[min(len(values) - 1, int(0.99 * len(values)))]
+        return max(self.floor, min(self.initial, p99 * self.multiplier))
+
+    @classmethod
+    def from_env(cls, initial: float) -> 'AdaptiveTimeout':
+        return cls(
+            initial=initial,
+            floor=float(os.getenv('GEMINI_TIMEOUT_FLOOR', '2')),
+            multiplier=float(os.getenv('GEMINI_TIMEOUT_MULTIPLIER', '3')),
+            enabled=os.getenv('GEMINI_ADAPTIVE_TIMEOUT', 'true').lower() in ('1', 'true', 'yes'),
+        )
+
+
+class RetryPolicy:
+    def __init__(self, max_attempts: int = 3, backoff_base: float = 0.25, backoff_max: float = 4.0,
+                 deadline: float = 30.0, rng: Optional[random.Random] = None):
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.deadline = deadline
+        self._rng = rng or random.Random()
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        delay = self._rng.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1))))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    @classmethod
+    def from_env(cls) -> 'RetryPolicy':
+        return cls(
+            max_attempts=int(os.getenv('GEMINI_MAX_ATTEMPTS', '3')),
+            backoff_base=float(os.getenv('GEMINI_BACKOFF_BASE', '0.25')),
+            backoff_max=float(os.getenv('GEMINI_BACKOFF_MAX', '4')),
+            deadline=float(os.getenv('GEMINI_DEADLINE', '30')),
+        )
+
+
+def _response_of(exc: BaseException):
+    return getattr(exc, 'response', None)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After 可以是秒数或 HTTP 日期。"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except Exception:
+        return None
+
+
+def retry_after_of(exc: BaseException) -> Optional[float]:
+    resp = _response_of(exc)
+    headers = getattr(resp, 'headers', None)
+    return parse_retry_after(headers.get('Retry-After')) if headers is not None else None
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """网络错误、超时、408 / 429 / 5xx 可重试；其他 4xx 说明请求本身有误，重试无意义。"""
+    if isinstance(exc, CircuitOpenError):
+        return False
+    status = getattr(_response_of(exc), 'status_code', None)
+    if status is None:
+        return True
+    return status in (408, 429) or status >= 500
+
+
+def _is_timeout(exc: BaseException) -> bool:
+    return isinstance(exc, TimeoutError) or 'Timeout' in type(exc).__name__
+
+
+class _Attempts:
+    """一次调用的重试状态：截止时间、单次超时与结果记录，供同步 / 异步重试循环共用。"""
+
+    def __init__(self, breaker: CircuitBreaker, timeouts: AdaptiveTimeout, policy: RetryPolicy, label: str):
+        self.breaker = breaker
+        self.timeouts = timeouts
+        self.policy = policy
+        self.label = label
+        self.deadline = time.monotonic() + policy.deadline
+        self.attempt = 0
+
+    def begin(self) -> float:
+        """开始一次尝试，返回本次超时（秒）；熔断打开时抛出 CircuitOpenError。"""
+        self.breaker.before_call()
+        self.attempt += 1
+        remaining = self.deadline - time.monotonic()
+        return max(0.001, min(self.timeouts.current(), remaining))
+
+    def succeeded(self, elapsed: float):
+        self.breaker.record_success(elapsed)
+        self.timeouts.observe(elapsed)
+
+    def failed(self, exc: BaseException, elapsed: float) -> Optional[float]:
+        """记录失败并返回重试前的等待秒数；不应重试时返回 None。"""
+        if not is_retryable(exc):
+            # 请求本身有误（4xx）：provider 可达，不计入熔断失败
+            self.breaker.record_success(elapsed)
+            return None
+        self.breaker.record_failure()
+        if _is_timeout(exc):
+            # 超时说明真实延迟不低于本次超时，记入样本以免超时越调越紧
+            self.timeouts.observe(elapsed)
+        if self.attempt >= self.policy.max_attempts:
+            return None
+        delay = self.policy.backoff(self.attempt, retry_after_of(exc))
+        if time.monotonic() + delay >= self.deadline:
+            return None
+        MODEL_RETRIES.inc(client=self.label)
+        return delay
+
+
+def call_with_retry(send: Callable[[float], Any], breaker: CircuitBreaker, timeouts: AdaptiveTimeout,
+                    policy: RetryPolicy, label: str = 'sync') -> Any:
+    """同步调用 send(timeout)，按策略重试。退避用 time.sleep 阻塞当前线程，只应由同步调用方使用；
+    异步代码使用 acall_with_retry。"""
+    attempts = _Attempts(breaker, timeouts, policy, label)
+    while True:
+        timeout = attempts.begin()
+        started = time.monotonic()
+        try:
+            result = send(timeout)
+        except BaseException as e:
+            if not isinstance(e, Exception):
+                breaker.release()
+                raise
+            delay = attempts.failed(e, time.monotonic() - started)
+            if delay is None:
+                raise
+            time.sleep(delay)
+            continue
+        attempts.succeeded(time.monotonic() - started)
+        return result
+
+
+async def acall_with_retry(send: Callable[[float], Any], breaker: CircuitBreaker, timeouts: AdaptiveTimeout,
+                           policy: RetryPolicy, label: str = 'async') -> Any:
+    """异步版本：send(timeout) 返回 awaitable。"""
+    attempts = _Attempts(breaker, timeouts, policy, label)
+    while True:
+        timeout = attempts.begin()
+        started = time.monotonic()
+        try:
+            result = await send(timeout)
+        except BaseException as e:
+            if not isinstance(e, Exception):
+                # 被取消（例如对冲请求的落败方）
+                breaker.release()
+                raise
+            delay = attempts.failed(e, time.monotonic() - started)
+            if delay is None:
+                raise
+            await asyncio.sleep(delay)
+            continue
+        attempts.succeeded(time.monotonic() - started)
+        return result
+
+
+_BREAKERS: Dict[str, CircuitBreaker] = {}
+_TIMEOUTS: Dict[str, AdaptiveTimeout] = {}
+_REGISTRY_LOCK = threading.Lock()
+
+
+def get_circuit_breaker(name: str) -> CircuitBreaker:
+    """进程级熔断器（按 base_url 懒创建，同步与异步客户端共享）。"""
+    breaker = _BREAKERS.get(name)
+    if breaker is None:
+        with _REGISTRY_LOCK:
+            breaker = _BREAKERS.get(name)
+            if breaker is None:
+                breaker = _BREAKERS[name] = CircuitBreaker.from_env(name)
+    return breaker
+
+
+def get_adaptive_timeout(name: str, initial: float) -> AdaptiveTimeout:
+    timeouts = _TIMEOUTS.get(name)
+    if timeouts is None:
+        with _REGISTRY_LOCK:
+            timeouts = _TIMEOUTS.get(name)
+            if timeouts is None:
+                timeouts = _TIMEOUTS[name] = AdaptiveTimeout.from_env(initial)
+    return timeouts
+
+
+def reset_resilience():
+    with _REGISTRY_LOCK:
+        _BREAKERS.clear()
+        _TIMEOUTS.clear()
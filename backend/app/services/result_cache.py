@@ -0,0 +1,246 @@
+"""分析结果缓存：按构建好的 prompt 哈希缓存 CFPAgent 的结构化输出，避免重复提交触发重复模型调用。
+
+- InMemoryResultCache：进程内 LRU，带 TTL 与容量上限
+- SQLiteResultCache：可选的磁盘层，多进程（同机 uvicorn workers）共享
+- TieredResultCache：先查内存再查磁盘，磁盘命中时回填内存
+
+只缓存通过 schema 校验的模型结果；合规检查与审计在每次返回时仍会执行。
+异步代码通过 call_result_cache 调用：带磁盘层（blocking）的缓存在线程池中执行，不阻塞事件循环。
+"""
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+import asyncio
+import copy
+import functools
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+def make_cache_key(prompt: str, namespace: str = '') -> str:
+    """对 prompt 做空白归一化后取 sha256；namespace 用于区分不同模型/供应商。"""
+    normalized = ' '.join(prompt.split())
+    return hashlib.sha256(f"{namespace}\x00{normalized}".encode('utf-8')).hexdigest()
+
+
+class BaseResultCache:
+    """结果缓存抽象：get 未命中返回 None。实现需线程安全，并维护 hits/misses 计数。
+
+    blocking=True 表示调用可能阻塞（磁盘 IO、等待其他进程的锁），异步调用方应放到线程池中执行。
+    """
+
+    blocking = False
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError()
+
+    def set(self, key: str, value: Dict[str, Any]):
+        raise NotImplementedError()
+
+    def clear(self):
+        raise NotImplementedError()
+
+    def _count(self, hit: bool):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": (self.hits / total) if total else 0.0}
+
+
+class InMemoryResultCache(BaseResultCache):
+    """进程内 LRU 缓存：超过 max_size 时淘汰最久未使用的条目，条目在 ttl 秒后过期。"""
+
+    def __init__(self, max_size: int = 1024, ttl: float = 600.0):
+        super().__init__()
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[0] <= now:
+                del self._data[key]
+                item = None
+            if item is None:
+                self._count(False)
+                return None
+            self._data.move_to_end(key)
+            self._count(True)
+            return copy.deepcopy(item[1])
+
+    def set(self, key: str, value: Dict[str, Any]):
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            self._data[key] = (expires_at, copy.deepcopy(value))
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), "size": len(self._data), "max_size": self.max_size}
+
+
+class SQLiteResultCache(BaseResultCache):
+    """SQLite 磁盘缓存：值以 JSON 存储，过期时间使用墙钟时间以便跨进程共享。
+
+    调用是同步的（其他 worker 持有写锁时最多等待 5 秒），在事件循环中必须经 call_result_cache 调用。
+    """
+
+    blocking = True
+    _PURGE_EVERY = 256
+
+    def __init__(self, path: str, ttl: float = 86400.0, max_rows: int = 100000):
+        super().__init__()
+        self.path = path
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self._writes = 0
+        d = os.path.dirname(os.path.abspath(path))
+        os.makedirs(d, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5.0)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS result_cache ('
+            ' key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_result_cache_expires ON result_cache(expires_at)')
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT value FROM result_cache WHERE key = ? AND expires_at > ?', (key, time.time())
+            ).fetchone()
+            self._count(row is not None)
+        return json.loads(row[0]) if row is not None else None
+
+    def set(self, key: str, value: Dict[str, Any]):
+        payload = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO result_cache (key, value, expires_at) VALUES (?, ?, ?)',
+                (key, payload, time.time() + self.ttl),
+            )
+            self._writes += 1
+            if self._writes % self._PURGE_EVERY == 0:
+                self._purge_locked()
+            self._conn.commit()
+
+    def _purge_locked(self):
+        self._conn.execute('DELETE FROM result_cache WHERE expires_at <= ?', (time.time(),))
+        # 超出行数上限时删除最早过期的条目
+        self._conn.execute(
+            'DELETE FROM result_cache WHERE key IN ('
+            ' SELECT key FROM result_cache ORDER BY expires_at DESC LIMIT -1 OFFSET ?)',
+            (self.max_rows,),
+        )
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute('DELETE FROM result_cache')
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class TieredResultCache(BaseResultCache):
+    """两级缓存：内存 LRU 在前，SQLite 在后。"""
+
+    def __init__(self, memory: InMemoryResultCache, disk: Optional[SQLiteResultCache] = None):
+        super().__init__()
+        self.memory = memory
+        self.disk = disk
+
+    @property
+    def blocking(self) -> bool:
+        return self.disk is not None
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.memory.set(key, value)
+        self._count(value is not None)
+        return value
+
+    def set(self, key: str, value: Dict[str, Any]):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        out = {**super().stats(), "memory": self.memory.stats()}
+        if self.disk is not None:
+            out["disk"] = self.disk.stats()
+        return out
+
+
+async def call_result_cache(cache: BaseResultCache, method: str, *args, **kwargs) -> Any:
+    """在事件循环中调用缓存的方法：blocking 的缓存在线程池中执行，纯内存缓存直接调用。"""
+    fn = getattr(cache, method)
+    if not getattr(cache, 'blocking', False):
+        return fn(*args, **kwargs)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, functools.partial(fn, *args, **kwargs))
+
+
+_DEFAULT_CACHE: Optional[BaseResultCache] = None
+_DEFAULT_CACHE_READY = False
+_DEFAULT_CACHE_LOCK = threading.Lock()
+
+
+def create_result_cache_from_env() -> Optional[BaseResultCache]:
+    """环境变量：CFP_CACHE_ENABLED（默认 true）/ CFP_CACHE_MAX_SIZE / CFP_CACHE_TTL（秒）/
+    CFP_CACHE_SQLITE_PATH（设置后启用磁盘层）/ CFP_CACHE_SQLITE_TTL。"""
+    if os.getenv('CFP_CACHE_ENABLED', 'true').lower() not in ('1', 'true', 'yes'):
+        return None
+    memory = InMemoryResultCache(
+        max_size=int(os.getenv('CFP_CACHE_MAX_SIZE', '1024')),
+        ttl=float(os.getenv('CFP_CACHE_TTL', '600')),
+    )
+    path = os.getenv('CFP_CACHE_SQLITE_PATH')
+    if not path:
+        return TieredResultCache(memory)
+    disk = SQLiteResultCache(path, ttl=float(os.getenv('CFP_CACHE_SQLITE_TTL', '86400')))
+    return TieredResultCache(memory, disk)
+
+
+def get_default_cache() -> Optional[BaseResultCache]:
+    """进程级默认缓存（懒加载）。API 每次请求都会新建 CFPAgent，因此缓存必须在进程内共享。"""
+    global _DEFAULT_CACHE, _DEFAULT_CACHE_READY
+    if not _DEFAULT_CACHE_READY:
+        with _DEFAULT_CACHE_LOCK:
+            if not _DEFAULT_CACHE_READY:
+                _DEFAULT_CACHE = create_result_cache_from_env()
+                _DEFAULT_CACHE_READY = True
+    return _DEFAULT_CACHE
@@ -1,4 +1,28 @@
-from typing import List
+from typing import Dict, List, Tuple
+from operator import itemgetter
+import heapq
+import math
+import re
+
+
+# ASCII 单词 / 数字（含小数）作为整体词元；连续汉字切分为字符二元组
+_ASCII_TOKEN = re.compile(r'[a-z0-9]+(?:\.[0-9]+)?')
+_CJK_RUN = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+')
+
+
+def tokenize(text: str) -> List[str]:
+    """中英文混合分词：英文/数字按词切分，中文按字符二元组（bigram）切分，单个汉字保留为单字。
+
+    二元组不依赖词典，对“负债率”“债务重组”这类专业词汇有稳定的召回。
+    """
+    text = text.lower()
+    tokens = _ASCII_TOKEN.findall(text)
+    for run in _CJK_RUN.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
 
 
 class BaseRetriever:
@@ -7,17 +31,76 @@ class BaseRetriever:
     def get(self, query: str, top_k: int = 5) -> List[str]:
         raise NotImplementedError()
 
+    def get_batch(self, queries: List[str], top_k: int = 5) -> List[List[str]]:
+        """批量检索，结果与 queries 一一对应；相同的查询只检索一次。子类可覆盖为真正的批量实现。"""
+        memo: Dict[str, List[str]] = {}
+        for q in queries:
+            if q not in memo:
+                memo[q] = self.get(q, top_k)
+        return [list(memo[q]) for q in queries]
+
+
+class BM25Retriever(BaseRetriever):
+    """基于倒排索引的 BM25 关键词检索器。
 
-class InMemoryRetriever(BaseRetriever):
-    """一个非常简单的内存检索器，用于本地测试：存储一组文档并基于关键词返回匹配项。"""
+    - add 时一次性分词并写入 postings（term -> [(doc_id, tf)]），查询只遍历查询词的倒排链
+    - idf 按查询时的文档频率计算，因此支持增量 add
+    - 使用堆选出 top-k，避免对全部候选排序
+    """
 
-    def __init__(self, docs=None):
-        self.docs = docs or []
+    def __init__(self, docs=None, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.docs: List[str] = []
+        self._postings: Dict[str, List[Tuple[int, int]]] = {}
+        self._doc_len: List[int] = []
+        self._total_len = 0
+        for d in docs or []:
+            self.add(d)
+
+    def __len__(self):
+        return len(self.docs)
 
     def add(self, text: str):
+        doc_id = len(self.docs)
         self.docs.append(text)
+        tf: Dict[str, int] = {}
+        tokens = tokenize(text)
+        for t in tokens:
+            tf[t] = tf.get(t, 0) + 1
+        for t, n in tf.items():
+            self._postings.setdefault(t, []).append((doc_id, n))
+        self._doc_len.append(len(tokens))
+        self._total_len += len(tokens)
+
+    def get_scored(self, query: str, top_k: int = 5) -> List[Tuple[float, str]]:
+        """返回 [(score, doc)]，按 BM25 分数降序；没有任何词命中时返回空列表。"""
+        n_docs = len(self.docs)
+        if n_docs == 0 or top_k <= 0:
+            return []
+        avgdl = (self._total_len / n_docs) or 1.0
+        k1, b = self.k1, self.b
+        doc_len = self._doc_len
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            df = len(postings)
+            idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+            for doc_id, tf in postings:
+                norm = tf + k1 * (1.0 - b + b * doc_len[doc_id] / avgdl)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (k1 + 1.0) / norm
+        best = heapq.nlargest(top_k, scores.items(), key=itemgetter(1))
+        return [(score, self.docs[doc_id]) for doc_id, score in best]
+
+    def get(self, query: str, top_k: int = 5) -> List[str]:
+        return [doc for _, doc in self.get_scored(query, top_k)]
+
+
+class InMemoryRetriever(BM25Retriever):
+    """内存检索器（本地测试 / 小型知识库）：BM25 排序；没有任何命中时退回前 top_k 个文档，保证 prompt 有上下文。"""
 
     def get(self, query: str, top_k: int = 5):
-        # 简单包含匹配
-        matches = [d for d in self.docs if query.lower() in d.lower()]
-        return matches[:top_k] if matches else self.docs[:top_k]
+        matches = super().get(query, top_k)
+        return matches if matches else self.docs[:top_k]
@@ -0,0 +1,93 @@
+"""规则引擎：基于 FinancialStatement 的确定性分析，作为模型之前的第一层与模型失败时的兜底。
+
+- evaluate(fs)：按负债率阈值给出概述与建议（与此前 CFPAgent 内置兜底的输出一致）
+- classify(fs)：判断画像是否“常规”（低负债、储蓄率健康），返回 (routine, confidence)；
+  常规画像由本地直接作答，无需调用模型
+
+阈值可通过构造参数或环境变量（CFP_RULES_*）配置。
+"""
+from typing import Any, Dict, Optional, Tuple
+import os
+import threading
+
+from app.models.financials import FinancialStatement
+
+
+class RuleEngine:
+    """可配置阈值的规则引擎。
+
+    high_debt_ratio：负债率超过该值时建议优先偿还高息负债。
+    routine_max_debt_ratio / routine_min_savings_rate：常规画像的负债率上限与月储蓄率下限。
+    routine_min_confidence：classify 置信度达到该值才判定为常规。
+    """
+
+    def __init__(self, high_debt_ratio: float = 0.6, routine_max_debt_ratio: float = 0.3,
+                 routine_min_savings_rate: float = 0.2, routine_min_confidence: float = 0.75,
+                 fallback_confidence: float = 0.6):
+        self.high_debt_ratio = high_debt_ratio
+        self.routine_max_debt_ratio = routine_max_debt_ratio
+        self.routine_min_savings_rate = routine_min_savings_rate
+        self.routine_min_confidence = routine_min_confidence
+        self.fallback_confidence = fallback_confidence
+
+    @staticmethod
+    def savings_rate(fs: FinancialStatement) -> float:
+        try:
+            income = float(fs.income)
+            return (income - float(fs.expenses)) / income if income > 0 else 0.0
+        except Exception:
+            return 0.0
+
+    def evaluate(self, fs: FinancialStatement, confidence: Optional[float] = None) -> Dict[str, Any]:
+        """规则分析结果，字段与模型输出 schema 一致。"""
+        debt_ratio = fs.debt_ratio()
+        overview = f"用户当前负债率为 {debt_ratio:.2f}"
+        if debt_ratio > self.high_debt_ratio:
+            recs = ["建议优先偿还高息负债，或调整预算以减少支出。"]
+        else:
+            recs = ["保持良好预算习惯并建立应急基金。"]
+        conf = self.fallback_confidence if confidence is None else confidence
+        return {"overview": overview, "recommendations": recs, "risks": [], "confidence": conf}
+
+    def classify(self, fs: FinancialStatement) -> Tuple[bool, float]:
+        """返回 (是否常规, 置信度)。置信度取两项指标离阈值的余量中较小者，映射到 [0, 1]。"""
+        debt_ratio = fs.debt_ratio()
+        savings = self.savings_rate(fs)
+        if self.routine_max_debt_ratio <= 0 or self.routine_min_savings_rate >= 1:
+            return False, 0.0
+        debt_margin = (self.routine_max_debt_ratio - debt_ratio) / self.routine_max_debt_ratio
+        savings_margin = (savings - self.routine_min_savings_rate) / (1.0 - self.routine_min_savings_rate)
+        margin = min(debt_margin, savings_margin)
+        if margin < 0:
+            return False, 0.0
+        confidence = min(1.0, 0.5 + 0.5 * margin)
+        return confidence >= self.routine_min_confidence, confidence
+
+    @classmethod
+    def from_env(cls) -> 'RuleEngine':
+        """环境变量：CFP_RULES_HIGH_DEBT_RATIO / CFP_RULES_ROUTINE_MAX_DEBT_RATIO /
+        CFP_RULES_ROUTINE_MIN_SAVINGS_RATE / CFP_RULES_ROUTINE_MIN_CONFIDENCE。"""
+        return cls(
+            high_debt_ratio=float(os.getenv('CFP_RULES_HIGH_DEBT_RATIO', '0.6')),
+            routine_max_debt_ratio=float(os.getenv('CFP_RULES_ROUTINE_MAX_DEBT_RATIO', '0.3')),
+            routine_min_savings_rate=float(os.getenv('CFP_RULES_ROUTINE_MIN_SAVINGS_RATE', '0.2')),
+            routine_min_confidence=float(os.getenv('CFP_RULES_ROUTINE_MIN_CONFIDENCE', '0.75')),
+        )
+
+
+_DEFAULT_ENGINE: Optional[RuleEngine] = None
+_DEFAULT_ENGINE_LOCK = threading.Lock()
+
+
+def get_default_rule_engine() -> RuleEngine:
+    """进程级规则引擎（懒加载）。"""
+    global _DEFAULT_ENGINE
+    if _DEFAULT_ENGINE is None:
+        with _DEFAULT_ENGINE_LOCK:
+            if _DEFAULT_ENGINE is None:
+                _DEFAULT_ENGINE = RuleEngine.from_env()
+    return _DEFAULT_ENGINE
+
+
+def local_tier_enabled() -> bool:
+    return os.getenv('CFP_LOCAL_TIER_ENABLED', 'false').lower() in ('1', 'true', 'yes')
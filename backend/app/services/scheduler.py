@@ -0,0 +1,164 @@
+"""后台报告任务调度器：有界并发 + 有界优先级队列 + 优雅停机。
+
+- 同时运行的任务数不超过 max_concurrency；没有常驻 worker，任务结束时由完成回调从队列取下一个
+- 等待队列为堆，priority 越大越先执行，同优先级先进先出
+- 队列满时 submit 抛出 QueueFullError，retry_after 按平均任务耗时估算，API 层映射为 429 + Retry-After
+- drain() 停止接收新任务并等待队列清空；超时后取消运行中的任务，返回未能启动的任务 id
+"""
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+
+
+class QueueFullError(RuntimeError):
+    """等待队列已满。retry_after 为建议的重试间隔（秒）。"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f'job queue is full, retry after {retry_after}s')
+        self.retry_after = retry_after
+
+
+class SchedulerClosedError(RuntimeError):
+    """调度器正在停机，不再接收新任务。"""
+
+
+class JobScheduler:
+    """进程内任务调度器。factory 为无参协程函数，任务状态由调用方自行记录（例如 job_store）。"""
+
+    def __init__(self, max_concurrency: int = 4, max_queue: int = 100, initial_job_seconds: float = 5.0):
+        if max_concurrency < 1:
+            raise ValueError('max_concurrency must be >= 1')
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        # 任务耗时的指数滑动平均，用于估算 Retry-After
+        self.avg_job_seconds = initial_job_seconds
+        self._seq = itertools.count()
+        self._reset()
+
+    def _reset(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self._loop = loop
+        self._queue: List[tuple] = []  # (-priority, seq, job_id, factory)
+        self._queued: Dict[str, tuple] = {}
+        self._running: Dict[str, asyncio.Task] = {}
+        self._closed = False
+        self._idle: Optional[asyncio.Event] = None
+        self.completed = 0
+        self.rejected = 0
+
+    def _bind_loop(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # 旧事件循环（例如测试中已关闭的循环）遗留的任务永远不会完成，不能占用并发名额
+            self._reset(loop)
+
+    def __len__(self):
+        return len(self._queued)
+
+    @property
+    def running(self) -> int:
+        return len(self._running)
+
+    def retry_after(self) -> int:
+        waves = (len(self._queued) + len(self._running)) / self.max_concurrency
+        return max(1, math.ceil(waves * self.avg_job_seconds))
+
+    def submit(self, job_id: str, factory: Callable[[], Awaitable[Any]], priority: int = 0) -> int:
+        """提交任务，返回排队位置（0 表示已立即开始运行）。"""
+        self._bind_loop()
+        if self._closed:
+            raise SchedulerClosedError('scheduler is draining')
+        if len(self._running) < self.max_concurrency:
+            self._start(job_id, factory)
+            return 0
+        if len(self._queued) >= self.max_queue:
+            self.rejected += 1
+            raise QueueFullError(self.retry_after())
+        entry = (-priority, next(self._seq), job_id, factory)
+        heapq.heappush(self._queue, entry)
+        self._queued[job_id] = entry
+        return self.position(job_id)
+
+    def position(self, job_id: str) -> Optional[int]:
+        """排队位置（从 1 开始）；正在运行返回 0，未知任务返回 None。"""
+        if job_id in self._running:
+            return 0
+        entry = self._queued.get(job_id)
+        if entry is None:
+            return None
+        return 1 + sum(1 for other in self._queued.values() if other < entry)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"running": len(self._running), "queued": len(self._queued), "max_concurrency": self.max_concurrency,
+                "max_queue": self.max_queue, "completed": self.completed, "rejected": self.rejected,
+                "avg_job_seconds": self.avg_job_seconds}
+
+    def _start(self, job_id: str, factory: Callable[[], Awaitable[Any]]):
+        started = time.monotonic()
+        task = asyncio.ensure_future(factory())
+        self._running[job_id] = task
+        task.add_done_callback(lambda t, _id=job_id, _start=started: self._on_done(_id, t, _start))
+
+    def _on_done(self, job_id: str, task: asyncio.Task, started: float):
+        if self._running.get(job_id) is not task:
+            return  # 已被 _reset 丢弃
+        del self._running[job_id]
+        self.completed += 1
+        self.avg_job_seconds = 0.8 * self.avg_job_seconds + 0.2 * (time.monotonic() - started)
+        if not task.cancelled():
+            task.exception()  # 异常应由 factory 自行记录，这里只避免未取回警告
+        while self._queue and len(self._running) < self.max_concurrency:
+            _, _, next_id, factory = heapq.heappop(self._queue)
+            if self._queued.pop(next_id, None) is not None:
+                self._start(next_id, factory)
+        if self._idle is not None and not self._running and not self._queue:
+            self._idle.set()
+
+    async def drain(self, timeout: float = 30.0) -> List[str]:
+        """停止接收新任务，等待运行中与排队的任务完成。
+
+        超时后取消运行中的任务并清空队列，返回从未开始运行的任务 id，调用方据此更新任务状态。
+        """
+        self._bind_loop()
+        self._closed = True
+        if self._running or self._queue:
+            self._idle = asyncio.Event()
+            try:
+                await asyncio.wait_for(self._idle.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        dropped = [entry[2] for entry in sorted(self._queue)]
+        self._queue.clear()
+        self._queued.clear()
+        running = list(self._running.values())
+        for task in running:
+            task.cancel()
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+        return dropped
+
+
+_DEFAULT_SCHEDULER: Optional[JobScheduler] = None
+_DEFAULT_SCHEDULER_LOCK = threading.Lock()
+
+
+def create_scheduler_from_env() -> JobScheduler:
+    """环境变量：REPORT_MAX_CONCURRENCY（默认 4）/ REPORT_QUEUE_SIZE（默认 100）。"""
+    return JobScheduler(
+        max_concurrency=int(os.getenv('REPORT_MAX_CONCURRENCY', '4')),
+        max_queue=int(os.getenv('REPORT_QUEUE_SIZE', '100')),
+    )
+
+
+def get_scheduler() -> JobScheduler:
+    """进程级调度器（懒加载）。"""
+    global _DEFAULT_SCHEDULER
+    if _DEFAULT_SCHEDULER is None:
+        with _DEFAULT_SCHEDULER_LOCK:
+            if _DEFAULT_SCHEDULER is None:
+                _DEFAULT_SCHEDULER = create_scheduler_from_env()
+    return _DEFAULT_SCHEDULER
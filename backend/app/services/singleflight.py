@@ -0,0 +1,62 @@
+"""Single-flight：合并并发的相同请求。
+
+同一 key 的并发调用共享一个底层协程（asyncio.Task），所有等待者得到同一结果或同一异常。
+单个等待者被取消（例如客户端断开）不会影响其他等待者；当全部等待者都取消时才取消底层任务。
+任务完成后立即从注册表移除，因此只合并“正在进行中”的请求，不充当缓存。
+"""
+from typing import Any, Awaitable, Callable, Dict
+import asyncio
+
+
+class _Call:
+    __slots__ = ('task', 'loop', 'waiters')
+
+    def __init__(self, task: asyncio.Task, loop: asyncio.AbstractEventLoop):
+        self.task = task
+        self.loop = loop
+        self.waiters = 0
+
+
+class SingleFlight:
+    """进程内 in-flight 请求注册表。"""
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+
+    def __len__(self):
+        return len(self._calls)
+
+    def in_flight(self, key: str) -> bool:
+        call = self._calls.get(key)
+        return call is not None and not call.task.done()
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """执行 factory() 或加入已在进行中的同 key 调用，返回共享结果。"""
+        loop = asyncio.get_running_loop()
+        call = self._calls.get(key)
+        # 旧事件循环遗留的条目（例如测试中循环已关闭）不能复用
+        if call is None or call.loop is not loop or call.task.done():
+            task = asyncio.ensure_future(factory())
+            call = _Call(task, loop)
+            self._calls[key] = call
+            task.add_done_callback(lambda _t, _key=key, _call=call: self._forget(_key, _call))
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if call.waiters == 1 and not call.task.done():
+                # 最后一个等待者离开：没有人需要结果了，取消底层调用；
+                # 立即移出注册表，避免取消生效前到达的新调用方加入这个正在取消的任务
+                call.task.cancel()
+                self._forget(key, call)
+            raise
+        finally:
+            call.waiters -= 1
+
+    def _forget(self, key: str, call: _Call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        # 所有等待者都已取消时，避免 "exception was never retrieved" 警告
+        if call.task.done() and not call.task.cancelled():
+            call.task.exception()
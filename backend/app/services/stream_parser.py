@@ -1,72 +1,224 @@
-"""流式输出解析器（增强版）
+"""流式输出解析器（增量状态机版）
 
-本实现使用 json.JSONDecoder.raw_decode 做增量解析：
-- 处理前导噪声（比如 SSE 的 "data:" 前缀或其他文本）
-- 在缓冲区中尝试提取第一个完整 JSON 对象并返回
-- 若解析不完整则返回 None，等待更多片段
+逐片段扫描模型流式输出，提取完整的顶层 JSON 值：
+- 处理前导噪声（比如 SSE 的 "data:" 前缀或其他文本），忽略 "data: [DONE]"
+- 跨 feed 保存扫描状态（括号深度、是否在字符串内、转义），每个字符只检查一次
+- 片段以列表累积，只有顶层对象/数组闭合时才拼接并调用 JSON 解码器，整体为线性复杂度
+- 单个值超过 max_buffer 时丢弃该值并抛出 StreamBufferOverflow，而不是截断后继续解析出错误对象
+- track_fields=True 时，顶层对象中的字符串字段（如 overview）和字符串数组元素（如 recommendations[i]）
+  一旦闭合即作为部分结果记录，可通过 drain_fields() 取出，用于渐进式推送
 """
-from typing import Optional
+from collections import deque
+from typing import Any, Deque, List, Optional, Tuple
 import json
 import re
 
 
+_SSE_PREFIX = re.compile(r'^\s*data:\s*')
+# 值外：寻找顶层值的起点；值内：结构字符与字符串起点；字符串内：结束引号与转义
+_VALUE_START = re.compile(r'[\{\[]')
+_STRUCTURAL = re.compile(r'["\{\}\[\]]')
+_STRING_SPECIAL = re.compile(r'["\\]')
+# 跟踪字段时还需要识别顶层的逗号（区分键/值与数组下标）
+_STRUCTURAL_FIELDS = re.compile(r'["\{\}\[\],]')
+
+
+class StreamBufferOverflow(ValueError):
+    """单个 JSON 值超过 max_buffer 字符，已被丢弃。"""
+
+
 class StreamJSONBuilder:
-    """增量 JSON 构造器：累积文本片段，尝试解析并提取第一个完整的 JSON 对象。"""
+    """增量 JSON 构造器：累积文本片段，返回第一个完整的顶层 JSON 对象（或数组）。"""
 
-    def __init__(self, max_buffer: int = 20000):
-        self.buffer = ''
+    def __init__(self, max_buffer: int = 20000, track_fields: bool = False):
         self.max_buffer = max_buffer
-        self._decoder = json.JSONDecoder()
+        self.track_fields = track_fields
+        self._structural = _STRUCTURAL_FIELDS if track_fields else _STRUCTURAL
+        self.reset()
+
+    def reset(self):
+        self._pending: Deque[str] = deque()  # 已清洗、尚未扫描的片段
+        self._parts: List[str] = []  # 当前值中已扫描的片段
+        self._value_len = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._reset_fields()
+        self._fields: List[Tuple[tuple, Any]] = []
+
+    def _reset_fields(self):
+        # 顶层对象内的字段跟踪状态
+        self._top_is_object = False
+        self._expect_key = False
+        self._cur_key: Optional[str] = None
+        self._arr_key: Optional[str] = None  # 当前深度 2 容器为数组时对应的键
+        self._arr_index = 0
+        self._str_capture = False  # 当前字符串是否需要取值（键或关注的值）
+        self._str_pieces: List[str] = []
+        self._str_start = 0
+
+    def drain_fields(self) -> List[Tuple[tuple, Any]]:
+        """取出并清空已完成的部分字段：[(("overview",), str) 或 (("recommendations", i), str)]。"""
+        fields, self._fields = self._fields, []
+        return fields
 
-    def _find_json_start(self) -> Optional[int]:
-        m = re.search(r'[\{\[]', self.buffer)
-        return m.start() if m else None
+    def _on_string_open(self, pos: int):
+        depth = self._depth
+        self._str_capture = self._top_is_object and (depth == 1 or (depth == 2 and self._arr_key is not None))
+        if self._str_capture:
+            self._str_pieces = []
+            self._str_start = pos
+
+    def _on_string_close(self, text: str, end: int):
+        if not self._str_capture:
+            return
+        self._str_capture = False
+        literal = ''.join(self._str_pieces) + text[self._str_start:end]
+        self._str_pieces = []
+        try:
+            value = json.loads(f'"{literal}"')
+        except ValueError:
+            return
+        if self._depth == 1:
+            if self._expect_key:
+                self._cur_key = value
+                self._expect_key = False
+            elif self._cur_key is not None:
+                self._fields.append(((self._cur_key,), value))
+        else:
+            self._fields.append(((self._arr_key, self._arr_index), value))
 
-    def feed(self, chunk: str) -> Optional[dict]:
+    @property
+    def buffer(self) -> str:
+        """尚未被消费的文本（当前未完成的值 + 未扫描片段），用于调试。"""
+        return ''.join(self._parts) + ''.join(self._pending)
+
+    @staticmethod
+    def _clean(chunk: str) -> List[str]:
+        # 处理 Gemini/一般 SSE 格式：按行拆分，去除每行开头的 data: 前缀，忽略 data: [DONE]
+        # 行之间不插入换行，因为 JSON 可能直接跨片段拼接
+        if 'data:' not in chunk and '[DONE]' not in chunk and '\n' not in chunk and '\r' not in chunk:
+            return [chunk]
+        out = []
+        for line in chunk.splitlines():
+            line_clean = _SSE_PREFIX.sub('', line, count=1)
+            if not line_clean or line_clean.strip() == '[DONE]':
+                continue
+            out.append(line_clean)
+        return out
+
+    def feed(self, chunk: Optional[str]) -> Optional[Any]:
         """Feed 一个文本片段，若能解析出一个完整 JSON 则返回该对象，否则返回 None。
 
-        说明：当 buffer 中包含多个 JSON 时，每次调用会返回第一个；上层可继续调用以提取后续对象。
-        如果传入空字符串或 None，则会尝试从已有缓冲区中解析剩余对象（便于循环提取）。
+        说明：当已接收的文本中包含多个 JSON 时，每次调用返回一个；上层可继续以空字符串调用以提取后续对象。
         """
-        # 清洗并追加新片段（若有）
         if chunk:
-            # 处理 Gemini/一般 SSE 格式：按行拆分，去除每行开头的 data: 前缀，忽略 data: [DONE]
-            lines = chunk.splitlines()
-            for line in lines:
-                line_clean = re.sub(r'^\s*data:\s*', '', line)
-                if not line_clean:
-                    continue
-                if line_clean.strip() == '[DONE]':
-                    continue
-                # 追加到缓冲区（不额外插入换行），因为我们期待 JSON 可能直接拼接
-                self.buffer += line_clean
-
-        # 如果缓冲为空，则没有可解析的数据
-        if not self.buffer:
-            return None
+            self._pending.extend(self._clean(chunk))
+        while self._pending:
+            text = self._pending.popleft()
+            obj, found, rest = self._scan(text)
+            if rest:
+                self._pending.appendleft(rest)
+            if found:
+                return obj
+        return None
 
-        # 防止缓冲无限增长
-        if len(self.buffer) > self.max_buffer:
-            # 保守策略：保留最近的 max_buffer 字符
-            self.buffer = self.buffer[-self.max_buffer:]
+    def _scan(self, text: str):
+        """扫描一个片段；返回 (obj, found, 未扫描的剩余文本)。"""
+        pos = 0
+        n = len(text)
+        while pos < n:
+            if self._depth == 0:
+                m = _VALUE_START.search(text, pos)
+                if m is None:
+                    return None, False, ''  # 值外的噪声直接丢弃
+                seg_start = m.start()
+                self._depth = 1
+                pos = m.end()
+                if self.track_fields:
+                    self._reset_fields()
+                    self._top_is_object = self._expect_key = m.group() == '{'
 
-        # 找到第一个 JSON 开始位置
-        start = self._find_json_start()
-        if start is None:
-            return None
+            else:
+                seg_start = pos
 
-        # 如果有前导噪声，丢弃
-        if start > 0:
-            self.buffer = self.buffer[start:]
+            while pos < n:
+                if self._escape:
+                    self._escape = False
+                    pos += 1
+                    continue
+                if self._in_string:
+                    m = _STRING_SPECIAL.search(text, pos)
+                    if m is None:
+                        pos = n
+                        break
+                    if m.group() == '\\':
+                        self._escape = True
+                    else:
+                        self._in_string = False
+                        if self.track_fields:
+                            self._on_string_close(text, m.start())
+                    pos = m.end()
+                    continue
+                m = self._structural.search(text, pos)
+                if m is None:
+                    pos = n
+                    break
+                ch = m.group()
+                pos = m.end()
+                if ch == '"':
+                    self._in_string = True
+                    if self.track_fields:
+                        self._on_string_open(pos)
+                elif ch == ',':
+                    if self._depth == 1:
+                        self._expect_key = self._top_is_object
+                    elif self._depth == 2 and self._arr_key is not None:
+                        self._arr_index += 1
+                elif ch in '{[':
+                    self._depth += 1
+                    if self.track_fields and self._depth == 2:
+                        self._arr_key = self._cur_key if ch == '[' and self._top_is_object else None
+                        self._arr_index = 0
+                else:
+                    self._depth -= 1
+                    if self._depth == 1:
+                        self._arr_key = None
+                    if self._depth == 0:
+                        size = self._value_len + pos - seg_start
+                        if size > self.max_buffer:
+                            # 值在本片段内闭合但已超限：丢弃该值，保留其后的文本
+                            if pos < n:
+                                self._pending.appendleft(text[pos:])
+                            self._overflow(size)
+                        self._parts.append(text[seg_start:pos])
+                        raw = ''.join(self._parts)
+                        self._parts = []
+                        self._value_len = 0
+                        try:
+                            return json.loads(raw), True, text[pos:]
+                        except ValueError:
+                            # 括号配平但内容非法（例如噪声中的 "{...}"）：丢弃并继续寻找下一个值
+                            break
 
-        try:
-            obj, end = self._decoder.raw_decode(self.buffer)
-            # 切掉已消费的部分
-            self.buffer = self.buffer[end:]
-            return obj
-        except json.JSONDecodeError:
-            # 缓冲还不完整，等待更多片段
-            return None
+            if self._depth > 0:
+                if self._in_string and self._str_capture:
+                    # 字符串跨片段：保存已扫描部分，下一片段从开头继续
+                    self._str_pieces.append(text[self._str_start:])
+                    self._str_start = 0
+                self._parts.append(text[seg_start:])
+                self._value_len += n - seg_start
+                if self._value_len > self.max_buffer:
+                    # 值尚未闭合：后续片段都属于该值，一并丢弃
+                    self._pending.clear()
+                    self._overflow(self._value_len)
+        return None, False, ''
 
-    def reset(self):
-        self.buffer = ''
+    def _overflow(self, size: int):
+        self._parts = []
+        self._value_len = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._reset_fields()
+        raise StreamBufferOverflow(f'JSON value exceeded max_buffer ({size} > {self.max_buffer} chars)')
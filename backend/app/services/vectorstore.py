@@ -1,29 +1,317 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+import json
+import os
+
+import numpy as np
+
+
+# 支持的距离度量：l2（欧氏距离）、cosine（1 - 余弦相似度）、ip（负内积）。
+# 所有度量都返回“距离”，数值越小越相似，与原先按 L2 升序的返回约定一致。
+METRICS = ('l2', 'cosine', 'ip')
+
+QueryResult = Tuple[float, str, Dict[str, Any]]
+
+# 持久化格式：目录内包含 header.json（版本头，最后写入）、vectors.npy / sq_norms.npy（float32，
+# 加载时以 mmap 只读映射，多 worker 共享页缓存）与 meta.json（ids + metadatas）。
+INDEX_FORMAT = 'xcgg-vectorstore'
+INDEX_FORMAT_VERSION = 1
+HEADER_FILE = 'header.json'
+
+
+class StaleIndexError(ValueError):
+    """索引文件缺失、版本不兼容或与期望的构建参数（例如 embedding 签名）不一致。"""
+
+
+def _atomic_write(path: str, writer):
+    tmp = f"{path}.tmp-{os.getpid()}"
+    with open(tmp, 'wb') as f:
+        writer(f)
+    os.replace(tmp, path)
+
+
+def read_index_header(path: str) -> Dict[str, Any]:
+    header_path = os.path.join(path, HEADER_FILE)
+    if not os.path.exists(header_path):
+        raise StaleIndexError(f'no index header at {header_path}')
+    with open(header_path, 'r', encoding='utf-8') as f:
+        header = json.load(f)
+    if header.get('format') != INDEX_FORMAT or header.get('version') != INDEX_FORMAT_VERSION:
+        raise StaleIndexError(
+            f"unsupported index format {header.get('format')!r} v{header.get('version')}; "
+            f"expected {INDEX_FORMAT!r} v{INDEX_FORMAT_VERSION}"
+        )
+    return header
+
+
+def load_vector_store(path: str, mmap: bool = True, expected: Optional[Dict[str, Any]] = None):
+    """按 header 中记录的类型加载向量库（InMemoryVectorStore 或 IVFVectorStore）。"""
+    kind = read_index_header(path).get('kind')
+    if kind == 'IVFVectorStore':
+        from app.services.ann_index import IVFVectorStore
+        return IVFVectorStore.load(path, mmap=mmap, expected=expected)
+    return InMemoryVectorStore.load(path, mmap=mmap, expected=expected)
 
 
 class BaseVectorStore:
     def upsert(self, embeddings: List[List[float]], metadatas: List[Dict[str, Any]], ids: List[str]):
         raise NotImplementedError()
 
-    def query(self, vector: List[float], top_k: int = 5):
+    def query(self, vector: List[float], top_k: int = 5) -> List[QueryResult]:
+        raise NotImplementedError()
+
+    def delete(self, ids: Sequence[str]) -> int:
+        """删除给定 id（不存在的忽略），返回实际删除的条数。"""
         raise NotImplementedError()
 
+    def query_batch(self, vectors: Sequence[Sequence[float]], top_k: int = 5) -> List[List[QueryResult]]:
+        """批量查询：默认逐条调用 query，实现方可覆盖为一次矩阵运算。"""
+        return [self.query(v, top_k) for v in vectors]
+
 
 class InMemoryVectorStore(BaseVectorStore):
-    def __init__(self):
-        self.store = []  # list of (id, vector, metadata)
+    """基于 NumPy 的内存向量库（精确检索）。
+
+    - 向量保存在连续的 float32 矩阵中，容量按倍数增长（摊销 O(1) 追加）
+    - 预先缓存每行的平方范数，L2 / cosine 距离都只需一次矩阵乘法
+    - top-k 使用 argpartition 做部分选择，仅对候选排序
+    - 相同 id 再次 upsert 时原位覆盖；delete 用末行填补被删行（O(1)，行号随之变化）
+    """
+
+    def __init__(self, metric: str = 'l2', dim: Optional[int] = None, initial_capacity: int = 1024):
+        if metric not in METRICS:
+            raise ValueError(f'unsupported metric {metric!r}; expected one of {METRICS}')
+        self.metric = metric
+        self._dim = dim
+        self._capacity = max(1, int(initial_capacity))
+        self._vectors: Optional[np.ndarray] = None
+        self._sq_norms: Optional[np.ndarray] = None
+        self._size = 0
+        self._ids: List[str] = []
+        self._metas: List[Dict[str, Any]] = []
+        self._index: Dict[str, int] = {}
+
+    @property
+    def dim(self) -> Optional[int]:
+        return self._dim
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """已存储向量的只读视图，形状 (len, dim)。"""
+        if self._vectors is None:
+            return np.empty((0, self._dim or 0), dtype=np.float32)
+        return self._vectors[:self._size]
+
+    @property
+    def store(self) -> List[Tuple[str, List[float], Dict[str, Any]]]:
+        """兼容旧接口的 (id, vector, metadata) 列表（按需构造，仅用于调试）。"""
+        vecs = self.vectors
+        return [(self._ids[i], vecs[i].tolist(), self._metas[i]) for i in range(self._size)]
+
+    def _as_matrix(self, vectors) -> np.ndarray:
+        arr = np.asarray(vectors, dtype=np.float32)
+        if arr.ndim == 1:
+            arr = arr.reshape(1, -1)
+        if arr.ndim != 2:
+            raise ValueError('vectors must be 1-D or 2-D')
+        if self._dim is None:
+            self._dim = arr.shape[1]
+        elif arr.shape[1] != self._dim:
+            raise ValueError(f'dimension mismatch: expected {self._dim}, got {arr.shape[1]}')
+        return arr
+
+    def _reserve(self, needed: int):
+        if self._vectors is None:
+            cap = max(self._capacity, needed)
+            self._vectors = np.empty((cap, self._dim), dtype=np.float32)
+            self._sq_norms = np.empty(cap, dtype=np.float32)
+            return
+        cap = self._vectors.shape[0]
+        if needed <= cap:
+            return
+        while cap < needed:
+            cap *= 2
+        vectors = np.empty((cap, self._dim), dtype=np.float32)
+        vectors[:self._size] = self._vectors[:self._size]
+        sq_norms = np.empty(cap, dtype=np.float32)
+        sq_norms[:self._size] = self._sq_norms[:self._size]
+        self._vectors, self._sq_norms = vectors, sq_norms
+
+    def _ensure_writable(self):
+        # 从 mmap 只读加载的索引在首次写入时复制到内存（写时复制），原文件保持不变
+        if self._vectors is not None and not self._vectors.flags.writeable:
+            self._vectors = np.array(self._vectors[:self._size])
+            self._sq_norms = np.array(self._sq_norms[:self._size])
 
     def upsert(self, embeddings: List[List[float]], metadatas: List[Dict[str, Any]], ids: List[str]):
-        for i, v in enumerate(embeddings):
-            self.store.append((ids[i], v, metadatas[i]))
+        if not (len(embeddings) == len(metadatas) == len(ids)):
+            raise ValueError('embeddings, metadatas and ids must have the same length')
+        if len(ids) == 0:
+            return []
+        arr = self._as_matrix(embeddings)
+        rows = np.empty(len(ids), dtype=np.int64)
+        new = 0
+        for i, _id in enumerate(ids):
+            row = self._index.get(_id)
+            if row is None:
+                row = self._size + new
+                self._index[_id] = row
+                self._ids.append(_id)
+                self._metas.append(metadatas[i])
+                new += 1
+            else:
+                self._metas[row] = metadatas[i]
+            rows[i] = row
+        self._ensure_writable()
+        self._reserve(self._size + new)
+        self._size += new
+        self._vectors[rows] = arr
+        self._sq_norms[rows] = np.einsum('ij,ij->i', arr, arr)
+        return rows
+
+    def delete(self, ids: Sequence[str]) -> int:
+        removed = 0
+        for _id in ids:
+            row = self._index.pop(_id, None)
+            if row is None:
+                continue
+            self._ensure_writable()
+            self._forget_row(row)
+            last = self._size - 1
+            if row != last:
+                self._vectors[row] = self._vectors[last]
+                self._sq_norms[row] = self._sq_norms[last]
+                self._ids[row] = self._ids[last]
+                self._metas[row] = self._metas[last]
+                self._index[self._ids[row]] = row
+                self._move_row(last, row)
+            self._ids.pop()
+            self._metas.pop()
+            self._size -= 1
+            removed += 1
+        return removed
+
+    def _forget_row(self, row: int):
+        """子类钩子：行 row 即将被删除。"""
+
+    def _move_row(self, src: int, dst: int):
+        """子类钩子：行 src 的数据已移动到行 dst。"""
+
+    def _distances(self, queries: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """返回 (len(queries), n) 距离矩阵；rows 为候选行号（None 表示全部）。"""
+        if rows is None:
+            vecs = self._vectors[:self._size]
+            sq = self._sq_norms[:self._size]
+        else:
+            vecs = self._vectors[rows]
+            sq = self._sq_norms[rows]
+        dots = queries @ vecs.T
+        if self.metric == 'ip':
+            return -dots
+        q_sq = np.einsum('ij,ij->i', queries, queries)[:, None]
+        if self.metric == 'cosine':
+            denom = np.sqrt(q_sq) * np.sqrt(sq)[None, :]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                sims = np.where(denom > 0, dots / denom, 0.0)
+            return 1.0 - sims
+        d2 = q_sq - 2.0 * dots + sq[None, :]
+        np.maximum(d2, 0.0, out=d2)
+        return np.sqrt(d2)
+
+    @staticmethod
+    def _top_k_indices(dist: np.ndarray, top_k: int) -> np.ndarray:
+        n = dist.shape[0]
+        if top_k >= n:
+            return np.argsort(dist, kind='stable')
+        part = np.argpartition(dist, top_k - 1)[:top_k]
+        return part[np.argsort(dist[part], kind='stable')]
+
+    def _collect(self, dist: np.ndarray, top_k: int, rows: Optional[np.ndarray] = None) -> List[QueryResult]:
+        out = []
+        for j in self._top_k_indices(dist, top_k):
+            row = int(rows[j]) if rows is not None else int(j)
+            out.append((float(dist[j]), self._ids[row], self._metas[row]))
+        return out
+
+    def query(self, vector: List[float], top_k: int = 5) -> List[QueryResult]:
+        return self.query_batch([vector], top_k)[0]
+
+    def query_batch(self, vectors: Sequence[Sequence[float]], top_k: int = 5) -> List[List[QueryResult]]:
+        """一次矩阵乘法为多个查询向量打分，分别返回各自的 top-k。"""
+        if self._size == 0 or top_k <= 0:
+            return [[] for _ in range(len(vectors))]
+        queries = self._as_matrix(vectors)
+        dist = self._distances(queries)
+        return [self._collect(dist[i], top_k) for i in range(dist.shape[0])]
+
+    # ---- 持久化 ----
+
+    def _header(self) -> Dict[str, Any]:
+        return {
+            "format": INDEX_FORMAT,
+            "version": INDEX_FORMAT_VERSION,
+            "kind": type(self).__name__,
+            "metric": self.metric,
+            "dim": self._dim,
+            "count": self._size,
+            "dtype": "float32",
+        }
+
+    def _save_arrays(self, path: str):
+        vecs = self.vectors
+        _atomic_write(os.path.join(path, 'vectors.npy'), lambda f: np.save(f, np.ascontiguousarray(vecs)))
+        norms = self._sq_norms[:self._size] if self._sq_norms is not None else np.empty(0, dtype=np.float32)
+        _atomic_write(os.path.join(path, 'sq_norms.npy'), lambda f: np.save(f, np.ascontiguousarray(norms)))
+
+    def _restore(self, path: str, header: Dict[str, Any], mmap: bool):
+        mode = 'r' if mmap else None
+        count = header['count']
+        vecs = np.load(os.path.join(path, 'vectors.npy'), mmap_mode=mode)
+        norms = np.load(os.path.join(path, 'sq_norms.npy'), mmap_mode=mode)
+        if vecs.dtype != np.float32 or vecs.shape[0] != count or norms.shape[0] != count \
+                or (count and vecs.shape[1] != header['dim']):
+            raise StaleIndexError(f'index arrays at {path} do not match header')
+        self._vectors = vecs if count else None
+        self._sq_norms = norms if count else None
+        self._size = count
+
+    def save(self, path: str, extra: Optional[Dict[str, Any]] = None):
+        """保存到目录 path。extra 写入 header（例如 embedding 模型签名），加载时可用 expected 校验。
 
-    def query(self, vector: List[float], top_k: int = 5):
-        # 朴素的 L2 距离排序
-        import math
+        先写数据文件、最后原子替换 header；已映射旧文件的进程不受影响。
+        """
+        os.makedirs(path, exist_ok=True)
+        self._save_arrays(path)
+        meta = json.dumps({"ids": self._ids, "metadatas": self._metas}, ensure_ascii=False, separators=(',', ':'))
+        _atomic_write(os.path.join(path, 'meta.json'), lambda f: f.write(meta.encode('utf-8')))
+        header = {**self._header(), "extra": extra or {}}
+        _atomic_write(os.path.join(path, HEADER_FILE),
+                      lambda f: f.write(json.dumps(header, ensure_ascii=False, indent=2).encode('utf-8')))
 
-        def dist(a, b):
-            return math.sqrt(sum((x - y) ** 2 for x, y in zip(a, b)))
+    @classmethod
+    def load(cls, path: str, mmap: bool = True, expected: Optional[Dict[str, Any]] = None):
+        """从目录加载。mmap=True 时向量以只读内存映射打开（毫秒级启动）；
+        expected 中的键必须与保存时的 extra 一致，否则抛出 StaleIndexError。"""
+        header = read_index_header(path)
+        if header.get('kind') != cls.__name__:
+            raise StaleIndexError(f"index at {path} is a {header.get('kind')}, not {cls.__name__}")
+        stored = header.get('extra') or {}
+        for key, value in (expected or {}).items():
+            if stored.get(key) != value:
+                raise StaleIndexError(f'index {key}={stored.get(key)!r} does not match expected {value!r}')
+        store = cls(**cls._init_kwargs(header))
+        store._restore(path, header, mmap)
+        with open(os.path.join(path, 'meta.json'), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        store._ids = meta['ids']
+        store._metas = meta['metadatas']
+        if len(store._ids) != store._size:
+            raise StaleIndexError(f'index metadata at {path} does not match header count')
+        store._index = {_id: i for i, _id in enumerate(store._ids)}
+        return store
 
-        scored = [(dist(vector, v), _id, meta) for (_id, v, meta) in self.store]
-        scored.sort(key=lambda x: x[0])
-        return scored[:top_k]
+    @classmethod
+    def _init_kwargs(cls, header: Dict[str, Any]) -> Dict[str, Any]:
+        return {"metric": header['metric'], "dim": header['dim']}
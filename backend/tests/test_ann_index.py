@@ -0,0 +1,114 @@
+import numpy as np
+
+from app.services.ann_index import IVFVectorStore
+from app.services.vectorstore import InMemoryVectorStore
+
+
+def _clustered(n, dim, seed):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(20, dim))
+    return (centers[rng.integers(0, 20, size=n)] + 0.1 * rng.normal(size=(n, dim))).astype(np.float32)
+
+
+def test_untrained_index_is_exact_then_auto_trains():
+    data = _clustered(400, 8, 0)
+    ids = [str(i) for i in range(400)]
+    ivf = IVFVectorStore(nlist=8, nprobe=8, train_size=300)
+    ivf.upsert(data[:200].tolist(), [{}] * 200, ids[:200])
+    assert not ivf.is_trained
+    ivf.upsert(data[200:].tolist(), [{}] * 200, ids[200:])
+    assert ivf.is_trained
+
+    exact = InMemoryVectorStore()
+    exact.upsert(data.tolist(), [{}] * 400, ids)
+    q = data[7].tolist()
+    # nprobe == nlist：扫描全部簇，结果与精确检索一致
+    assert [r[1] for r in ivf.query(q, 5)] == [r[1] for r in exact.query(q, 5)]
+
+
+def test_recall_improves_with_nprobe_and_upsert_is_incremental():
+    data = _clustered(2000, 16, 1)
+    queries = _clustered(50, 16, 2)
+    ids = [str(i) for i in range(2000)]
+    exact = InMemoryVectorStore()
+    exact.upsert(data, [{}] * 2000, ids)
+    ivf = IVFVectorStore(nlist=32, train_size=10 ** 9)
+    ivf.upsert(data, [{}] * 2000, ids)
+    ivf.train()
+
+    def recall(nprobe):
+        hits = 0
+        for q in queries:
+            truth = {r[1] for r in exact.query(q, 10)}
+            hits += len(truth & {r[1] for r in ivf.query(q, 10, nprobe=nprobe)})
+        return hits / (10.0 * len(queries))
+
+    assert recall(32) == 1.0
+    assert recall(1) <= recall(8)
+
+    # 移动已有 id 到新位置，应在新位置被检索到
+    ivf.upsert([queries[0] + 100.0], [{'moved': True}], ['0'])
+    assert ivf.query((queries[0] + 100.0).tolist(), 1)[0][1] == '0'
+    assert len(ivf) == 2000
+
+
+def test_ivf_delete_keeps_inverted_lists_consistent():
+    data = _clustered(400, 8, 3)
+    ids = [str(i) for i in range(400)]
+    ivf = IVFVectorStore(nlist=8, nprobe=8, train_size=300)
+    ivf.upsert(data.tolist(), [{}] * 400, ids)
+    assert ivf.delete(ids[:100]) == 100
+    assert len(ivf) == 300
+    assert sorted(r for rows in ivf._lists for r in rows) == list(range(300))
+
+    exact = InMemoryVectorStore()
+    exact.upsert(data[100:].tolist(), [{}] * 300, ids[100:])
+    for i in (0, 150, 399):
+        q = data[i].tolist()
+        assert [r[1] for r in ivf.query(q, 5)] == [r[1] for r in exact.query(q, 5)]
+
+
+def test_ivf_persists_lists(tmp_path):
+    from app.services.vectorstore import load_vector_store
+
+    data = _clustered(500, 8, 3)
+    ivf = IVFVectorStore(nlist=8, nprobe=2, train_size=100)
+    ivf.upsert(data, [{}] * 500, [str(i) for i in range(500)])
+    ivf.save(str(tmp_path / 'ivf'))
+    loaded = load_vector_store(str(tmp_path / 'ivf'))
+    assert isinstance(loaded, IVFVectorStore) and loaded.is_trained
+    for q in data[:10]:
+        assert loaded.query(q, 5) == ivf.query(q, 5)
+
+
+def _assert_lists_consistent(ivf):
+    assert ivf._assign.dtype == np.int32
+    seen = []
+    for label, rows in enumerate(ivf._lists):
+        for p, row in enumerate(rows):
+            assert ivf._assign[row] == label and ivf._pos[row] == p
+        seen.extend(rows)
+    assert sorted(seen) == list(range(len(ivf)))
+
+
+def test_ivf_moves_and_deletes_keep_assignment_arrays_in_sync(tmp_path):
+    from app.services.vectorstore import load_vector_store
+
+    data = _clustered(600, 8, 5)
+    ids = [str(i) for i in range(600)]
+    ivf = IVFVectorStore(nlist=8, nprobe=8, train_size=200)
+    ivf.upsert(data[:400], [{}] * 400, ids[:400])
+    _assert_lists_consistent(ivf)
+
+    # 增量写入（触发数组扩容）、移动到其他簇、删除（交换删除）交替进行
+    ivf.upsert(data[400:], [{}] * 200, ids[400:])
+    ivf.upsert(data[300:350][::-1], [{}] * 50, ids[:50])
+    ivf.delete(ids[100:250:3] + ids[590:])
+    _assert_lists_consistent(ivf)
+
+    ivf.save(str(tmp_path / 'ivf'))
+    loaded = load_vector_store(str(tmp_path / 'ivf'))
+    _assert_lists_consistent(loaded)
+    loaded.delete(ids[:20])
+    loaded.upsert(data[:5], [{}] * 5, ['new%d' % i for i in range(5)])
+    _assert_lists_consistent(loaded)
@@ -0,0 +1,83 @@
+import glob
+import gzip
+import json
+
+from app.services.audit import AuditWriter
+
+
+def test_writer_batches_and_flushes(tmp_path):
+    path = str(tmp_path / 'audit.log')
+    writer = AuditWriter(path, flush_interval=60, flush_bytes=1 << 20)
+    for i in range(50):
+        assert writer.write(json.dumps({"i": i}) + '\n')
+    assert writer.flush(timeout=5)
+    with open(path, encoding='utf-8') as f:
+        assert [json.loads(line)["i"] for line in f] == list(range(50))
+    stats = writer.stats()
+    assert stats["written"] == 50 and stats["dropped"] == 0 and stats["queued"] == 0
+    writer.close()
+    assert not writer.write('late\n')
+    assert writer.stats()["dropped"] == 1
+
+
+def test_time_based_flush(tmp_path):
+    path = tmp_path / 'audit.log'
+    writer = AuditWriter(str(path), flush_interval=0.05, flush_bytes=1 << 20)
+    writer.write('{"a": 1}\n')
+    import time
+    deadline = time.time() + 5
+    while writer.stats()["written"] == 0 and time.time() < deadline:
+        time.sleep(0.01)
+    assert path.read_text(encoding='utf-8') == '{"a": 1}\n'
+    writer.close()
+
+
+def test_rotation_gzips_and_prunes(tmp_path):
+    path = str(tmp_path / 'audit.log')
+    writer = AuditWriter(path, flush_interval=60, flush_bytes=1, max_bytes=100, backup_count=2)
+    line = json.dumps({"pad": "x" * 40}) + '\n'
+    for _ in range(12):
+        writer.write(line)
+    writer.close()
+    rotated = sorted(glob.glob(path + '.*.gz'))
+    assert len(rotated) == 2
+    assert writer.stats()["rotations"] > 2
+    with gzip.open(rotated[-1], 'rt', encoding='utf-8') as f:
+        assert f.read().startswith(line)
+    total = writer.stats()["written"]
+    assert total == 12
+
+
+def test_queue_full_drops_instead_of_blocking(tmp_path):
+    writer = AuditWriter(str(tmp_path / 'audit.log'), max_queue=1, flush_interval=60, flush_bytes=1 << 20)
+    accepted = sum(writer.write('{}\n') for _ in range(1000))
+    writer.close()
+    stats = writer.stats()
+    assert stats["dropped"] == 1000 - accepted > 0
+    assert stats["written"] == accepted
+
+
+def test_write_racing_close_is_written_or_counted_as_dropped(tmp_path):
+    import threading
+    import time
+
+    path = tmp_path / 'audit.log'
+    writer = AuditWriter(str(path), flush_interval=60, flush_bytes=1 << 20)
+    real_put = writer._queue.put_nowait
+    closer = threading.Thread(target=writer.close)
+
+    def put_while_closing(item):
+        # 在 write 通过关闭检查之后、入队之前触发 close
+        closer.start()
+        deadline = time.time() + 0.2
+        while not (writer.closed and writer._queue.qsize()) and time.time() < deadline:
+            time.sleep(0.005)
+        real_put(item)
+
+    writer._queue.put_nowait = put_while_closing
+    accepted = writer.write('{"late": true}\n')
+    closer.join(5)
+    stats = writer.stats()
+    assert stats["written"] + stats["dropped"] == 1
+    assert stats["written"] == int(accepted)
+    assert path.read_text(encoding='utf-8') == ('{"late": true}\n' if accepted else '')
@@ -0,0 +1,53 @@
+import json
+import random
+
+from app.services.compliance import ComplianceScanner, check_compliance, load_terms
+
+
+def _naive(text, terms):
+    out = []
+    for cat, words in terms.items():
+        for w in words:
+            start = text.lower().find(w.lower())
+            while start != -1:
+                out.append((start, start + len(w), w, cat))
+                start = text.lower().find(w.lower(), start + 1)
+    return sorted(out)
+
+
+def test_scanner_matches_naive_search_with_overlaps():
+    terms = {"legal": ["诉讼", "诉讼方案", "起诉"], "promise": ["稳赚", "ABC", "bc"]}
+    scanner = ComplianceScanner(terms)
+    text = "建议起诉并准备诉讼方案，abc 稳赚"
+    assert scanner.scan(text) == _naive(text, terms)
+
+    rng = random.Random(0)
+    alphabet = "abcd"
+    many = {"x": list({''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 4))) for _ in range(200)})}
+    big = ComplianceScanner(many)
+    for _ in range(20):
+        text = ''.join(rng.choice(alphabet) for _ in range(60))
+        assert big.scan(text) == _naive(text, many)
+
+
+def test_check_compliance_scans_all_fields_with_positions():
+    result = {"overview": "可考虑仲裁", "recommendations": ["先协商"], "risks": ["对方可能起诉"], "confidence": 0.5}
+    out = check_compliance(result)
+    assert out["_needs_legal_review"] is True
+    assert out["_disclaimer"]
+    assert out["_compliance_matches"] == [
+        {"field": "overview", "start": 3, "end": 5, "term": "仲裁", "category": "legal"},
+        {"field": "risks[0]", "start": 4, "end": 6, "term": "起诉", "category": "legal"},
+    ]
+    clean = check_compliance({"overview": "状况良好", "recommendations": ["储蓄"], "risks": []})
+    assert clean["_needs_legal_review"] is False and clean["_compliance_matches"] == []
+
+
+def test_custom_dictionary_and_review_categories(tmp_path):
+    path = tmp_path / "terms.json"
+    path.write_text(json.dumps({"legal": ["破产"], "marketing": ["保本"]}, ensure_ascii=False), encoding="utf-8")
+    scanner = ComplianceScanner(load_terms(str(path)))
+    res = check_compliance({"overview": "保本理财", "recommendations": [], "risks": []}, scanner=scanner,
+                           review_categories=["legal"])
+    assert res["_needs_legal_review"] is False
+    assert [m["category"] for m in res["_compliance_matches"]] == ["marketing"]
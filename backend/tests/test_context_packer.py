@@ -0,0 +1,71 @@
+from app.models.financials import FinancialStatement
+from app.services.cfp_agent import CFPAgent
+from app.services.context_packer import ContextPacker, estimate_tokens, split_sentences, truncate_to_tokens
+
+
+def test_estimate_tokens_mixed_text():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("负债率") == 3
+    assert estimate_tokens("debt ratio") == 1 + 2
+    assert estimate_tokens("负债率 debt，3.5%") == 3 + 1 + 1 + 1 + 1 + 1 + 1
+
+
+def test_truncate_at_sentence_boundary():
+    text = "第一句话。第二句话！Third sentence. 第四句"
+    assert split_sentences(text)[:2] == ["第一句话。", "第二句话！"]
+    assert truncate_to_tokens(text, 12) == "第一句话。第二句话！"
+    assert truncate_to_tokens(text, 3) == ""
+
+
+def test_pack_dedupes_ranks_and_respects_budget():
+    a = "建议优先偿还高息负债，并建立应急基金。保持预算习惯。"
+    near_dup = "建议优先偿还高息负债，并建立应急基金。保持预算习惯！"
+    b = "浮动利率贷款在加息周期中风险较高。可考虑转为固定利率。" * 10
+    c = "无关片段。"
+
+    packer = ContextPacker(budget_tokens=0)
+    assert packer.pack([a, near_dup, b, a]) == [a, b]
+    assert packer.pack([c, a], scores=[0.1, 0.9]) == [a, c]
+
+    packer = ContextPacker(budget_tokens=estimate_tokens(a) + 60, min_fragment_tokens=10)
+    packed = packer.pack([a, b, c])
+    assert packed[0] == a
+    assert len(packed) == 2 and b.startswith(packed[1]) and packed[1].endswith("。")
+    total = sum(estimate_tokens(d) for d in packed) + estimate_tokens(packer.separator)
+    assert total <= packer.budget_tokens
+
+
+class RecordingClient:
+    base_url = "stub"
+
+    def __init__(self):
+        self.calls = []
+
+    async def async_generate(self, prompt, max_tokens=512):
+        self.calls.append((prompt, max_tokens))
+        return '{"overview": "ok", "recommendations": [], "risks": [], "confidence": 0.5}'
+
+
+class ListRetriever:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def get(self, query, top_k=5):
+        return self.docs[:top_k]
+
+
+def test_agent_prompt_uses_packer_and_output_budget():
+    import asyncio
+    long_doc = "债务重组与利率优化最佳实践。" * 200
+    client = RecordingClient()
+    agent = CFPAgent(model_client=client, retriever=ListRetriever([long_doc, long_doc]),
+                     local_tier=False, context_packer=ContextPacker(budget_tokens=100),
+                     max_output_tokens=256)
+    fs = FinancialStatement(assets=100000, liabilities=50000, income=10000, expenses=8000)
+    result = asyncio.run(agent.analyze_async(fs, use_cache=False))
+    assert result["overview"] == "ok"
+    prompt, max_tokens = client.calls[0]
+    assert max_tokens == 256
+    context = prompt.split("CONTEXT: ", 1)[1].split("\nTASK:", 1)[0]
+    assert "---" not in context
+    assert estimate_tokens(context) <= 100
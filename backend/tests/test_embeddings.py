@@ -0,0 +1,42 @@
+import pickle
+
+import numpy as np
+
+from app.services.embeddings import CachedEmbedder, EmbeddingCache, HashingEmbedder
+
+
+DOCS = ["优先偿还高息负债，降低负债率", "建立应急基金，合理分配预算", "消费者债务相关法律条款"]
+
+
+def test_embeddings_are_deterministic_and_normalized():
+    a = HashingEmbedder(dim=64).embed(DOCS)
+    b = pickle.loads(pickle.dumps(HashingEmbedder(dim=64))).embed(DOCS)
+    assert a.shape == (3, 64) and a.dtype == np.float32
+    assert np.allclose(a, b)
+    assert np.allclose(np.linalg.norm(a, axis=1), 1.0, atol=1e-5)
+    assert not np.allclose(a[0], a[1])
+
+
+def test_similar_text_scores_higher():
+    emb = HashingEmbedder().fit(DOCS)
+    vecs = emb.embed(DOCS)
+    q = emb.embed(["负债率太高怎么办"])[0]
+    assert int(np.argmax(vecs @ q)) == 0
+    assert 'idf=none' not in emb.signature()
+
+
+def test_cached_embedder_skips_known_chunks(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / 'emb.db'))
+    cached = CachedEmbedder(HashingEmbedder(dim=32), cache)
+    first = cached.embed(DOCS)
+    assert cached.misses == 3 and len(cache) == 3
+
+    again = CachedEmbedder(HashingEmbedder(dim=32), EmbeddingCache(str(tmp_path / 'emb.db')))
+    second = again.embed(DOCS + ["新的片段"])
+    assert again.hits == 3 and again.misses == 1
+    assert np.allclose(first, second[:3])
+
+    # 参数不同的 embedder 使用不同的缓存键
+    other = CachedEmbedder(HashingEmbedder(dim=32, seed=1), cache)
+    other.embed(DOCS[:1])
+    assert other.misses == 1
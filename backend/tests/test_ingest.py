@@ -0,0 +1,122 @@
+import os
+
+from app.services.ingest import clean_text, run_pipeline, simple_chunk
+from app.services.vectorstore import InMemoryVectorStore
+
+
+def _write_corpus(root, n):
+    os.makedirs(root, exist_ok=True)
+    for i in range(n):
+        with open(os.path.join(root, f'doc{i}.txt'), 'w', encoding='utf-8') as f:
+            f.write(f'第{i}篇法规。' * 50)
+
+
+def test_clean_and_chunk():
+    assert clean_text('a　　b\r\n\n\n\nc\x07') == 'a b\n\nc'
+    chunks = simple_chunk('一句话。' * 100, max_len=50)
+    assert len(chunks) > 1 and all(len(c) <= 60 for c in chunks)
+
+
+def test_pipeline_ingests_and_resumes(tmp_path):
+    corpus = str(tmp_path / 'corpus')
+    _write_corpus(corpus, 5)
+    checkpoint = str(tmp_path / 'ckpt.json')
+    store = InMemoryVectorStore()
+    saved = []
+
+    stats = run_pipeline([corpus], store, checkpoint_path=checkpoint, batch_docs=2, upsert_batch=3,
+                         checkpoint_every=2, on_checkpoint=lambda s: saved.append(len(s)))
+    assert stats['docs'] == 5 and stats['skipped'] == 0
+    assert len(store) == stats['chunks'] > 0
+    assert saved[-1] == len(store)
+    assert stats['chunks_per_s'] > 0
+
+    # 未修改的文档在重跑时被跳过；新增文档只处理增量
+    with open(os.path.join(corpus, 'new.txt'), 'w', encoding='utf-8') as f:
+        f.write('新增法规条款。')
+    again = run_pipeline([corpus], store, checkpoint_path=checkpoint)
+    assert again['docs'] == 1 and again['skipped'] == 5
+    assert store.query(store.vectors[0], top_k=1)
+
+
+def test_reingesting_shortened_document_drops_stale_chunks(tmp_path):
+    corpus = str(tmp_path / 'corpus')
+    os.makedirs(corpus)
+    path = os.path.join(corpus, 'law.txt')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('旧版条款内容。' * 200)
+    checkpoint = str(tmp_path / 'ckpt.json')
+    store = InMemoryVectorStore()
+    first = run_pipeline([corpus], store, checkpoint_path=checkpoint, max_len=100)
+    assert first['chunks'] > 3
+
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('新版条款。' * 10)
+    again = run_pipeline([corpus], store, checkpoint_path=checkpoint, max_len=100)
+    assert again['docs'] == 1 and again['chunks'] == 1
+    assert len(store) == 1
+    assert all(meta['text'].startswith('新版') for _, _, meta in store.store)
+
+
+def test_cli_fits_idf_and_persists_it_with_the_index(tmp_path):
+    import subprocess
+    import sys
+
+    from app.services.embeddings import HashingEmbedder
+    from app.services.ingest import sample_chunks
+    from app.services.vectorstore import load_vector_store
+
+    corpus = str(tmp_path / 'corpus')
+    _write_corpus(corpus, 4)
+    assert len(sample_chunks([corpus], 3, max_len=100)) == 3
+
+    out = str(tmp_path / 'index')
+    tool = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'tools', 'ingest_pipeline.py')
+    cmd = [sys.executable, tool, corpus, '--out', out, '--workers', '1', '--dim', '32', '--idf-sample', '50']
+    subprocess.run(cmd, check=True, capture_output=True)
+
+    embedder = HashingEmbedder.load(os.path.join(out, 'embedder.npz'))
+    assert embedder.idf is not None
+    # 索引 header 记录的是拟合后的 signature，查询端加载同一文件即可匹配
+    store = load_vector_store(out, mmap=False, expected={'embedder': embedder.signature()})
+    assert len(store) > 0
+
+    again = subprocess.run(cmd, check=True, capture_output=True, text=True)
+    assert 'resuming' in again.stdout
+    assert HashingEmbedder.load(os.path.join(out, 'embedder.npz')).signature() == embedder.signature()
+
+
+def test_interrupted_parallel_ingest_resumes_to_same_index_as_serial(tmp_path):
+    import numpy as np
+
+    corpus = str(tmp_path / 'corpus')
+    _write_corpus(corpus, 7)
+
+    serial = InMemoryVectorStore()
+    expected = run_pipeline([corpus], serial, workers=1, max_len=100, checkpoint_path=str(tmp_path / 'serial.json'))
+
+    class Interrupted(Exception):
+        pass
+
+    def stop_after_four(stats):
+        if stats['docs'] >= 4:
+            raise Interrupted()
+
+    checkpoint = str(tmp_path / 'parallel.json')
+    parallel = InMemoryVectorStore()
+    try:
+        run_pipeline([corpus], parallel, workers=2, batch_docs=1, max_len=100, checkpoint_path=checkpoint,
+                     checkpoint_every=2, progress=stop_after_four)
+        raise AssertionError('pipeline should have been interrupted')
+    except Interrupted:
+        pass
+    resumed = run_pipeline([corpus], parallel, workers=2, batch_docs=1, max_len=100, checkpoint_path=checkpoint)
+    assert resumed['skipped'] > 0
+
+    assert len(parallel) == len(serial) == expected['chunks']
+    want = {_id: (vec, meta) for _id, vec, meta in serial.store}
+    got = {_id: (vec, meta) for _id, vec, meta in parallel.store}
+    assert sorted(got) == sorted(want)
+    for _id, (vec, meta) in want.items():
+        assert got[_id][1] == meta
+        assert np.allclose(got[_id][0], vec)
@@ -0,0 +1,83 @@
+import asyncio
+import multiprocessing
+import sqlite3
+import time
+
+from app.services.job_store import InMemoryJobStore, SQLiteJobStore, call_job_store
+
+
+def test_memory_store_ttl_and_size_eviction():
+    store = InMemoryJobStore(max_size=2, ttl=60)
+    store.create('a', {"status": "queued", "result": None})
+    store.create('b', {"status": "queued", "result": None})
+    assert store.update('a', status='running')  # 'a' 变为最近更新
+    store.create('c', {"status": "queued", "result": None})
+    assert store.get('b') is None
+    assert store.get('a') == {"status": "running", "result": None}
+    assert len(store) == 2
+    assert not store.update('missing', status='done')
+
+    expired = InMemoryJobStore(ttl=-1)
+    expired.create('a', {"status": "queued"})
+    assert expired.get('a') is None
+    expired.compact()
+    assert len(expired) == 0
+
+
+def test_memory_store_returns_copies():
+    store = InMemoryJobStore()
+    store.create('a', {"status": "done", "result": {"x": [1]}})
+    store.get('a')["result"]["x"].append(2)
+    assert store.get('a')["result"] == {"x": [1]}
+
+
+def _update_from_other_process(path, job_id):
+    SQLiteJobStore(path).update(job_id, status="done", result={"overview": "中文"})
+
+
+def test_sqlite_store_shared_across_processes(tmp_path):
+    path = str(tmp_path / 'jobs.db')
+    store = SQLiteJobStore(path)
+    store.create('job-1', {"status": "queued", "result": None})
+    proc = multiprocessing.get_context('spawn').Process(target=_update_from_other_process, args=(path, 'job-1'))
+    proc.start()
+    proc.join(30)
+    assert proc.exitcode == 0
+    assert store.get('job-1') == {"status": "done", "result": {"overview": "中文"}}
+
+
+def test_sqlite_store_compaction(tmp_path):
+    store = SQLiteJobStore(str(tmp_path / 'jobs.db'), ttl=60, max_rows=3, compact_interval=3600)
+    for i in range(5):
+        store.create(f'job-{i}', {"status": "queued"})
+    assert len(store) == 5  # 距上次清理不足 compact_interval，尚未裁剪
+    store.compact()
+    assert len(store) == 3
+    assert store.get('job-0') is None and store.get('job-4') is not None
+
+    expired = SQLiteJobStore(str(tmp_path / 'expired.db'), ttl=-1)
+    expired.create('a', {"status": "queued"})
+    assert expired.get('a') is None
+    assert not expired.update('a', status='running')
+
+
+def test_sqlite_store_calls_do_not_block_event_loop(tmp_path):
+    path = str(tmp_path / 'jobs.db')
+    store = SQLiteJobStore(path)
+    store.create('job-1', {"status": "queued"})
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute('BEGIN IMMEDIATE')  # 模拟另一个 worker 持有写锁
+
+    async def run():
+        update = asyncio.ensure_future(call_job_store(store, 'update', 'job-1', status='running'))
+        started = time.monotonic()
+        await asyncio.sleep(0.05)
+        # 等待写锁期间事件循环仍可调度其他协程
+        assert time.monotonic() - started < 0.5
+        assert not update.done()
+        other.execute('COMMIT')
+        return await update
+
+    assert asyncio.run(run()) is True
+    assert store.get('job-1')["status"] == 'running'
+    other.close()
@@ -0,0 +1,62 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.core.loop_runner import LoopRunner, get_loop_runner
+from app.models.financials import FinancialStatement
+from app.services import model_clients
+from app.services.cfp_agent import CFPAgent
+
+
+def test_runner_reuses_one_loop_with_shared_pool():
+    runner = LoopRunner(name='test-runner')
+
+    async def probe():
+        return asyncio.get_running_loop(), threading.current_thread().name, model_clients.get_shared_async_client()
+
+    try:
+        loop1, thread_name, pool = runner.run(probe())
+        loop2, _, pool2 = runner.run(probe())
+        assert loop1 is loop2 is runner.loop
+        assert thread_name == 'test-runner'
+        assert pool is not None and pool is pool2
+
+        async def nested():
+            return runner.run(probe())
+
+        with pytest.raises(RuntimeError):
+            runner.run(nested())
+        with pytest.raises(ZeroDivisionError):
+            runner.run(_raise())
+    finally:
+        runner.close()
+    assert pool.is_closed
+    assert runner.loop is None
+
+
+async def _raise():
+    raise ZeroDivisionError()
+
+
+class LoopRecordingClient:
+    base_url = "stub"
+
+    def __init__(self):
+        self.loops = []
+
+    async def async_generate(self, prompt, max_tokens=512):
+        self.loops.append(asyncio.get_running_loop())
+        return '{"overview": "ok", "recommendations": ["a"], "risks": [], "confidence": 0.6}'
+
+
+def test_sync_analyze_runs_async_pipeline_on_background_loop():
+    client = LoopRecordingClient()
+    agent = CFPAgent(model_client=client, local_tier=False)
+    fs = FinancialStatement(assets=100000, liabilities=50000, income=10000, expenses=8000)
+    first = agent.analyze(fs, use_cache=False)
+    second = agent.analyze(fs, use_cache=False)
+    assert first["overview"] == second["overview"] == "ok"
+    # 同步入口与异步入口走同一条流水线（含合规检查）
+    assert "_disclaimer" in first
+    assert client.loops[0] is client.loops[1] is get_loop_runner().loop
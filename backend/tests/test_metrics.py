@@ -0,0 +1,90 @@
+import asyncio
+import time
+
+from fastapi.testclient import TestClient
+
+from app.core.metrics import (
+    CACHE_LOOKUPS, HTTP_REQUEST_SECONDS, HTTP_RESPONSE_SECONDS, STAGE_SECONDS, Counter, Histogram,
+    HTTPMetricsMiddleware, timed,
+)
+from app.main import app
+from app.models.financials import FinancialStatement
+from app.services.cfp_agent import CFPAgent
+from app.services.result_cache import InMemoryResultCache
+
+
+def test_histogram_buckets_are_cumulative():
+    h = Histogram('t_seconds', 'test', ('stage',), buckets=(0.1, 1.0))
+    for v in (0.05, 0.5, 5.0):
+        h.observe(v, stage='x')
+    lines = h.render()
+    assert 't_seconds_bucket{stage="x",le="0.1"} 1' in lines
+    assert 't_seconds_bucket{stage="x",le="1"} 2' in lines
+    assert 't_seconds_bucket{stage="x",le="+Inf"} 3' in lines
+    assert 't_seconds_count{stage="x"} 3' in lines
+
+    c = Counter('t_total', 'test', ('kind',))
+    c.inc(kind='a')
+    c.inc(2, kind='a')
+    assert c.value(kind='a') == 3
+    assert 't_total{kind="a"} 3' in c.render()
+
+    with timed(h, stage='y'):
+        pass
+    assert h.count(stage='y') == 1
+
+
+class JsonClient:
+    base_url = "stub"
+
+    async def async_generate(self, prompt, max_tokens=512):
+        return '{"overview": "ok", "recommendations": [], "risks": [], "confidence": 0.5}'
+
+
+def test_pipeline_stages_and_metrics_endpoint():
+    before = {s: STAGE_SECONDS.count(stage=s) for s in ("retrieval", "prompt", "model", "parse", "compliance", "audit")}
+    hits = CACHE_LOOKUPS.value(result="hit")
+    agent = CFPAgent(model_client=JsonClient(), cache=InMemoryResultCache(), local_tier=False)
+    fs = FinancialStatement(assets=100, liabilities=50, income=10, expenses=9)
+    asyncio.run(agent.analyze_async(fs))
+    asyncio.run(agent.analyze_async(fs))
+    for stage, n in before.items():
+        assert STAGE_SECONDS.count(stage=stage) > n, stage
+    assert CACHE_LOOKUPS.value(result="hit") == hits + 1
+
+    client = TestClient(app)
+    client.get('/')
+    r = client.get('/metrics')
+    assert r.status_code == 200
+    assert r.headers['content-type'].startswith('text/plain')
+    assert 'cfp_stage_seconds_bucket{stage="model",le="+Inf"}' in r.text
+    assert 'http_request_seconds_count{method="GET",route="/",status="200"}' in r.text
+
+
+def test_http_middleware_times_response_start_and_last_body_chunk():
+    class Route:
+        path = "/t/stream"
+
+    async def streaming_app(scope, receive, send):
+        scope["route"] = Route()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"a", "more_body": True})
+        await asyncio.sleep(0.05)
+        await send({"type": "http.response.body", "body": b"b", "more_body": False})
+
+    sent = []
+
+    async def send(message):
+        sent.append((message["type"], time.perf_counter()))
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    labels = dict(method="GET", route="/t/stream", status="200")
+    asyncio.run(HTTPMetricsMiddleware(streaming_app)({"type": "http", "method": "GET"}, receive, send))
+    assert len(sent) == 3
+    assert HTTP_REQUEST_SECONDS.count(**labels) == 1
+    assert HTTP_RESPONSE_SECONDS.count(**labels) == 1
+    first = HTTP_REQUEST_SECONDS._values[HTTP_REQUEST_SECONDS._key(labels)][1]
+    total = HTTP_RESPONSE_SECONDS._values[HTTP_RESPONSE_SECONDS._key(labels)][1]
+    assert first < 0.05 <= total
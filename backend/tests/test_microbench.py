@@ -0,0 +1,29 @@
+from tools.microbench import BENCHMARKS, compare, measure, run_suite
+
+
+def test_compare_flags_only_regressions_beyond_threshold_and_noise():
+    baseline = {
+        "a[1]": {"median": 1.0, "iqr": 0.05},
+        "b[1]": {"median": 1.0, "iqr": 0.05},
+        "c[1]": {"median": 1.0, "iqr": 0.5},
+    }
+    results = {
+        "a[1]": {"median": 1.5},   # 回退
+        "b[1]": {"median": 1.1},   # 阈值内
+        "c[1]": {"median": 1.4},   # 超阈值但在基线噪声内
+        "d[1]": {"median": 9.0},   # 基线中没有
+    }
+    regressions = compare(results, baseline, threshold_pct=25)
+    assert [r[0] for r in regressions] == ["a[1]"]
+    assert round(regressions[0][3]) == 50
+
+
+def test_every_benchmark_runs_at_smallest_size():
+    sizes = {name: (spec[1][0],) for name, spec in BENCHMARKS.items()}
+    results = run_suite(repeats=1, warmup=0, min_time=0.0, sizes_override=sizes)
+    assert len(results) == len(BENCHMARKS)
+    for r in results.values():
+        assert r["median"] > 0 and r["per_unit_ns"] > 0
+
+    stats = measure(lambda: None, repeats=3, warmup=1, min_time=0.001)
+    assert stats["q1"] <= stats["median"] <= stats["q3"]
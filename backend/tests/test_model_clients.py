@@ -0,0 +1,106 @@
+import asyncio
+import json
+
+import httpx
+
+from app.services import model_clients
+from app.services.model_clients import GeminiClientAsync
+
+
+def test_async_client_reuses_injected_pool():
+    calls = []
+
+    def handler(request):
+        calls.append(json.loads(request.content))
+        return httpx.Response(200, json={"text": "ok"})
+
+    async def run():
+        pool = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        client = GeminiClientAsync(api_key='k', base_url='http://stub', http_client=pool)
+        first = await client.async_generate('p1')
+        second = await client.async_generate('p2')
+        # 注入的连接池由调用方管理，调用结束后不应被关闭
+        assert not pool.is_closed
+        await pool.aclose()
+        return first, second
+
+    assert asyncio.run(run()) == ('ok', 'ok')
+    assert [c['prompt'] for c in calls] == ['p1', 'p2']
+
+
+def test_shared_pool_bound_to_its_loop(monkeypatch):
+    monkeypatch.setenv('GEMINI_ENABLED', 'true')
+    monkeypatch.setenv('GEMINI_API_KEY', 'k')
+
+    async def run():
+        shared = await model_clients.init_shared_async_client()
+        try:
+            client = model_clients.create_gemini_client_from_env()
+            assert client.http_client is shared
+        finally:
+            await model_clients.close_shared_async_client()
+        assert shared.is_closed
+        assert model_clients.get_shared_async_client() is None
+
+    asyncio.run(run())
+    # 事件循环之外不会拿到共享连接池
+    assert model_clients.create_gemini_client_from_env().http_client is None
+
+
+def _streaming(handler, base_url):
+    pool = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return pool, GeminiClientAsync(api_key='k', base_url=base_url, http_client=pool)
+
+
+def test_stream_records_first_chunk_latency_in_breaker_and_timeout():
+    from app.services.resilience import get_adaptive_timeout, get_circuit_breaker, reset_resilience
+
+    reset_resilience()
+    base = 'http://stream-ok'
+
+    def handler(request):
+        return httpx.Response(200, text='data: {"a":\n\ndata: 1}\ndata: [DONE]\n')
+
+    async def run():
+        pool, client = _streaming(handler, base)
+        async with pool:
+            return [c async for c in client.async_stream_generate('p')]
+
+    assert asyncio.run(run()) == ['{"a":', '1}']
+    assert len(get_adaptive_timeout(f'{base}#first_chunk', 30.0)._latencies) == 1
+    assert list(get_circuit_breaker(base)._window) == [False]
+    reset_resilience()
+
+
+def test_stream_first_chunk_bounded_by_adaptive_timeout():
+    import time
+
+    from app.services.resilience import get_adaptive_timeout, get_circuit_breaker, reset_resilience
+
+    reset_resilience()
+    base = 'http://stream-slow'
+    # 历史首 chunk 延迟很低：自适应超时收紧到下限
+    timeouts = get_adaptive_timeout(f'{base}#first_chunk', 30.0)
+    timeouts.floor, timeouts.min_samples = 0.05, 1
+    timeouts.observe(0.001)
+
+    async def slow_body():
+        await asyncio.sleep(1.0)
+        yield b'data: late\n'
+
+    def handler(request):
+        return httpx.Response(200, content=slow_body())
+
+    async def run():
+        pool, client = _streaming(handler, base)
+        async with pool:
+            t0 = time.perf_counter()
+            try:
+                [c async for c in client.async_stream_generate('p')]
+            except TimeoutError:
+                return time.perf_counter() - t0
+        raise AssertionError('expected first-chunk timeout')
+
+    assert asyncio.run(run()) < 0.5
+    assert list(get_circuit_breaker(base)._window) == [True]
+    reset_resilience()
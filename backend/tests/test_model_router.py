@@ -0,0 +1,139 @@
+import asyncio
+import time
+
+import pytest
+
+from app.services.model_clients import GeminiClientAsync, create_gemini_client_from_env
+from app.services.model_router import ModelRouter, ProviderStats
+
+
+class SleepyClient:
+    def __init__(self, delay, text, fail=False):
+        self.delay = delay
+        self.text = text
+        self.fail = fail
+        self.calls = 0
+        self.cancelled = 0
+
+    async def async_generate(self, prompt, max_tokens=512):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.fail:
+            raise RuntimeError("provider down")
+        return self.text
+
+
+def test_stats_ewma_p95_and_error_rate():
+    stats = ProviderStats(alpha=0.5, window=100)
+    for i in range(1, 101):
+        stats.record(i / 100, ok=i % 10 != 0)
+    # 失败只计入错误率，不计入延迟样本
+    assert stats.samples == 90
+    assert stats.percentile(0.95) == 0.95
+    assert abs(stats.error_rate() - 0.1) < 1e-9
+    stats.record(5.0, ok=None)
+    assert stats.outcomes == 100 and stats.ewma > 2.0
+
+
+def test_routes_to_fastest_and_fails_over():
+    fast, slow = SleepyClient(0.0, "fast"), SleepyClient(0.01, "slow")
+    stats = {}
+    router = ModelRouter([slow, fast], names=["slow", "fast"], hedge=False, stats=stats)
+    stats["slow"] = ProviderStats()
+    stats["slow"].record(0.5)
+    stats["fast"] = ProviderStats()
+    stats["fast"].record(0.01)
+    assert [n for n, _ in router.ranked()] == ["fast", "slow"]
+    assert asyncio.run(router.async_generate("p")) == "fast"
+
+    fast.fail = True
+    assert asyncio.run(router.async_generate("p")) == "slow"
+    assert stats["fast"].error_rate() > 0
+
+
+
+def test_fast_failing_provider_does_not_outrank_slower_healthy_one():
+    broken, healthy = SleepyClient(0.0, "broken", fail=True), SleepyClient(0.02, "healthy")
+    stats = {}
+    router = ModelRouter([broken, healthy], names=["broken", "healthy"], hedge=False, stats=stats)
+    for _ in range(3):
+        assert asyncio.run(router.async_generate("p")) == "healthy"
+    # 错误率门槛（至少 5 个结果）尚未生效，排序只能靠延迟统计
+    assert stats["broken"].outcomes < 5
+    assert stats["broken"].ewma is None
+    assert [n for n, _ in router.ranked()] == ["healthy", "broken"]
+    assert broken.calls == 1
+
+
+def test_hedge_fires_after_p95_and_cancels_loser():
+    stuck, backup = SleepyClient(5.0, "stuck"), SleepyClient(0.0, "backup")
+    stats = {"stuck": ProviderStats(), "backup": ProviderStats()}
+    for _ in range(20):
+        stats["stuck"].record(0.02)
+    stats["backup"].record(0.1)
+    router = ModelRouter([stuck, backup], names=["stuck", "backup"], min_samples=20,
+                         hedge_min_delay=0.0, stats=stats)
+
+    async def run():
+        started = asyncio.get_running_loop().time()
+        out = await router.async_generate("p")
+        await asyncio.sleep(0)
+        return out, asyncio.get_running_loop().time() - started
+
+    out, elapsed = asyncio.run(run())
+    assert out == "backup"
+    assert elapsed < 1.0
+    assert stuck.cancelled == 1 and backup.calls == 1
+    # 被取消的主请求以已耗时记录，延迟统计变差
+    assert stats["stuck"].samples == 21
+
+
+class SlowFailingSyncClient:
+    def __init__(self, delay):
+        self.delay = delay
+        self.calls = 0
+
+    def generate(self, prompt, max_tokens=512):
+        self.calls += 1
+        time.sleep(self.delay)
+        raise RuntimeError("provider down")
+
+
+def test_router_stops_failing_over_after_total_deadline():
+    clients = [SlowFailingSyncClient(0.05) for _ in range(4)]
+    router = ModelRouter(clients, names=["a", "b", "c", "d"], hedge=False, deadline=0.08, stats={})
+    started = time.monotonic()
+    with pytest.raises(RuntimeError):
+        router.generate("p")
+    assert time.monotonic() - started < 0.15
+    assert sum(c.calls for c in clients) == 2
+
+    stuck = [SleepyClient(5.0, "stuck") for _ in range(3)]
+    router = ModelRouter(stuck, names=["x", "y", "z"], hedge_delay=0.02, deadline=0.1, stats={})
+
+    async def run():
+        started = time.monotonic()
+        with pytest.raises(TimeoutError):
+            await router.async_generate("p")
+        await asyncio.sleep(0)
+        return time.monotonic() - started
+
+    assert asyncio.run(run()) < 1.0
+    # 对冲了一次，截止时间到达后两个请求都被取消
+    assert sum(c.calls for c in stuck) == 2
+    assert sum(c.cancelled for c in stuck) == 2
+
+
+def test_env_comma_separated_base_urls_build_router(monkeypatch):
+    monkeypatch.setenv("GEMINI_ENABLED", "true")
+    monkeypatch.setenv("GEMINI_API_KEY", "k")
+    monkeypatch.setenv("GEMINI_BASE_URL", "http://a.example, http://b.example")
+    client = create_gemini_client_from_env()
+    assert isinstance(client, ModelRouter)
+    assert [n for n, _ in client.providers] == ["http://a.example", "http://b.example"]
+    monkeypatch.setenv("GEMINI_BASE_URL", "http://a.example")
+    assert isinstance(create_gemini_client_from_env(), GeminiClientAsync)
@@ -0,0 +1,74 @@
+import asyncio
+import json
+
+from fastapi.testclient import TestClient
+
+import app.api.reports as reports
+from app.main import app
+from app.services.hybrid_retriever import HybridRetriever
+from app.services.retriever import BM25Retriever, InMemoryRetriever
+from app.services.vectorstore import InMemoryVectorStore
+
+client = TestClient(app)
+
+
+class ConcurrencyClient:
+    """记录同时进行的模型调用数；overview 回显 prompt 中的资产金额，用于核对顺序。"""
+
+    base_url = "stub"
+
+    def __init__(self):
+        self.active = 0
+        self.peak = 0
+
+    async def async_generate(self, prompt, max_tokens=512):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(0.01)
+        self.active -= 1
+        assets = prompt.split("assets=")[1].split(",")[0]
+        if assets == "13":
+            return "not json"
+        return json.dumps({"overview": assets, "recommendations": ["a"], "risks": [], "confidence": 0.5})
+
+
+def _items(n):
+    return [{"assets": 10 + i, "liabilities": 1, "income": 1, "expenses": 1} for i in range(n)]
+
+
+def test_batch_preserves_order_and_caps_concurrency(monkeypatch):
+    model = ConcurrencyClient()
+    monkeypatch.setattr(reports, "create_gemini_client_from_env", lambda *a, **k: model)
+    monkeypatch.setenv("REPORT_BATCH_CONCURRENCY", "3")
+
+    r = client.post('/api/v1/reports/batch?no_cache=true', json=_items(10))
+    assert r.status_code == 200
+    results = r.json()["results"]
+    assert [x["index"] for x in results] == list(range(10))
+    assert results[0]["analysis"]["overview"] == "10"
+    assert results[3]["analysis"]["confidence"] == 0.0  # 非法 JSON 的条目单独降级
+    assert 1 < model.peak <= 3
+
+
+def test_batch_stream_and_limits(monkeypatch):
+    monkeypatch.setattr(reports, "create_gemini_client_from_env", lambda *a, **k: ConcurrencyClient())
+    monkeypatch.setenv("REPORT_BATCH_MAX_ITEMS", "5")
+
+    r = client.post('/api/v1/reports/batch?stream=true&no_cache=true', json=_items(5))
+    lines = [json.loads(line) for line in r.text.splitlines()]
+    assert sorted(x["index"] for x in lines) == list(range(5))
+    assert client.post('/api/v1/reports/batch', json=_items(6)).status_code == 413
+    assert client.post('/api/v1/reports/batch', json=[]).status_code == 400
+
+
+def test_get_batch_matches_single_queries():
+    docs = ["债务重组与利率优化", "建立应急基金的方法", "信用卡分期的真实利率"]
+    lexical = InMemoryRetriever(docs=docs)
+    assert lexical.get_batch(["应急基金", "无关 query"], top_k=2) == [lexical.get("应急基金", 2), docs[:2]]
+
+    store = InMemoryVectorStore(metric='cosine')
+    embed = lambda texts: [[float(t.count(c)) for c in "债基利卡"] for t in texts]
+    store.upsert(embed(docs), [{"text": d} for d in docs], [f"d{i}" for i in range(len(docs))])
+    hybrid = HybridRetriever(BM25Retriever(docs), store, embed)
+    queries = ["利率", "应急基金", "利率"]
+    assert hybrid.get_batch(queries, top_k=2) == [hybrid.get(q, 2) for q in queries]
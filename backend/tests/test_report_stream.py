@@ -0,0 +1,89 @@
+import asyncio
+import json
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.models.financials import FinancialStatement
+from app.services.cfp_agent import CFPAgent
+from app.services.result_cache import InMemoryResultCache
+from app.services.retriever import InMemoryRetriever
+from app.services.stream_parser import StreamJSONBuilder
+
+client = TestClient(app)
+
+FS = {"assets": 100000, "liabilities": 20000, "income": 10000, "expenses": 5000}
+DOC = json.dumps({
+    "overview": "负债率较低，\"财务\"状况稳健",
+    "recommendations": ["建立应急基金", "考虑提前还款"],
+    "risks": ["收入波动"],
+    "confidence": 0.8,
+}, ensure_ascii=False)
+
+
+class StreamingClient:
+    def __init__(self, text=DOC, size=5):
+        self.text = text
+        self.size = size
+        self.base_url = "stub"
+
+    async def async_stream_generate(self, prompt, max_tokens=512):
+        for i in range(0, len(self.text), self.size):
+            yield self.text[i:i + self.size]
+
+    async def async_generate(self, prompt, max_tokens=512):
+        return self.text
+
+
+def test_builder_tracks_fields_across_chunks():
+    doc = json.dumps({"overview": "a\\\"b", "meta": {"k": "v"}, "recommendations": ["x,y", {"z": "w"}, "q"],
+                      "confidence": 0.5})
+    for size in (1, 4, len(doc)):
+        b = StreamJSONBuilder(track_fields=True)
+        fields, obj = [], None
+        for i in range(0, len(doc), size):
+            obj = b.feed(doc[i:i + size]) or obj
+            fields += b.drain_fields()
+        assert obj is not None
+        assert fields == [(("overview",), 'a\\"b'), (("recommendations", 0), "x,y"), (("recommendations", 2), "q")]
+
+
+def test_events_precede_validated_result():
+    agent = CFPAgent(model_client=StreamingClient(), retriever=InMemoryRetriever(docs=["doc"]),
+                     cache=InMemoryResultCache())
+
+    async def _collect():
+        return [e async for e in agent.analyze_events_async(FinancialStatement(**FS))]
+
+    events = asyncio.run(_collect())
+    assert [e["event"] for e in events] == ["overview", "recommendation", "recommendation", "risk", "result"]
+    assert events[0]["data"] == "负债率较低，\"财务\"状况稳健"
+    assert [e.get("index") for e in events[1:4]] == [0, 1, 0]
+    assert events[-1]["data"]["_needs_legal_review"] is False
+
+    # 第二次命中缓存：只有 result 事件
+    events = asyncio.run(_collect())
+    assert [e["event"] for e in events] == ["result"]
+
+
+def test_stream_endpoint_sse_and_ndjson(monkeypatch):
+    import app.api.reports as reports
+    monkeypatch.setattr(reports, "create_gemini_client_from_env", lambda *a, **k: StreamingClient())
+
+    r = client.post('/api/v1/reports/stream?no_cache=true', json=FS)
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/event-stream")
+    blocks = [b for b in r.text.split("\n\n") if b]
+    names = [b.split("\n")[0] for b in blocks]
+    assert names == ["event: overview", "event: recommendation", "event: recommendation", "event: risk",
+                     "event: result"]
+    final = json.loads(blocks[-1].split("\n", 1)[1][len("data: "):])
+    assert final["data"]["analysis"]["recommendations"] == ["建立应急基金", "考虑提前还款"]
+    assert "_disclaimer" in final["data"]["analysis"]
+
+    r = client.post('/api/v1/reports/stream?format=ndjson&no_cache=true', json=FS)
+    lines = [json.loads(line) for line in r.text.splitlines()]
+    assert lines[0] == {"event": "overview", "data": "负债率较低，\"财务\"状况稳健"}
+    assert lines[-1]["event"] == "result"
+
+    assert client.post('/api/v1/reports/stream?format=xml', json=FS).status_code == 400
@@ -4,8 +4,6 @@ from app.main import app
 from app.services.cfp_agent import CFPAgent
 from app.services.model_clients import DummyModelClientLocal
 
-client = TestClient(app)
-
 
 def test_start_and_poll_report(monkeypatch, tmp_path):
     # monkeypatch CFPAgent to use DummyModelClientLocal to avoid real Gemini calls
@@ -24,25 +22,50 @@ def test_start_and_poll_report(monkeypatch, tmp_path):
         "expenses": 5000
     }
 
-    # start job
-    r = client.post('/api/v1/reports/start', json=payload)
-    assert r.status_code == 200
-    data = r.json()
-    assert 'job_id' in data
-    job_id = data['job_id']
-
-    # poll until done or timeout
-    import time
-    deadline = time.time() + 5
-    status = None
-    while time.time() < deadline:
-        pr = client.get(f'/api/v1/reports/{job_id}')
-        assert pr.status_code == 200
-        job = pr.json()
-        status = job.get('status')
-        if status == 'done' or status == 'error':
-            break
-        time.sleep(0.2)
-
-    assert status == 'done'
-    assert job['result']['analysis']['confidence'] >= 0.0
+    # 后台任务运行在应用的事件循环上：用 with 保持同一个循环跨请求存活（与真实服务一致），
+    # 否则每个请求结束时循环被关闭，任务被取消
+    with TestClient(app) as client:
+        # start job
+        r = client.post('/api/v1/reports/start', json=payload)
+        assert r.status_code == 200
+        data = r.json()
+        assert 'job_id' in data
+        job_id = data['job_id']
+
+        # poll until done or timeout
+        import time
+        deadline = time.time() + 5
+        status = None
+        while time.time() < deadline:
+            pr = client.get(f'/api/v1/reports/{job_id}')
+            assert pr.status_code == 200
+            job = pr.json()
+            status = job.get('status')
+            if status == 'done' or status == 'error':
+                break
+            time.sleep(0.2)
+
+        assert status == 'done'
+        assert job['result']['analysis']['confidence'] >= 0.0
+
+
+def test_lifespan_opens_pool_then_drains_before_closing(monkeypatch):
+    from app.api import reports
+    from app.services import audit, model_clients
+
+    events = []
+    pools = []
+
+    async def drain(timeout):
+        pools.append(model_clients.get_shared_async_client())
+        events.append(('drain', not pools[0].is_closed))
+
+    monkeypatch.setattr(reports, 'drain_jobs', drain)
+    monkeypatch.setattr(audit, 'close_audit_writer', lambda: events.append('audit'))
+
+    with TestClient(app) as client:
+        assert client.get('/').status_code == 200
+        assert events == []
+    # 共享连接池在 drain 期间仍可用，之后才关闭，最后写出审计缓冲
+    assert events == [('drain', True), 'audit']
+    assert pools[0].is_closed
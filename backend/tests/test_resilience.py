@@ -0,0 +1,177 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app.models.financials import FinancialStatement
+from app.services.cfp_agent import CFPAgent
+from app.services.model_clients import GeminiClientAsync
+from app.services.resilience import (
+    AdaptiveTimeout, CircuitBreaker, CircuitOpenError, RetryPolicy, call_with_retry, get_circuit_breaker,
+    parse_retry_after, reset_resilience,
+)
+
+
+@pytest.fixture(autouse=True)
+def _fresh_registry(monkeypatch):
+    monkeypatch.setenv('GEMINI_BACKOFF_BASE', '0.001')
+    monkeypatch.setenv('GEMINI_CB_CONSECUTIVE_FAILURES', '3')
+    reset_resilience()
+    yield
+    reset_resilience()
+
+
+def test_breaker_opens_fails_fast_and_recovers_via_half_open():
+    breaker = CircuitBreaker('t', consecutive_failures=2, open_seconds=0.05)
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure()
+    assert breaker.state == 'open'
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    time.sleep(0.06)
+    breaker.before_call()  # 半开探测
+    assert breaker.state == 'half_open'
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()  # 探测名额已用完
+    breaker.record_success(0.01)
+    assert breaker.state == 'closed'
+
+
+def test_breaker_trips_on_error_rate_and_slow_calls():
+    breaker = CircuitBreaker('t', failure_rate=0.5, min_calls=4, consecutive_failures=100, slow_call_seconds=1.0)
+    breaker.record_success(0.1)
+    breaker.record_failure()
+    breaker.record_success(0.1)
+    assert breaker.state == 'closed'
+    breaker.record_success(2.0)  # 慢调用计为坏调用：2/4
+    assert breaker.state == 'open'
+
+
+
+def test_late_success_does_not_extend_open_period():
+    from app.core.metrics import CIRCUIT_TRANSITIONS
+    breaker = CircuitBreaker('late', failure_rate=0.5, min_calls=2, consecutive_failures=100)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    opened_at = breaker._opened_at
+    opened = CIRCUIT_TRANSITIONS.value(breaker='late', state='open')
+    time.sleep(0.01)
+    breaker.record_success(0.5)  # 打开前发出的调用此时才完成
+    assert breaker.state == 'open'
+    assert breaker._opened_at == opened_at
+    assert CIRCUIT_TRANSITIONS.value(breaker='late', state='open') == opened
+
+
+def test_retry_respects_deadline_and_non_retryable_errors():
+    calls = []
+
+    def failing(timeout):
+        calls.append(timeout)
+        raise ConnectionError('down')
+
+    policy = RetryPolicy(max_attempts=10, backoff_base=0.05, backoff_max=0.05, deadline=0.12)
+    breaker = CircuitBreaker('t', consecutive_failures=100)
+    with pytest.raises(ConnectionError):
+        call_with_retry(failing, breaker, AdaptiveTimeout(initial=5.0), policy)
+    assert 1 < len(calls) < 10
+    assert all(t <= 0.12 for t in calls)
+
+    request = httpx.Request('POST', 'http://x')
+    bad_request = httpx.HTTPStatusError('400', request=request, response=httpx.Response(400, request=request))
+    calls.clear()
+
+    def rejected(timeout):
+        calls.append(timeout)
+        raise bad_request
+
+    with pytest.raises(httpx.HTTPStatusError):
+        call_with_retry(rejected, breaker, AdaptiveTimeout(), RetryPolicy(max_attempts=3))
+    assert len(calls) == 1
+
+
+def test_adaptive_timeout_and_retry_after_parsing():
+    timeouts = AdaptiveTimeout(initial=30.0, floor=0.5, multiplier=3.0, min_samples=5)
+    assert timeouts.current() == 30.0
+    for _ in range(10):
+        timeouts.observe(0.4)
+    assert abs(timeouts.current() - 1.2) < 1e-9
+    assert parse_retry_after('2') == 2.0
+    assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0.0
+    assert parse_retry_after('soon') is None
+
+
+def test_async_client_honours_retry_after_then_opens_circuit():
+    responses = [httpx.Response(429, headers={'Retry-After': '0.05'}), httpx.Response(200, json={'text': 'ok'})]
+    seen = []
+
+    def handler(request):
+        seen.append(request)
+        return responses.pop(0) if responses else httpx.Response(503)
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as pool:
+            client = GeminiClientAsync(api_key='k', base_url='http://cb', http_client=pool)
+            started = time.monotonic()
+            assert await client.async_generate('p') == 'ok'
+            assert time.monotonic() - started >= 0.05
+
+            with pytest.raises(httpx.HTTPStatusError):
+                await client.async_generate('p')  # 3 次 503
+            n = len(seen)
+            started = time.monotonic()
+            with pytest.raises(CircuitOpenError):
+                await client.async_generate('p')
+            assert time.monotonic() - started < 0.05
+            assert len(seen) == n
+
+    asyncio.run(run())
+    assert get_circuit_breaker('http://cb').state == 'open'
+
+
+def test_agent_falls_back_to_rules_when_circuit_open():
+    def handler(request):
+        raise AssertionError('request should not be sent while the circuit is open')
+
+    breaker = get_circuit_breaker('http://down')
+    for _ in range(3):
+        breaker.record_failure()
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as pool:
+            client = GeminiClientAsync(api_key='k', base_url='http://down', http_client=pool)
+            agent = CFPAgent(model_client=client, local_tier=False)
+            fs = FinancialStatement(assets=100000, liabilities=80000, income=10000, expenses=9000)
+            return await agent.analyze_async(fs, use_cache=False)
+
+    result = asyncio.run(run())
+    assert result["recommendations"] == ["建议优先偿还高息负债，或调整预算以减少支出。"]
+    assert result["_tier"] == "rules"
+
+
+def test_agent_makes_one_retry_loop_per_request_during_outage(monkeypatch):
+    monkeypatch.setenv('GEMINI_CB_CONSECUTIVE_FAILURES', '100')
+    monkeypatch.setenv('GEMINI_MAX_ATTEMPTS', '3')
+    seen = []
+    sync_calls = []
+
+    def handler(request):
+        seen.append(request)
+        return httpx.Response(503)
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as pool:
+            client = GeminiClientAsync(api_key='k', base_url='http://outage', http_client=pool)
+            client.generate = lambda *a, **kw: sync_calls.append(a)
+            agent = CFPAgent(model_client=client, local_tier=False)
+            fs = FinancialStatement(assets=100000, liabilities=80000, income=10000, expenses=9000)
+            return await agent.analyze_async(fs, use_cache=False)
+
+    result = asyncio.run(run())
+    # 异步重试用尽后直接回退到规则引擎，不再用同步 generate 重跑一遍重试
+    assert len(seen) == 3
+    assert sync_calls == []
+    assert result["recommendations"] == ["建议优先偿还高息负债，或调整预算以减少支出。"]
@@ -0,0 +1,92 @@
+import asyncio
+import json
+import sqlite3
+import time
+
+from app.models.financials import FinancialStatement
+from app.services.cfp_agent import CFPAgent
+from app.services.result_cache import (
+    InMemoryResultCache,
+    SQLiteResultCache,
+    TieredResultCache,
+    make_cache_key,
+)
+
+
+class CountingClient:
+    def __init__(self):
+        self.calls = 0
+
+    async def async_generate(self, prompt, max_tokens=512):
+        self.calls += 1
+        return json.dumps({"overview": "ok", "recommendations": ["a"], "risks": [], "confidence": 0.7})
+
+
+def test_lru_ttl_and_size_bound():
+    cache = InMemoryResultCache(max_size=2, ttl=60)
+    cache.set('a', {"v": 1})
+    cache.set('b', {"v": 2})
+    assert cache.get('a') == {"v": 1}
+    cache.set('c', {"v": 3})  # 'b' 最久未使用，被淘汰
+    assert cache.get('b') is None
+    assert len(cache) == 2
+
+    expired = InMemoryResultCache(ttl=-1)
+    expired.set('a', {"v": 1})
+    assert expired.get('a') is None
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+
+def test_sqlite_tier_shared_between_instances(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    first = TieredResultCache(InMemoryResultCache(), SQLiteResultCache(path))
+    first.set('k', {"overview": "中文"})
+    second = TieredResultCache(InMemoryResultCache(), SQLiteResultCache(path))
+    assert second.get('k') == {"overview": "中文"}
+    assert second.memory.get('k') == {"overview": "中文"}
+
+
+def test_cache_key_normalizes_whitespace():
+    assert make_cache_key('a  b\nc') == make_cache_key('a b c')
+    assert make_cache_key('a b', 'x') != make_cache_key('a b', 'y')
+
+
+def test_agent_uses_cache_and_bypass():
+    client = CountingClient()
+    agent = CFPAgent(model_client=client, cache=InMemoryResultCache())
+    fs = FinancialStatement(assets=100000, liabilities=80000, income=10000, expenses=9000)
+    same = FinancialStatement(assets=100000.0, liabilities=80000, income=10000, expenses=9000)
+
+    first = asyncio.run(agent.analyze_async(fs))
+    second = asyncio.run(agent.analyze_async(same))
+    assert client.calls == 1
+    assert second['overview'] == first['overview']
+    assert '_disclaimer' in second
+
+    asyncio.run(agent.analyze_async(fs, use_cache=False))
+    assert client.calls == 2
+
+
+def test_sqlite_tier_does_not_block_event_loop(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    disk = SQLiteResultCache(path)
+    agent = CFPAgent(model_client=CountingClient(), cache=TieredResultCache(InMemoryResultCache(), disk),
+                     local_tier=False)
+    fs = FinancialStatement(assets=100000, liabilities=80000, income=10000, expenses=9000)
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute('BEGIN IMMEDIATE')  # 模拟另一个 worker 持有写锁，缓存写入需要等待
+
+    async def run():
+        analysis = asyncio.ensure_future(agent.analyze_async(fs))
+        started = time.monotonic()
+        await asyncio.sleep(0.05)
+        # 写缓存等待锁期间事件循环仍可调度其他协程
+        assert time.monotonic() - started < 0.5
+        assert not analysis.done()
+        other.execute('COMMIT')
+        return await analysis
+
+    assert asyncio.run(run())['overview'] == 'ok'
+    other.close()
+    assert disk.stats()['misses'] == 1
+    assert SQLiteResultCache(path).get(next(iter(agent.cache.memory._data))) is not None
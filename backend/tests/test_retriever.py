@@ -0,0 +1,129 @@
+from app.services.retriever import BM25Retriever, InMemoryRetriever, tokenize
+
+
+DOCS = [
+    "消费者债务相关法律条款摘要：逾期催收不得骚扰借款人。",
+    "债务重组与利率优化最佳实践：优先偿还高息负债，降低负债率。",
+    "预算分配建议：建立三到六个月的应急基金。",
+]
+
+
+def test_tokenize_mixed_text():
+    tokens = tokenize("负债率 Debt ratio 0.6")
+    assert "负债" in tokens and "债率" in tokens
+    assert "debt" in tokens and "0.6" in tokens
+
+
+def test_bm25_ranks_relevant_doc_first():
+    r = BM25Retriever(DOCS)
+    scored = r.get_scored("用户负债率分析 assets:100000 liabilities:20000", top_k=2)
+    assert scored[0][1] == DOCS[1]
+    assert scored[0][0] > 0
+    assert r.get("应急基金", top_k=1) == [DOCS[2]]
+
+
+def test_incremental_add_and_no_match():
+    r = BM25Retriever()
+    assert r.get("任何问题") == []
+    r.add("仲裁程序说明")
+    assert r.get("仲裁") == ["仲裁程序说明"]
+    assert r.get("xyz") == []
+
+
+def test_in_memory_retriever_falls_back_to_first_docs():
+    r = InMemoryRetriever(docs=list(DOCS))
+    assert r.get("xyz", top_k=2) == DOCS[:2]
+    assert r.get("法律条款", top_k=1) == [DOCS[0]]
+
+
+def _toy_embed(texts):
+    # 极简 embedding：统计几个关键字出现次数，足以区分测试文档
+    keys = ["债", "法", "基金", "预算"]
+    return [[float(t.count(k)) for k in keys] for t in texts]
+
+
+def _hybrid(**kwargs):
+    from app.services.hybrid_retriever import HybridRetriever
+    from app.services.vectorstore import InMemoryVectorStore
+
+    vs = InMemoryVectorStore(metric='cosine')
+    vs.upsert(_toy_embed(DOCS), [{"text": d} for d in DOCS], [str(i) for i in range(len(DOCS))])
+    return HybridRetriever(lexical=BM25Retriever(DOCS), vector_store=vs, embed_fn=_toy_embed, **kwargs)
+
+
+def test_hybrid_fuses_and_dedupes():
+    r = _hybrid()
+    results = r.get("债务 负债率", top_k=3)
+    assert results[0] == DOCS[1]
+    assert len(results) == len(set(results))
+
+    weighted = _hybrid(fusion='weighted')
+    assert weighted.get("应急基金 预算", top_k=1) == [DOCS[2]]
+
+
+def test_hybrid_aget_respects_deadline():
+    import asyncio
+    import time
+
+    r = _hybrid(deadline=0.05)
+    slow_embed = r.embed_fn
+
+    def slow(texts):
+        time.sleep(0.3)
+        return slow_embed(texts)
+
+    r.embed_fn = slow
+
+    async def run():
+        t0 = time.perf_counter()
+        res = await r.aget("应急基金", top_k=2)
+        return res, time.perf_counter() - t0
+
+    results, elapsed = asyncio.run(run())
+    assert elapsed < 0.25
+    # 向量一路超时被丢弃，仍返回关键词结果
+    assert results == [DOCS[2]]
+
+
+def test_hybrid_aget_sheds_work_while_expired_searches_run():
+    import asyncio
+    import threading
+    import time
+
+    r = _hybrid(deadline=0.05, max_workers=2)
+    fast_embed = r.embed_fn
+    release = threading.Event()
+    calls = []
+    threads = []
+
+    def blocked(texts):
+        calls.append(texts)
+        threads.append(threading.current_thread().name)
+        release.wait(2)
+        return fast_embed(texts)
+
+    r.embed_fn = blocked
+
+    async def run():
+        first = await r.aget("应急基金", top_k=2)
+        # 上一次的向量检索超时但仍在运行，占用一个线程；lexical 已结束
+        second = await r.aget("应急基金", top_k=2)
+        return first, second
+
+    try:
+        first, second = asyncio.run(run())
+        assert first == [DOCS[2]] and second == [DOCS[2]]
+        # 第二次调用时池中仅 1 个检索在跑，未超过上限，向量一路仍会提交
+        assert len(calls) == 2
+        # 两个超时检索占满线程池：新请求两路都被跳过，且不会再调用 embed_fn
+        assert asyncio.run(r.aget_scored("应急基金", top_k=2)) == []
+        assert len(calls) == 2
+        assert all(name.startswith('hybrid-retriever') for name in threads)
+    finally:
+        release.set()
+        r.close()
+
+    deadline = time.time() + 2
+    while r._inflight and time.time() < deadline:
+        time.sleep(0.01)
+    assert r._inflight == 0
@@ -0,0 +1,66 @@
+import asyncio
+
+from app.models.financials import FinancialStatement
+from app.services.cfp_agent import CFPAgent
+from app.services.result_cache import InMemoryResultCache
+from app.services.rules_engine import RuleEngine, local_tier_enabled
+
+HEALTHY = FinancialStatement(assets=100000, liabilities=5000, income=10000, expenses=3000)
+BORDERLINE = FinancialStatement(assets=100000, liabilities=20000, income=10000, expenses=5000)
+INDEBTED = FinancialStatement(assets=100000, liabilities=80000, income=10000, expenses=9000)
+
+
+class RecordingClient:
+    base_url = "stub"
+
+    def __init__(self):
+        self.calls = 0
+
+    async def async_generate(self, prompt, max_tokens=512):
+        self.calls += 1
+        return '{"overview": "model", "recommendations": [], "risks": [], "confidence": 0.9}'
+
+
+def test_evaluate_keeps_fallback_wording():
+    engine = RuleEngine()
+    assert engine.evaluate(INDEBTED) == {"overview": "用户当前负债率为 0.80",
+                                         "recommendations": ["建议优先偿还高息负债，或调整预算以减少支出。"],
+                                         "risks": [], "confidence": 0.6}
+    assert engine.evaluate(HEALTHY)["recommendations"] == ["保持良好预算习惯并建立应急基金。"]
+
+
+def test_classify_thresholds_are_configurable():
+    engine = RuleEngine()
+    routine, conf = engine.classify(HEALTHY)
+    assert routine and 0.75 <= conf <= 1.0
+    assert engine.classify(BORDERLINE)[0] is False
+    assert engine.classify(INDEBTED) == (False, 0.0)
+    assert RuleEngine(routine_min_confidence=0.6).classify(BORDERLINE)[0] is True
+
+
+def test_agent_answers_routine_cases_locally():
+    model = RecordingClient()
+    agent = CFPAgent(model_client=model, cache=InMemoryResultCache(), local_tier=True)
+    local = asyncio.run(agent.analyze_async(HEALTHY))
+    assert model.calls == 0
+    assert local["recommendations"] == ["保持良好预算习惯并建立应急基金。"] and local["confidence"] >= 0.75
+    assert "_disclaimer" in local and local["_tier"] == "local"
+
+    routed = asyncio.run(agent.analyze_async(BORDERLINE))
+    assert routed["overview"] == "model" and routed["_tier"] == "model"
+    assert model.calls == 1
+
+    disabled = CFPAgent(model_client=model, cache=InMemoryResultCache(), local_tier=False)
+    assert asyncio.run(disabled.analyze_async(HEALTHY))["overview"] == "model"
+
+
+def test_local_tier_is_opt_in(monkeypatch):
+    monkeypatch.delenv('CFP_LOCAL_TIER_ENABLED', raising=False)
+    assert local_tier_enabled() is False
+    model = RecordingClient()
+    result = asyncio.run(CFPAgent(model_client=model, cache=InMemoryResultCache()).analyze_async(HEALTHY))
+    assert model.calls == 1 and result["_tier"] == "model"
+
+    monkeypatch.setenv('CFP_LOCAL_TIER_ENABLED', 'true')
+    result = asyncio.run(CFPAgent(model_client=model, cache=InMemoryResultCache()).analyze_async(HEALTHY))
+    assert model.calls == 1 and result["_tier"] == "local"
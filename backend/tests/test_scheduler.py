@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from app.services.scheduler import JobScheduler, QueueFullError, SchedulerClosedError
+
+
+def test_concurrency_bound_priority_and_backpressure():
+    async def _main():
+        sched = JobScheduler(max_concurrency=2, max_queue=3)
+        release = asyncio.Event()
+        active, peak, order = 0, 0, []
+
+        def job(name):
+            async def _run():
+                nonlocal active, peak
+                active += 1
+                peak = max(peak, active)
+                order.append(name)
+                await release.wait()
+                active -= 1
+            return _run
+
+        assert sched.submit('a', job('a')) == 0
+        assert sched.submit('b', job('b')) == 0
+        assert sched.submit('low', job('low'), priority=0) == 1
+        assert sched.submit('high', job('high'), priority=5) == 1
+        assert sched.submit('low2', job('low2'), priority=0) == 3
+        assert sched.position('low') == 2 and sched.position('a') == 0 and sched.position('x') is None
+        with pytest.raises(QueueFullError) as exc:
+            sched.submit('overflow', job('overflow'))
+        assert exc.value.retry_after >= 1
+
+        await asyncio.sleep(0)
+        release.set()
+        dropped = await sched.drain(timeout=5)
+        return peak, order, dropped, sched.stats()
+
+    peak, order, dropped, stats = asyncio.run(_main())
+    assert peak == 2
+    assert order == ['a', 'b', 'high', 'low', 'low2']
+    assert dropped == []
+    assert stats['completed'] == 5 and stats['rejected'] == 1
+
+
+def test_drain_timeout_cancels_running_and_reports_unstarted():
+    async def _main():
+        sched = JobScheduler(max_concurrency=1, max_queue=5)
+        cancelled = []
+
+        async def forever():
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        sched.submit('run', forever)
+        sched.submit('wait', forever)
+        await asyncio.sleep(0)
+        dropped = await sched.drain(timeout=0.05)
+        with pytest.raises(SchedulerClosedError):
+            sched.submit('late', forever)
+        return dropped, cancelled, sched.running
+
+    dropped, cancelled, running = asyncio.run(_main())
+    assert dropped == ['wait']
+    assert cancelled == [True]
+    assert running == 0
+
+
+def test_start_report_returns_429_when_queue_full(monkeypatch):
+    from fastapi.testclient import TestClient
+    from app.main import app
+    import app.api.reports as reports
+
+    class FullScheduler:
+        def submit(self, job_id, factory, priority=0):
+            raise QueueFullError(7)
+
+    monkeypatch.setattr(reports, 'get_scheduler', lambda: FullScheduler())
+    payload = {"assets": 100000, "liabilities": 20000, "income": 10000, "expenses": 5000}
+    r = TestClient(app).post('/api/v1/reports/start', json=payload)
+    assert r.status_code == 429
+    assert r.headers['retry-after'] == '7'
@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+from app.services.singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"value": 42}
+
+    async def run():
+        sf = SingleFlight()
+        results = await asyncio.gather(*[sf.do('k', work) for _ in range(5)])
+        assert len(sf) == 0
+        return results
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert all(r == {"value": 42} for r in results)
+
+
+def test_error_propagates_to_all_waiters():
+    async def boom():
+        await asyncio.sleep(0.01)
+        raise ValueError('upstream failed')
+
+    async def run():
+        sf = SingleFlight()
+        return await asyncio.gather(*[sf.do('k', boom) for _ in range(3)], return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, ValueError) for r in results)
+
+
+def test_cancelling_one_waiter_keeps_shared_call_alive():
+    started = []
+
+    async def work():
+        started.append(1)
+        await asyncio.sleep(0.05)
+        return 'done'
+
+    async def run():
+        sf = SingleFlight()
+        first = asyncio.ensure_future(sf.do('k', work))
+        second = asyncio.ensure_future(sf.do('k', work))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        assert await second == 'done'
+        with pytest.raises(asyncio.CancelledError):
+            await first
+
+    asyncio.run(run())
+    assert len(started) == 1
+
+
+def test_last_waiter_cancel_cancels_underlying_call():
+    finished = []
+
+    async def work():
+        await asyncio.sleep(0.05)
+        finished.append(1)
+
+    async def run():
+        sf = SingleFlight()
+        waiter = asyncio.ensure_future(sf.do('k', work))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        await asyncio.sleep(0.08)
+        assert not sf.in_flight('k')
+
+    asyncio.run(run())
+    assert finished == []
+
+
+def test_caller_arriving_after_last_waiter_cancels_starts_fresh_call():
+    runs = []
+
+    async def work():
+        runs.append(1)
+        try:
+            await asyncio.sleep(0.05)
+        except asyncio.CancelledError:
+            # 取消后的清理（例如关闭上游连接）需要一点时间，任务在此期间尚未 done
+            await asyncio.sleep(0.02)
+            raise
+        return len(runs)
+
+    async def run():
+        sf = SingleFlight()
+        waiter = asyncio.ensure_future(sf.do('k', work))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        return await sf.do('k', work)
+
+    assert asyncio.run(run()) == 2
+    assert len(runs) == 2
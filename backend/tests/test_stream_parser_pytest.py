@@ -55,3 +55,38 @@ def test_multiple_objects():
     assert len(objs) >= 2
     assert objs[0]["a"] == 1
     assert objs[1]["b"] == 2
+
+
+def test_braces_and_escapes_inside_strings_split_across_chunks():
+    builder = StreamJSONBuilder()
+    text = '{"overview": "含有 } 与 ] 以及转义引号 \\" 和反斜杠 \\\\", "risks": ["{x}"]}'
+    res = None
+    # 逐字符喂入，覆盖转义符恰好落在片段末尾的情况
+    for ch in text:
+        res = builder.feed(ch) or res
+    assert res == {"overview": '含有 } 与 ] 以及转义引号 " 和反斜杠 \\', "risks": ["{x}"]}
+    assert builder.buffer == ''
+
+
+def test_malformed_value_is_skipped():
+    builder = StreamJSONBuilder()
+    assert builder.feed('noise {not json} more noise ') is None
+    assert builder.feed('{"ok": true}') == {"ok": True}
+
+
+def test_oversized_value_raises_instead_of_truncating():
+    from app.services.stream_parser import StreamBufferOverflow
+
+    builder = StreamJSONBuilder(max_buffer=50)
+    with pytest.raises(StreamBufferOverflow):
+        builder.feed('{"overview": "' + 'x' * 100)
+    # 溢出后状态被重置，可继续解析后续对象
+    assert builder.feed('{"a": 1}') == {"a": 1}
+
+    # 超限的值在单个片段内完整闭合时同样抛出，其后的对象仍可解析
+    with pytest.raises(StreamBufferOverflow):
+        builder.feed('{"overview": "' + 'x' * 100 + '"}{"b": 2}')
+    assert builder.feed('') == {"b": 2}
+    with pytest.raises(StreamBufferOverflow):
+        builder.feed('[' + '1,' * 60 + '1]')
+    assert builder.feed('{"c": 3}') == {"c": 3}
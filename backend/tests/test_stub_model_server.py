@@ -0,0 +1,50 @@
+import asyncio
+import json
+
+import httpx
+
+from app.services.model_clients import GeminiClientAsync
+from tools.load_test import percentile, summarize
+from tools.stub_model_server import StubConfig, create_stub_app, split_tokens
+
+
+def _client(cfg):
+    transport = httpx.ASGITransport(app=create_stub_app(cfg))
+    http = httpx.AsyncClient(transport=transport, base_url="http://stub")
+    return http, GeminiClientAsync(api_key="stub", base_url="http://stub", http_client=http)
+
+
+def test_stub_matches_gemini_client_contract():
+    cfg = StubConfig(latency_ms=0, tokens_per_s=0, seed=1)
+
+    async def run():
+        http, client = _client(cfg)
+        async with http:
+            text = await client.async_generate("hello")
+            chunks = [c async for c in client.async_stream_generate("hello")]
+        return text, chunks
+
+    text, chunks = asyncio.run(run())
+    data = json.loads(text)
+    assert set(data) == {"overview", "recommendations", "risks", "confidence"}
+    # 逐行 strip 后拼接仍是完整 JSON
+    assert len(chunks) > 1
+    assert set(json.loads("".join(chunks))) == set(data)
+
+
+def test_split_tokens_never_cuts_at_whitespace():
+    text = '{"a": "b c", "d": [1, 2]}'
+    parts = split_tokens(text, 3)
+    assert "".join(parts) == text
+    assert all(p == p.strip() for p in parts)
+
+
+def test_load_summary_percentiles():
+    assert percentile([1, 2, 3, 4], 0.5) == 2.5
+    samples = [{"ok": True, "status": 200, "latency": i / 1000, "ttfb": None} for i in range(1, 101)]
+    samples.append({"ok": False, "status": 503, "latency": 0.0, "ttfb": None})
+    out = summarize(samples, elapsed=10.0)
+    assert out["ok"] == 100 and out["errors"] == 1
+    assert out["status_counts"] == {"200": 100, "503": 1}
+    assert abs(out["latency_ms"]["p99"] - 99.01) < 1e-6
+    assert out["throughput_rps"] == 10.0
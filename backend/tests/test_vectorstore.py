@@ -0,0 +1,106 @@
+import numpy as np
+import pytest
+
+from app.services.vectorstore import InMemoryVectorStore
+
+
+def _brute_force(vectors, q, k):
+    d = np.sqrt(((vectors - q) ** 2).sum(axis=1))
+    return list(np.argsort(d, kind='stable')[:k])
+
+
+def test_l2_matches_brute_force_and_grows():
+    rng = np.random.default_rng(0)
+    data = rng.normal(size=(300, 16)).astype(np.float32)
+    vs = InMemoryVectorStore(initial_capacity=4)
+    for start in range(0, 300, 50):
+        ids = [f'id{i}' for i in range(start, start + 50)]
+        vs.upsert(data[start:start + 50].tolist(), [{'i': i} for i in range(start, start + 50)], ids)
+    assert len(vs) == 300
+
+    q = rng.normal(size=16).astype(np.float32)
+    res = vs.query(q.tolist(), top_k=5)
+    assert [m['i'] for _, _, m in res] == _brute_force(data, q, 5)
+    assert res[0][0] <= res[-1][0]
+
+
+def test_upsert_overwrites_existing_id():
+    vs = InMemoryVectorStore()
+    vs.upsert([[0.0, 0.0]], [{'v': 1}], ['a'])
+    vs.upsert([[5.0, 5.0]], [{'v': 2}], ['a'])
+    assert len(vs) == 1
+    dist, _id, meta = vs.query([5.0, 5.0], top_k=1)[0]
+    assert _id == 'a' and meta == {'v': 2} and dist == pytest.approx(0.0, abs=1e-3)
+
+
+def test_delete_fills_hole_with_last_row():
+    vs = InMemoryVectorStore()
+    vs.upsert([[0.0, 0.0], [1.0, 1.0], [2.0, 2.0]], [{'v': 0}, {'v': 1}, {'v': 2}], ['a', 'b', 'c'])
+    assert vs.delete(['a', 'missing']) == 1
+    assert len(vs) == 2
+    assert vs.query([0.0, 0.0], top_k=5)[0][1:] == ('b', {'v': 1})
+    vs.upsert([[2.5, 2.5]], [{'v': 3}], ['c'])
+    assert len(vs) == 2
+    assert vs.query([2.5, 2.5], top_k=1)[0][1] == 'c'
+
+
+@pytest.mark.parametrize('metric', ['cosine', 'ip'])
+def test_other_metrics_rank_most_similar_first(metric):
+    vs = InMemoryVectorStore(metric=metric)
+    vs.upsert([[1.0, 0.0], [0.0, 1.0], [0.7, 0.7]], [{}, {}, {}], ['x', 'y', 'xy'])
+    assert vs.query([1.0, 0.1], top_k=1)[0][1] == 'x'
+
+
+def test_query_batch_equals_individual_queries():
+    rng = np.random.default_rng(1)
+    vs = InMemoryVectorStore(metric='cosine')
+    vs.upsert(rng.normal(size=(100, 8)).tolist(), [{}] * 100, [str(i) for i in range(100)])
+    queries = rng.normal(size=(4, 8)).tolist()
+    batch = vs.query_batch(queries, top_k=3)
+    assert [[r[1] for r in rs] for rs in batch] == [[r[1] for r in vs.query(q, 3)] for q in queries]
+
+
+def test_dimension_mismatch_rejected():
+    vs = InMemoryVectorStore()
+    vs.upsert([[1.0, 2.0]], [{}], ['a'])
+    with pytest.raises(ValueError):
+        vs.upsert([[1.0, 2.0, 3.0]], [{}], ['b'])
+
+
+def test_save_and_mmap_load_roundtrip(tmp_path):
+    rng = np.random.default_rng(2)
+    data = rng.normal(size=(50, 4)).astype(np.float32)
+    vs = InMemoryVectorStore(metric='cosine')
+    vs.upsert(data, [{'text': f'片段{i}'} for i in range(50)], [f'c{i}' for i in range(50)])
+    vs.save(str(tmp_path / 'idx'), extra={'embedder': 'hash-v1'})
+
+    loaded = InMemoryVectorStore.load(str(tmp_path / 'idx'), expected={'embedder': 'hash-v1'})
+    assert isinstance(loaded.vectors, np.memmap)
+    q = data[3].tolist()
+    assert loaded.query(q, 3) == vs.query(q, 3)
+
+    # 只读映射上的写入会先复制到内存，不修改磁盘文件
+    loaded.upsert([[1.0, 0.0, 0.0, 0.0]], [{'text': 'new'}], ['c3'])
+    assert loaded.query([1.0, 0.0, 0.0, 0.0], 1)[0][1] == 'c3'
+    reloaded = InMemoryVectorStore.load(str(tmp_path / 'idx'))
+    assert reloaded.query(q, 1)[0][1] == 'c3'
+    assert reloaded.query(q, 1)[0][0] == pytest.approx(0.0, abs=1e-5)
+
+
+def test_stale_index_detected(tmp_path):
+    import json
+    from app.services.vectorstore import StaleIndexError, load_vector_store
+
+    vs = InMemoryVectorStore()
+    vs.upsert([[1.0, 2.0]], [{}], ['a'])
+    path = str(tmp_path / 'idx')
+    vs.save(path, extra={'embedder': 'hash-v1'})
+    with pytest.raises(StaleIndexError):
+        load_vector_store(path, expected={'embedder': 'hash-v2'})
+
+    header_path = tmp_path / 'idx' / 'header.json'
+    header = json.loads(header_path.read_text(encoding='utf-8'))
+    header['version'] = 0
+    header_path.write_text(json.dumps(header), encoding='utf-8')
+    with pytest.raises(StaleIndexError):
+        load_vector_store(path)
@@ -0,0 +1,89 @@
+# IVF 近似检索的召回率 / 延迟基准：以 InMemoryVectorStore 的精确检索结果为真值
+# 用法：python tools/bench_ann.py --n 50000 --dim 64 --nlist 256 --nprobe 1 4 8 16 32 [--json out.json]
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+# Ensure backend root is on sys.path when run directly
+ROOT = os.path.dirname(os.path.dirname(__file__))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from app.services.ann_index import IVFVectorStore
+from app.services.vectorstore import InMemoryVectorStore
+
+
+def make_corpus(n, dim, n_clusters=200, seed=0):
+    # 带簇结构的合成数据，比纯高斯噪声更接近真实 embedding 分布
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(n_clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, n_clusters, size=n)
+    return (centers[labels] + 0.3 * rng.normal(size=(n, dim))).astype(np.float32)
+
+
+def timed_queries(store, queries, top_k, **kwargs):
+    latencies = []
+    results = []
+    for q in queries:
+        t0 = time.perf_counter()
+        results.append([r[1] for r in store.query(q, top_k, **kwargs)])
+        latencies.append(time.perf_counter() - t0)
+    return results, np.asarray(latencies) * 1000.0
+
+
+def run(n, dim, n_queries, top_k, nlist, nprobes, metric, seed):
+    data = make_corpus(n, dim, seed=seed)
+    ids = [str(i) for i in range(n)]
+    metas = [{}] * n
+    queries = make_corpus(n_queries, dim, seed=seed + 1)
+
+    exact = InMemoryVectorStore(metric=metric)
+    exact.upsert(data, metas, ids)
+    truth, exact_ms = timed_queries(exact, queries, top_k)
+
+    t0 = time.perf_counter()
+    ivf = IVFVectorStore(metric=metric, nlist=nlist, train_size=n + 1, seed=seed)
+    ivf.upsert(data, metas, ids)
+    ivf.train()
+    build_s = time.perf_counter() - t0
+
+    rows = [{"index": "exact", "recall": 1.0, "p50_ms": float(np.median(exact_ms)),
+             "p95_ms": float(np.percentile(exact_ms, 95))}]
+    for nprobe in nprobes:
+        found, ms = timed_queries(ivf, queries, top_k, nprobe=nprobe)
+        recall = np.mean([len(set(f) & set(t)) / float(top_k) for f, t in zip(found, truth)])
+        rows.append({"index": f"ivf(nlist={nlist}, nprobe={nprobe})", "recall": float(recall),
+                     "p50_ms": float(np.median(ms)), "p95_ms": float(np.percentile(ms, 95))})
+    return {"n": n, "dim": dim, "top_k": top_k, "metric": metric, "ivf_build_s": build_s, "results": rows}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='IVF recall-vs-latency benchmark')
+    parser.add_argument('--n', type=int, default=50000)
+    parser.add_argument('--dim', type=int, default=64)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--nlist', type=int, default=256)
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[1, 4, 8, 16, 32])
+    parser.add_argument('--metric', default='l2', choices=['l2', 'cosine', 'ip'])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='write results to this JSON file')
+    args = parser.parse_args()
+
+    report = run(args.n, args.dim, args.queries, args.top_k, args.nlist, args.nprobe, args.metric, args.seed)
+    print(f"n={report['n']} dim={report['dim']} top_k={report['top_k']} build={report['ivf_build_s']:.2f}s")
+    print(f"{'index':<32} {'recall@k':>9} {'p50 ms':>9} {'p95 ms':>9}")
+    for row in report['results']:
+        print(f"{row['index']:<32} {row['recall']:>9.3f} {row['p50_ms']:>9.3f} {row['p95_ms']:>9.3f}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
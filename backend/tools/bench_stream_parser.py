@@ -0,0 +1,63 @@
+# StreamJSONBuilder 基准：模拟逐 token 到达的长流式响应，检查每字节耗时随响应长度保持恒定（线性复杂度）
+# 用法：python tools/bench_stream_parser.py --sizes 1000 10000 100000 --token-size 4 [--sse]
+
+import argparse
+import json
+import os
+import sys
+import time
+
+# Ensure backend root is on sys.path when run directly
+ROOT = os.path.dirname(os.path.dirname(__file__))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from app.services.stream_parser import StreamJSONBuilder
+
+
+def make_stream(n_chars, token_size, sse):
+    n_items = max(1, n_chars // 40)
+    doc = json.dumps({
+        "overview": "用户负债率较高，建议优先偿还高息负债。" * 4,
+        "recommendations": [f"第{i}步：调整预算并优化贷款结构 {{\"示例\"}}" for i in range(n_items)],
+        "risks": ["高利率风险", "流动性风险"],
+        "confidence": 0.8,
+    }, ensure_ascii=False)
+    tokens = [doc[i:i + token_size] for i in range(0, len(doc), token_size)]
+    if sse:
+        tokens = [f"data: {t}\n" for t in tokens]
+    return doc, tokens
+
+
+def bench(n_chars, token_size, sse, repeats):
+    doc, tokens = make_stream(n_chars, token_size, sse)
+    best = float('inf')
+    for _ in range(repeats):
+        builder = StreamJSONBuilder(max_buffer=len(doc) + 1)
+        t0 = time.perf_counter()
+        result = None
+        for t in tokens:
+            obj = builder.feed(t)
+            if obj is not None:
+                result = obj
+        best = min(best, time.perf_counter() - t0)
+        assert result is not None and result["confidence"] == 0.8
+    return len(doc), len(tokens), best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='StreamJSONBuilder token-by-token benchmark')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000, 1000000])
+    parser.add_argument('--token-size', type=int, default=4)
+    parser.add_argument('--sse', action='store_true', help='每个 token 包装为 SSE "data:" 行')
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'chars':>10} {'tokens':>9} {'total ms':>10} {'us/token':>9} {'ns/char':>8}")
+    for size in args.sizes:
+        chars, n_tokens, best = bench(size, args.token_size, args.sse, args.repeats)
+        print(f"{chars:>10} {n_tokens:>9} {best * 1000:>10.2f} {best / n_tokens * 1e6:>9.2f} {best / chars * 1e9:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
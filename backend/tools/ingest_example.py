@@ -9,36 +9,17 @@ ROOT = os.path.dirname(os.path.dirname(__file__))
 if ROOT not in sys.path:
     sys.path.insert(0, ROOT)
 
+from app.services.embeddings import HashingEmbedder
+from app.services.ingest import simple_chunk
 from app.services.vectorstore import InMemoryVectorStore
 
 
-def simple_chunk(text, max_len=500):
-    # 极简分块：按句号切分并合并到接近 max_len
-    sents = [s.strip() for s in text.split('。') if s.strip()]
-    chunks = []
-    cur = ''
-    for s in sents:
-        if len(cur) + len(s) > max_len:
-            if cur:
-                chunks.append(cur)
-            cur = s
-        else:
-            cur = (cur + '。' + s) if cur else s
-    if cur:
-        chunks.append(cur)
-    return chunks
-
-
-def fake_embed(text):
-    # 占位 embedding：使用字符 ord 值的简易向量（仅测试用，非真实）
-    return [float(sum(ord(c) for c in text) % 100) for _ in range(8)]
-
-
-def ingest_example(docs):
-    vs = InMemoryVectorStore()
+def ingest_example(docs, embedder=None):
+    embedder = embedder or HashingEmbedder()
+    vs = InMemoryVectorStore(metric='cosine')
     for i, doc in enumerate(docs):
         chunks = simple_chunk(doc)
-        embeddings = [fake_embed(c) for c in chunks]
+        embeddings = embedder.embed(chunks)
         metadatas = [{'source': f'doc{i}', 'text': c} for c in chunks]
         ids = [f'doc{i}_chunk{j}' for j in range(len(chunks))]
         vs.upsert(embeddings, metadatas, ids)
@@ -46,9 +27,16 @@ def ingest_example(docs):
 
 
 if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--out', help='保存索引到该目录（可被多个 worker 以 mmap 方式加载）')
+    args = parser.parse_args()
     docs = [
         '示例法规条文一：关于消费者保护的若干条款。... 更多文本。',
         '示例金融建议：预算分配、债务重组、税务优化等。'
     ]
     store = ingest_example(docs)
-    print('ingested', len(store.store))
+    print('ingested', len(store))
+    if args.out:
+        store.save(args.out, extra={'embedder': HashingEmbedder().signature()})
+        print('saved to', args.out)
@@ -0,0 +1,88 @@
+# 批量摄取 CLI：流式读取目录中的 .txt/.md 文档，多进程分块 + 向量化，批量写入向量库并保存为 mmap 索引。
+# 中断后使用相同参数重跑即可从检查点继续（已完成且未修改的文档会被跳过）。
+# 首次运行先在语料前 --idf-sample 个 chunk 上拟合 TF-IDF 的 idf，与索引一起保存为 embedder.npz；
+# 续跑沿用该文件，查询端需用 HashingEmbedder.load 加载同一文件以保证向量一致。
+# 用法：python tools/ingest_pipeline.py ./corpus --out ./index --workers 4
+
+import argparse
+import os
+import sys
+
+# Ensure backend root is on sys.path when run directly
+ROOT = os.path.dirname(os.path.dirname(__file__))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from app.services.embeddings import CachedEmbedder, EmbeddingCache, HashingEmbedder
+from app.services.ingest import run_pipeline, sample_chunks
+from app.services.vectorstore import InMemoryVectorStore, StaleIndexError, load_vector_store
+
+
+def main():
+    parser = argparse.ArgumentParser(description='streaming, resumable ingestion pipeline')
+    parser.add_argument('paths', nargs='+', help='文档文件或目录')
+    parser.add_argument('--out', required=True, help='索引输出目录')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--batch-docs', type=int, default=16)
+    parser.add_argument('--upsert-batch', type=int, default=512)
+    parser.add_argument('--max-len', type=int, default=500)
+    parser.add_argument('--checkpoint-every', type=int, default=256)
+    parser.add_argument('--dim', type=int, default=256, help='embedding 维度')
+    parser.add_argument('--idf-sample', type=int, default=5000, help='用于拟合 idf 的 chunk 数，0 表示不使用 idf')
+    parser.add_argument('--fresh', action='store_true', help='忽略已有索引与检查点，重新摄取')
+    args = parser.parse_args()
+
+    embedder_path = os.path.join(args.out, 'embedder.npz')
+    base = None
+    if not args.fresh and os.path.exists(embedder_path):
+        # 续跑沿用已保存的 idf，新写入的向量与索引中已有向量一致
+        base = HashingEmbedder.load(embedder_path)
+        if base.dim != args.dim:
+            base = None
+    if base is None:
+        base = HashingEmbedder(dim=args.dim)
+        if args.idf_sample > 0:
+            base.fit(sample_chunks(args.paths, args.idf_sample, max_len=args.max_len))
+    # embedding 缓存与索引放在同一目录：内容未变的 chunk 在后续运行中直接复用向量
+    embedder = CachedEmbedder(base, EmbeddingCache(os.path.join(args.out, 'embed_cache.db')))
+    extra = {"embedder": embedder.signature()}
+    checkpoint_path = os.path.join(args.out, 'ingest_checkpoint.json')
+    store = InMemoryVectorStore(metric='cosine')
+    if args.fresh:
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+    else:
+        try:
+            # embedding 参数变化时索引视为过期，需要全量重建
+            store = load_vector_store(args.out, mmap=False, expected=extra)
+            print(f'resuming from {args.out} ({len(store)} chunks)')
+        except StaleIndexError:
+            if os.path.exists(checkpoint_path):
+                # 检查点存在但索引不可用：检查点已不可信，重新开始
+                os.remove(checkpoint_path)
+    os.makedirs(args.out, exist_ok=True)
+    base.save(embedder_path)
+
+    def progress(stats):
+        print(f"\rdocs={stats['docs']} chunks={stats['chunks']} skipped={stats['skipped']} "
+              f"{stats['docs_per_s']:.1f} docs/s {stats['chunks_per_s']:.1f} chunks/s", end='', flush=True)
+
+    stats = run_pipeline(
+        args.paths, store,
+        embed_fn=embedder,
+        workers=args.workers,
+        batch_docs=args.batch_docs,
+        upsert_batch=args.upsert_batch,
+        max_len=args.max_len,
+        checkpoint_path=checkpoint_path,
+        checkpoint_every=args.checkpoint_every,
+        on_checkpoint=lambda s: s.save(args.out, extra=extra),
+        progress=progress,
+    )
+    print()
+    print(f"done: {stats['docs']} docs, {stats['chunks']} chunks, {stats['skipped']} skipped in "
+          f"{stats['elapsed_s']:.2f}s ({stats['docs_per_s']:.1f} docs/s, {stats['chunks_per_s']:.1f} chunks/s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+# 端到端压测：按目标 RPS（开环、泊松到达）驱动报告接口，输出吞吐与 p50/p95/p99，并写入 JSON 便于跨版本对比
+# 场景：
+#   reports  POST /api/v1/reports（阻塞）
+#   start    POST /api/v1/reports/start 后轮询 GET /api/v1/reports/{job_id} 直到 done/error（记录端到端耗时）
+#   stream   POST /api/v1/reports/stream?format=ndjson（记录首事件耗时 ttfb 与总耗时）
+# 用法（先启动桩服务与后端，见 tools/stub_model_server.py）：
+#   python tools/load_test.py --base-url http://127.0.0.1:8000 --scenario reports --rps 20 --duration 30 --out logs/load.json
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+# Ensure backend root is on sys.path when run directly
+ROOT = os.path.dirname(os.path.dirname(__file__))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+SCENARIOS = ('reports', 'start', 'stream')
+
+
+def percentile(sorted_values, q):
+    """线性插值分位数；sorted_values 需已排序。"""
+    if not sorted_values:
+        return None
+    pos = (len(sorted_values) - 1) * q
+    lo = int(pos)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo)
+
+
+def summarize(samples, elapsed):
+    """samples: [{"ok": bool, "status": int|str, "latency": s, "ttfb": s|None}] -> 汇总 dict（毫秒）。"""
+    ok = [s for s in samples if s["ok"]]
+    lat = sorted(s["latency"] * 1000 for s in ok)
+    ttfb = sorted(s["ttfb"] * 1000 for s in ok if s.get("ttfb") is not None)
+    statuses = {}
+    for s in samples:
+        statuses[str(s["status"])] = statuses.get(str(s["status"]), 0) + 1
+
+    def _dist(values):
+        if not values:
+            return None
+        return {"p50": percentile(values, 0.50), "p95": percentile(values, 0.95), "p99": percentile(values, 0.99),
+                "mean": sum(values) / len(values), "max": values[-1]}
+
+    out = {
+        "requests": len(samples),
+        "ok": len(ok),
+        "errors": len(samples) - len(ok),
+        "error_rate": (len(samples) - len(ok)) / len(samples) if samples else 0.0,
+        "throughput_rps": len(ok) / elapsed if elapsed > 0 else 0.0,
+        "status_counts": statuses,
+        "latency_ms": _dist(lat),
+    }
+    if ttfb:
+        out["ttfb_ms"] = _dist(ttfb)
+    return out
+
+
+def random_payload(rng):
+    assets = rng.randint(50_000, 2_000_000)
+    return {
+        "assets": assets,
+        "liabilities": int(assets * rng.uniform(0.0, 0.9)),
+        "income": rng.randint(5_000, 80_000),
+        "expenses": rng.randint(2_000, 60_000),
+    }
+
+
+async def run_reports(client, payload, params):
+    r = await client.post('/api/v1/reports', json=payload, params=params)
+    return r.status_code == 200, r.status_code, None
+
+
+async def run_start(client, payload, params, poll_interval=0.2, poll_timeout=120.0):
+    r = await client.post('/api/v1/reports/start', json=payload, params=params)
+    if r.status_code != 200:
+        return False, r.status_code, None
+    job_id = r.json()["job_id"]
+    deadline = time.perf_counter() + poll_timeout
+    while time.perf_counter() < deadline:
+        await asyncio.sleep(poll_interval)
+        pr = await client.get(f'/api/v1/reports/{job_id}')
+        if pr.status_code != 200:
+            return False, pr.status_code, None
+        status = pr.json().get("status")
+        if status == "done":
+            return True, 200, None
+        if status == "error":
+            return False, "job_error", None
+    return False, "poll_timeout", None
+
+
+async def run_stream(client, payload, params):
+    started = time.perf_counter()
+    ttfb = None
+    got_result = False
+    async with client.stream('POST', '/api/v1/reports/stream', json=payload,
+                             params={**params, "format": "ndjson"}) as r:
+        if r.status_code != 200:
+            return False, r.status_code, None
+        async for line in r.aiter_lines():
+            if not line:
+                continue
+            if ttfb is None:
+                ttfb = time.perf_counter() - started
+            if json.loads(line).get("event") == "result":
+                got_result = True
+    return got_result, 200 if got_result else "no_result", ttfb
+
+
+RUNNERS = {'reports': run_reports, 'start': run_start, 'stream': run_stream}
+
+
+async def drive(base_url, scenario, rps, duration, no_cache=True, timeout=120.0, seed=0, max_in_flight=1000):
+    """开环负载：按泊松过程发起请求，不等待前一个完成；在途请求超过 max_in_flight 时记为 client_overload。"""
+    import httpx
+
+    rng = random.Random(seed)
+    runner = RUNNERS[scenario]
+    params = {"no_cache": "true"} if no_cache else {}
+    samples = []
+    tasks = set()
+    limits = httpx.Limits(max_connections=max_in_flight, max_keepalive_connections=max_in_flight)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        async def _one(payload):
+            started = time.perf_counter()
+            try:
+                ok, status, ttfb = await runner(client, payload, params)
+            except Exception as e:
+                ok, status, ttfb = False, type(e).__name__, None
+            samples.append({"ok": ok, "status": status, "latency": time.perf_counter() - started, "ttfb": ttfb})
+
+        t0 = time.perf_counter()
+        next_at = t0
+        while next_at - t0 < duration:
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if len(tasks) >= max_in_flight:
+                samples.append({"ok": False, "status": "client_overload", "latency": 0.0, "ttfb": None})
+            else:
+                task = asyncio.ensure_future(_one(random_payload(rng)))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            next_at += rng.expovariate(rps)
+        if tasks:
+            await asyncio.wait(tasks)
+        elapsed = time.perf_counter() - t0
+    return summarize(samples, elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='end-to-end report API load test')
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+    parser.add_argument('--scenario', choices=SCENARIOS + ('all',), default='reports')
+    parser.add_argument('--rps', type=float, default=10.0, help='目标到达速率（请求/秒）')
+    parser.add_argument('--duration', type=float, default=30.0, help='发压时长（秒），每个场景')
+    parser.add_argument('--cache', action='store_true', help='允许命中结果缓存（默认带 no_cache=true）')
+    parser.add_argument('--timeout', type=float, default=120.0)
+    parser.add_argument('--max-in-flight', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--label', default='', help='写入结果的自定义标签（例如 git 版本）')
+    parser.add_argument('--out', default=None, help='结果 JSON 路径')
+    args = parser.parse_args()
+
+    scenarios = SCENARIOS if args.scenario == 'all' else (args.scenario,)
+    report = {
+        "label": args.label,
+        "started_at": datetime.utcnow().isoformat() + 'Z',
+        "config": {"base_url": args.base_url, "rps": args.rps, "duration_s": args.duration,
+                   "no_cache": not args.cache, "seed": args.seed},
+        "scenarios": {},
+    }
+    for name in scenarios:
+        result = asyncio.run(drive(args.base_url, name, args.rps, args.duration, no_cache=not args.cache,
+                                   timeout=args.timeout, seed=args.seed, max_in_flight=args.max_in_flight))
+        report["scenarios"][name] = result
+        lat = result["latency_ms"] or {}
+        print(f"{name:8s} ok={result['ok']}/{result['requests']} thr={result['throughput_rps']:.1f}/s "
+              f"p50={lat.get('p50', 0):.0f}ms p95={lat.get('p95', 0):.0f}ms p99={lat.get('p99', 0):.0f}ms")
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        d = os.path.dirname(os.path.abspath(args.out))
+        os.makedirs(d, exist_ok=True)
+        with open(args.out, 'w', encoding='utf-8') as f:
+            f.write(text)
+        print(f"written to {args.out}")
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,265 @@
+# 本地热点路径微基准：合成语料/流，多个规模，预热 + 多次重复取中位数与 IQR；与基线 JSON 比较以发现性能回退
+# 各规模单独记录，超线性（例如意外的二次复杂度）会表现为大规模用例的回退
+# 用法：
+#   python tools/microbench.py                         # 运行并打印
+#   python tools/microbench.py --update-baseline       # 写入基线（tools/microbench_baseline.json）
+#   python tools/microbench.py --check --threshold 25  # 任一用例中位数比基线慢 25% 以上时退出码为 1
+#   python tools/microbench.py --filter compliance --repeats 9
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime
+
+# Ensure backend root is on sys.path when run directly
+ROOT = os.path.dirname(os.path.dirname(__file__))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'microbench_baseline.json')
+
+_SENTENCES = [
+    "用户负债率较高，建议优先偿还高息负债",
+    "保持良好预算习惯并建立应急基金",
+    "债务重组与利率优化是降低月供的常见做法",
+    "消费者债务相关法律条款摘要，涉及诉讼时效与仲裁条款",
+    "Emergency fund should cover six months of expenses",
+    "浮动利率贷款在加息周期中的风险较高",
+]
+
+
+def _text(n_chars, seed=0):
+    out = []
+    i = seed
+    total = 0
+    while total < n_chars:
+        s = _SENTENCES[i % len(_SENTENCES)] + f"（{i}）。"
+        out.append(s)
+        total += len(s)
+        i += 1
+    return ''.join(out)[:n_chars]
+
+
+def _report_doc(n_items):
+    return json.dumps({
+        "overview": "用户负债率较高，建议优先偿还高息负债。" * 4,
+        "recommendations": [f"第{i}步：调整预算并优化贷款结构 {{\"示例\"}}" for i in range(n_items)],
+        "risks": ["高利率风险", "流动性风险"],
+        "confidence": 0.8,
+    }, ensure_ascii=False)
+
+
+# ---- 用例：每个 setup(size) 返回一个无参可调用对象，计时的是该调用 ----
+
+def setup_stream_feed(size):
+    from app.services.stream_parser import StreamJSONBuilder
+    doc = _report_doc(max(1, size // 40))
+    tokens = [doc[i:i + 4] for i in range(0, len(doc), 4)]
+
+    def run():
+        builder = StreamJSONBuilder(max_buffer=len(doc) + 1)
+        for t in tokens:
+            builder.feed(t)
+    return run
+
+
+def setup_vectorstore_query(size):
+    import numpy as np
+    from app.services.vectorstore import InMemoryVectorStore
+    rng = np.random.default_rng(0)
+    dim = 64
+    store = InMemoryVectorStore(metric='cosine', dim=dim)
+    store.upsert(rng.normal(size=(size, dim)).astype('float32').tolist(),
+                 [{"i": i} for i in range(size)], [str(i) for i in range(size)])
+    q = rng.normal(size=dim).astype('float32').tolist()
+    return lambda: store.query(q, 5)
+
+
+def setup_retriever_get(size):
+    from app.services.retriever import InMemoryRetriever
+    retriever = InMemoryRetriever(docs=[_text(120, seed=i) for i in range(size)])
+    return lambda: retriever.get("负债率 高息负债 利率优化 debt ratio", 5)
+
+
+def setup_simple_chunk(size):
+    from app.services.ingest import simple_chunk
+    text = _text(size)
+    return lambda: simple_chunk(text, max_len=500)
+
+
+def setup_check_compliance(size):
+    from app.services.compliance import ComplianceScanner, DEFAULT_TERMS, check_compliance
+    scanner = ComplianceScanner(DEFAULT_TERMS)
+    n_items = max(1, size // 40)
+    result = {"overview": _text(200), "recommendations": [_text(40, seed=i) for i in range(n_items)],
+              "risks": ["高利率风险"], "confidence": 0.7}
+    return lambda: check_compliance(dict(result), scanner=scanner)
+
+
+def setup_build_prompt(size):
+    from app.models.financials import FinancialStatement
+    from app.services.cfp_agent import CFPAgent
+    agent = CFPAgent.__new__(CFPAgent)
+    fs = FinancialStatement(assets=500000, liabilities=200000, income=20000, expenses=8000)
+    docs = [_text(200, seed=i) for i in range(max(1, size // 200))]
+    return lambda: agent._build_prompt(fs, docs)
+
+
+def setup_validate_financial_statement(size):
+    from app.models.financials import FinancialStatement
+    payloads = [{"assets": 100000 + i, "liabilities": 5000 + i, "income": 20000, "expenses": 8000,
+                 "notes": "备注"} for i in range(size)]
+
+    def run():
+        for p in payloads:
+            FinancialStatement.parse_obj(p)
+    return run
+
+
+def setup_validate_agent_output(size):
+    from app.schemas.agent_output import AgentOutputModel
+    obj = json.loads(_report_doc(size))
+    return lambda: AgentOutputModel.parse_obj(obj)
+
+
+# name -> (setup, sizes, 规模单位)
+BENCHMARKS = {
+    'stream_feed': (setup_stream_feed, (1000, 10000, 100000), 'chars'),
+    'vectorstore_query': (setup_vectorstore_query, (1000, 10000, 50000), 'vectors'),
+    'retriever_get': (setup_retriever_get, (100, 1000, 10000), 'docs'),
+    'simple_chunk': (setup_simple_chunk, (10000, 100000, 1000000), 'chars'),
+    'check_compliance': (setup_check_compliance, (1000, 10000, 100000), 'chars'),
+    'build_prompt': (setup_build_prompt, (1000, 10000, 100000), 'context chars'),
+    'validate_financial_statement': (setup_validate_financial_statement, (1, 100, 1000), 'objects'),
+    'validate_agent_output': (setup_validate_agent_output, (3, 30, 300), 'recommendations'),
+}
+
+
+def measure(fn, repeats=7, warmup=2, min_time=0.02):
+    """返回每次调用耗时（秒）的 {median, q1, q3, iqr, loops}。
+
+    先预热，再按 min_time 校准每轮循环次数，使计时远大于 perf_counter 分辨率。
+    """
+    for _ in range(warmup):
+        fn()
+    loops = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        if time.perf_counter() - t0 >= min_time or loops >= 1 << 20:
+            break
+        loops *= 2
+    samples = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        samples.append((time.perf_counter() - t0) / loops)
+    if len(samples) >= 2:
+        q1, _, q3 = statistics.quantiles(samples, n=4, method='inclusive')
+    else:
+        q1 = q3 = samples[0]
+    return {"median": statistics.median(samples), "q1": q1, "q3": q3, "iqr": q3 - q1, "loops": loops}
+
+
+def run_suite(names=None, repeats=7, warmup=2, min_time=0.02, sizes_override=None):
+    """运行选中的用例，返回 {"name[size]": {..., "per_unit_ns": ...}}。"""
+    results = {}
+    for name, (setup, sizes, unit) in BENCHMARKS.items():
+        if names and not any(n in name for n in names):
+            continue
+        for size in (sizes_override or {}).get(name, sizes):
+            stats = measure(setup(size), repeats=repeats, warmup=warmup, min_time=min_time)
+            stats.update({"size": size, "unit": unit, "per_unit_ns": stats["median"] / size * 1e9})
+            results[f"{name}[{size}]"] = stats
+    return results
+
+
+def compare(results, baseline, threshold_pct):
+    """返回回退列表 [(key, baseline_median, current_median, pct)]。
+
+    当前中位数超出基线 threshold_pct% 且超出部分大于基线 IQR（排除噪声）时判定为回退；基线中没有的用例忽略。
+    """
+    regressions = []
+    for key, cur in results.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        limit = base["median"] * (1 + threshold_pct / 100.0)
+        if cur["median"] > limit and cur["median"] - base["median"] > base.get("iqr", 0.0):
+            pct = (cur["median"] / base["median"] - 1) * 100.0
+            regressions.append((key, base["median"], cur["median"], pct))
+    return regressions
+
+
+def _fmt_time(seconds):
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.2f}ms"
+    return f"{seconds * 1e6:.1f}us"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='micro-benchmarks for local CPU-bound hot paths')
+    parser.add_argument('--filter', nargs='*', default=None, help='只运行名称包含这些子串的用例')
+    parser.add_argument('--repeats', type=int, default=7)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--min-time', type=float, default=0.02, help='每轮最短计时（秒），据此校准循环次数')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--update-baseline', action='store_true', help='将本次结果写入基线文件（按用例合并）')
+    parser.add_argument('--check', action='store_true', help='与基线比较，出现回退时退出码为 1')
+    parser.add_argument('--threshold', type=float, default=float(os.getenv('MICROBENCH_THRESHOLD_PCT', '25')),
+                        help='回退阈值（百分比，默认 25，或 MICROBENCH_THRESHOLD_PCT）')
+    parser.add_argument('--json', default=None, help='另存本次结果 JSON')
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f).get("benchmarks", {})
+
+    results = run_suite(args.filter, repeats=args.repeats, warmup=args.warmup, min_time=args.min_time)
+
+    print(f"{'benchmark':<40} {'median':>10} {'iqr':>10} {'ns/unit':>10} {'vs base':>8}")
+    for key, r in results.items():
+        base = baseline.get(key)
+        delta = f"{(r['median'] / base['median'] - 1) * 100:+.0f}%" if base else '-'
+        print(f"{key:<40} {_fmt_time(r['median']):>10} {_fmt_time(r['iqr']):>10} {r['per_unit_ns']:>10.1f} {delta:>8}")
+
+    report = {
+        "created_at": datetime.utcnow().isoformat() + 'Z',
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "benchmarks": results,
+    }
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    if args.update_baseline:
+        merged = dict(baseline)
+        merged.update(results)
+        report["benchmarks"] = merged
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"baseline updated: {args.baseline}")
+
+    if args.check:
+        if not baseline:
+            print(f"no baseline at {args.baseline}; run with --update-baseline first")
+            sys.exit(2)
+        regressions = compare(results, baseline, args.threshold)
+        for key, base, cur, pct in regressions:
+            print(f"REGRESSION {key}: {_fmt_time(base)} -> {_fmt_time(cur)} (+{pct:.0f}%, threshold {args.threshold:.0f}%)")
+        if regressions:
+            sys.exit(1)
+        print(f"no regressions beyond {args.threshold:.0f}%")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+# 本地模型桩服务：实现 GeminiClientHTTP / GeminiClientAsync 期望的 POST {base_url}/generate 契约，用于压测而不调用真实供应商
+# - 非流式：返回 {"text": "<JSON 字符串>"}
+# - 流式（请求体 "stream": true）：text/event-stream，逐段 "data: <片段>"，以 "data: [DONE]" 结束
+# - 可配置：延迟分布（对数正态，中位数 + sigma）、token 速率、错误率（返回 503）、畸形 JSON 比例
+# 用法：python tools/stub_model_server.py --port 9000 --latency-ms 800 --tokens-per-s 50 --error-rate 0.01
+# 后端指向桩服务：GEMINI_ENABLED=true GEMINI_API_KEY=stub GEMINI_BASE_URL=http://127.0.0.1:9000
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+
+# Ensure backend root is on sys.path when run directly
+ROOT = os.path.dirname(os.path.dirname(__file__))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+class StubConfig:
+    def __init__(self, latency_ms=800.0, latency_sigma=0.5, tokens_per_s=50.0, token_chars=4,
+                 error_rate=0.0, malformed_rate=0.0, recommendations=3, seed=None):
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.tokens_per_s = tokens_per_s
+        self.token_chars = token_chars
+        self.error_rate = error_rate
+        self.malformed_rate = malformed_rate
+        self.recommendations = recommendations
+        self.rng = random.Random(seed)
+
+    def first_token_delay(self) -> float:
+        """首 token 延迟（秒）：中位数为 latency_ms 的对数正态分布。"""
+        if self.latency_ms <= 0:
+            return 0.0
+        return self.rng.lognormvariate(math.log(self.latency_ms / 1000.0), self.latency_sigma)
+
+    def token_delay(self) -> float:
+        return 1.0 / self.tokens_per_s if self.tokens_per_s > 0 else 0.0
+
+
+def make_output(cfg: StubConfig, prompt: str) -> str:
+    """生成符合 AgentOutputModel 的 JSON 文本；按 malformed_rate 生成截断或非 JSON 文本。"""
+    rng = cfg.rng
+    n = max(1, int(rng.gauss(cfg.recommendations, 1)))
+    doc = json.dumps({
+        "overview": f"（桩服务）根据输入的资产负债情况生成的概述，prompt 长度 {len(prompt)}。",
+        "recommendations": [f"第{i + 1}步：调整预算、优化贷款结构并保留应急资金。" for i in range(n)],
+        "risks": ["利率上升风险", "收入波动风险"][:rng.randint(1, 2)],
+        "confidence": round(rng.uniform(0.5, 0.95), 2),
+    }, ensure_ascii=False)
+    if rng.random() < cfg.malformed_rate:
+        return doc[:len(doc) // 2] if rng.random() < 0.5 else "抱歉，我无法按 JSON 格式回答。"
+    return doc
+
+
+def split_tokens(text: str, size: int):
+    # 客户端按行 strip()，因此切分点两侧不能是空白，否则片段拼接后会丢失空格
+    out = []
+    start = 0
+    while start < len(text):
+        cut = min(len(text), start + size)
+        while cut < len(text) and (text[cut - 1].isspace() or text[cut].isspace()):
+            cut += 1
+        out.append(text[start:cut])
+        start = cut
+    return out
+
+
+def create_stub_app(cfg: StubConfig) -> FastAPI:
+    app = FastAPI(title="stub model server")
+    stats = {"requests": 0, "errors": 0, "streams": 0}
+
+    @app.get('/stats')
+    def get_stats():
+        return stats
+
+    @app.post('/generate')
+    async def generate(request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+        prompt = str(body.get("prompt", ""))
+        if cfg.rng.random() < cfg.error_rate:
+            stats["errors"] += 1
+            await asyncio.sleep(cfg.first_token_delay() / 4)
+            return JSONResponse({"error": "stub injected failure"}, status_code=503)
+
+        text = make_output(cfg, prompt)
+        tokens = split_tokens(text, cfg.token_chars)
+        if not body.get("stream"):
+            await asyncio.sleep(cfg.first_token_delay() + len(tokens) * cfg.token_delay())
+            return {"text": text}
+
+        stats["streams"] += 1
+
+        async def _events():
+            await asyncio.sleep(cfg.first_token_delay())
+            delay = cfg.token_delay()
+            for tok in tokens:
+                yield f"data: {tok}\n\n"
+                if delay:
+                    await asyncio.sleep(delay)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(_events(), media_type="text/event-stream")
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='local stub model server (/generate contract)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9000)
+    parser.add_argument('--latency-ms', type=float, default=800.0, help='首 token 延迟中位数（毫秒）')
+    parser.add_argument('--latency-sigma', type=float, default=0.5, help='对数正态分布 sigma，越大长尾越重')
+    parser.add_argument('--tokens-per-s', type=float, default=50.0, help='生成速率（token/s），0 表示不限速')
+    parser.add_argument('--token-chars', type=int, default=4, help='每个 token 的字符数')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='返回 503 的比例')
+    parser.add_argument('--malformed-rate', type=float, default=0.0, help='返回截断/非 JSON 文本的比例')
+    parser.add_argument('--recommendations', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    import uvicorn
+    cfg = StubConfig(latency_ms=args.latency_ms, latency_sigma=args.latency_sigma, tokens_per_s=args.tokens_per_s,
+                     token_chars=args.token_chars, error_rate=args.error_rate, malformed_rate=args.malformed_rate,
+                     recommendations=args.recommendations, seed=args.seed)
+    uvicorn.run(create_stub_app(cfg), host=args.host, port=args.port, log_level='warning')
+
+
+if __name__ == '__main__':
+    main()